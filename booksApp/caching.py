@@ -0,0 +1,279 @@
+"""
+Cache odpowiedzi katalogu (książki, autorzy, gatunki, wydawcy).
+
+Klucz odpowiedzi składa się z adresu i znormalizowanego query stringu, a wpis
+przechowuje generacje wszystkich modeli, od których zależy widok
+(`cache_dependencies`). Generacja to znacznik czasu ostatniej zmiany modelu -
+sygnały podbijają ją jednym `cache.set` po zatwierdzeniu transakcji, a wpis
+z inną generacją niż bieżąca jest traktowany jak brak wpisu.
+
+Przy replikach odczytu odpowiedź świeżo po zmianie mogłaby pochodzić z repliki
+sprzed zapisu, więc przez REPLICA_STICKY_SECONDS od podbicia generacji
+odpowiedzi są zwracane, ale nie zapisywane w cache.
+
+Chybienia są scalane (single-flight): współbieżne identyczne żądania (ten sam
+klucz, generacje i klasa uwierzytelnienia) w jednym procesie czekają na wynik
+pierwszego zamiast liczyć go od nowa. Przy CATALOG_SINGLE_FLIGHT_LOCK blokada
+we współdzielonym cache ogranicza przeliczanie wpisu do jednego workera -
+pozostałe czekają najwyżej CATALOG_SINGLE_FLIGHT_WAIT sekund, aż wpis się pojawi
+albo blokada zniknie bez wpisu (lider nie zapisał odpowiedzi - liczą wtedy same).
+"""
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from booksServer.middleware import record_timing
+
+CACHE_ALIAS = 'catalog'
+
+
+def _generation_key(name):
+    return f'catalog:generation:{name}'
+
+
+def dependency_name(dependency):
+    return dependency if isinstance(dependency, str) else dependency._meta.label_lower
+
+
+def bump(*dependencies):
+    """Unieważnia odpowiedzi zależne od podanych modeli (lub nazw, np. 'shelves:5')."""
+    keys = [_generation_key(dependency_name(dep)) for dep in dependencies]
+
+    # Po COMMIT: odczyt w trakcie transakcji widzi stare dane i nie może ich zapisać pod nową generacją
+    def set_generations():
+        now = time.time_ns()
+        caches[CACHE_ALIAS].set_many({key: now for key in keys}, None)
+
+    transaction.on_commit(set_generations)
+
+
+def shelves_dependency(user_id):
+    return f'shelves:{user_id}'
+
+
+def get_generations(names):
+    cache = caches[CACHE_ALIAS]
+    keys = {_generation_key(name): name for name in names}
+    generations = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in generations}
+    if missing:
+        # Wyrzucona z cache generacja dostaje nową wartość - stare wpisy nie wrócą
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        generations.update(cache.get_many(missing))
+    return [generations.get(key, 0) for key in keys]
+
+
+class CacheStats:
+    """Liczniki trafień i chybień per widok (w obrębie procesu)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def add(self, name, hit):
+        with self._lock:
+            counts = self._counts.setdefault(name, {'hits': 0, 'misses': 0})
+            counts['hits' if hit else 'misses'] += 1
+
+    def summary(self):
+        with self._lock:
+            counts = {name: dict(values) for name, values in self._counts.items()}
+        for values in counts.values():
+            values['hit_ratio'] = round(values['hits'] / (values['hits'] + values['misses']), 3)
+        return counts
+
+
+cache_stats = CacheStats()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """Jedno obliczenie na klucz w obrębie procesu; współbieżni wywołujący dostają jego wynik."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute):
+        """Zwraca (wynik, czy_współdzielony). Gdy prowadzący nie zdążył lub rzucił wyjątek - `compute()`."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(settings.CATALOG_SINGLE_FLIGHT_WAIT) and call.result is not None:
+                return call.result, True
+            return compute(), False
+
+        try:
+            call.result = compute()
+            return call.result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+single_flight = SingleFlight()
+
+
+class CachedResponseMixin:
+    """
+    Cache odpowiedzi akcji z `cached_actions` viewsetu (domyślnie `list` i `retrieve`). `cache_dependencies` to modele,
+    których zmiana unieważnia odpowiedzi; przy `cache_per_user = True` zalogowany
+    użytkownik ma własne wpisy, unieważniane także zmianą jego półek.
+
+    `cache_references` ({pole: (model, klasa serializera)}) to zagnieżdżone obiekty
+    z booksApp.object_cache (np. dodający książkę): wpis przechowuje tylko ich klucze,
+    a obiekty są wstawiane przy każdym odczycie, więc ich zmiany nie unieważniają wpisów.
+    """
+    cache_dependencies = ()
+    cache_per_user = False
+    cached_actions = ('list', 'retrieve')
+    cache_references = {}
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        dependencies = [dependency_name(dep) for dep in self.cache_dependencies]
+        user = 'anonymous'
+        if self.cache_per_user and request.user.is_authenticated:
+            user = str(request.user.pk)
+            dependencies.append(shelves_dependency(user))
+        generations = get_generations(dependencies)
+
+        query = urlencode(sorted(
+            (name, value) for name, values in request.query_params.lists() for value in values
+        ))
+        digest = hashlib.sha256(f'{request.build_absolute_uri(request.path)}?{query}'.encode()).hexdigest()
+        return f'catalog:response:{self.basename}:{self.action}:{user}:{digest}', generations
+
+    def cached_response(self, view, request, *args, **kwargs):
+        if self.action not in self.cached_actions:
+            return view(request, *args, **kwargs)
+
+        cache = caches[CACHE_ALIAS]
+        name = f'{self.basename}-{self.action}'
+        with record_timing('cache'):
+            key, generations = self.get_cache_key(request)
+            cached = cache.get(key)
+        if cached is not None and cached[0] == generations:
+            cache_stats.add(name, hit=True)
+            return Response(self.resolve_references(cached[1]), headers={'X-Cache': 'HIT'})
+
+        cache_stats.add(name, hit=False)
+        authenticator = type(request.successful_authenticator).__name__
+        response, shared = single_flight.do(
+            (key, authenticator, *generations),
+            lambda: self.compute_response(view, request, key, generations, *args, **kwargs),
+        )
+        if not shared:
+            return response
+        if response.status_code == 200 and hasattr(response, 'data'):
+            # Response jest renderowany per żądanie - współdzielimy tylko dane
+            return Response(response.data, headers={'X-Cache': 'COALESCED'})
+        return view(request, *args, **kwargs)
+
+    def compute_response(self, view, request, key, generations, *args, **kwargs):
+        cache = caches[CACHE_ALIAS]
+        lock_key = f'{key}:lock'
+        locked = settings.CATALOG_SINGLE_FLIGHT_LOCK
+        if locked and not cache.add(lock_key, True, settings.CATALOG_SINGLE_FLIGHT_WAIT):
+            cached = self.wait_for_entry(cache, key, lock_key, generations)
+            if cached is not None:
+                return Response(self.resolve_references(cached[1]), headers={'X-Cache': 'HIT'})
+            locked = False
+
+        try:
+            response = view(request, *args, **kwargs)
+            response['X-Cache'] = 'MISS'
+
+            recently_changed = max(generations, default=0) > time.time_ns() - settings.REPLICA_STICKY_SECONDS * 10**9
+            if (response.status_code == 200 and hasattr(response, 'data')
+                    and not (settings.DATABASE_REPLICAS and recently_changed)):
+                with record_timing('cache'):
+                    cache.set(key, (generations, self.strip_references(response.data)), settings.CATALOG_CACHE_TIMEOUT)
+            return response
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    @staticmethod
+    def _map_items(data, function):
+        """Stosuje `function` do obiektów odpowiedzi: elementów listy (także stronicowanej) albo szczegółów."""
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            return {**data, 'results': [function(item) for item in data['results']]}
+        if isinstance(data, list):
+            return [function(item) for item in data]
+        if isinstance(data, dict):
+            return function(data)
+        return data
+
+    def strip_references(self, data):
+        def strip(item):
+            return {
+                name: value['id'] if name in self.cache_references and isinstance(value, dict) else value
+                for name, value in item.items()
+            }
+
+        return self._map_items(data, strip) if self.cache_references else data
+
+    def resolve_references(self, data):
+        if not self.cache_references:
+            return data
+        from .object_cache import object_cache
+
+        ids = {name: set() for name in self.cache_references}
+        self._map_items(data, lambda item: [
+            ids[name].add(item[name]) for name in self.cache_references if item.get(name) is not None
+        ])
+        context = self.get_serializer_context()
+        rendered = {}
+        for name, (model, serializer_class) in self.cache_references.items():
+            objects = object_cache.get_many(model, ids[name]) if ids[name] else {}
+            rendered[name] = {pk: serializer_class(obj, context=context).data for pk, obj in objects.items()}
+
+        def resolve(item):
+            return {
+                name: rendered[name].get(value) if name in self.cache_references else value
+                for name, value in item.items()
+            }
+
+        return self._map_items(data, resolve)
+
+    @staticmethod
+    def wait_for_entry(cache, key, lock_key, generations):
+        """
+        Czeka na wpis liczony przez inny worker; None, gdy się nie pojawił (wtedy liczymy sami).
+        Lider zwalnia blokadę zawsze, także gdy wpisu nie zapisał (odpowiedź różna od 200,
+        świeża zmiana przy replikach, błąd) - brak blokady bez wpisu kończy czekanie od razu.
+        """
+        deadline = time.monotonic() + settings.CATALOG_SINGLE_FLIGHT_WAIT
+        with record_timing('cache'):
+            while time.monotonic() < deadline:
+                time.sleep(settings.CATALOG_SINGLE_FLIGHT_POLL)
+                values = cache.get_many([key, lock_key])
+                cached = values.get(key)
+                if cached is not None and cached[0] == generations:
+                    return cached
+                if lock_key not in values:
+                    return None
+        return None
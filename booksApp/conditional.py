@@ -0,0 +1,120 @@
+"""
+Warunkowe GET (ETag, Last-Modified) dla list i szczegółów.
+
+ETag jest liczony przed serializacją z adresu z query stringiem, więc każda
+strona i każdy filtr ma własny znacznik. Akcje objęte cache odpowiedzi biorą
+stan z generacji booksApp.caching (klucz wpisu), pozostałe - z zapytania
+agregującego (max `updated_at` i liczba wierszy przefiltrowanego querysetu).
+Zmiany spoza `updated_at` i zależności cache (półki użytkownika, zagnieżdżone
+profile) wchodzą do znacznika przez generacje `etag_dependencies`. Pasujące
+If-None-Match / If-Modified-Since kończą się odpowiedzią 304 bez serializacji
+i bez zapytań o dane.
+
+Last-Modified jest wysyłany tylko dla szczegółów - max `updated_at` listy nie
+zmienia się po usunięciu elementu, liczba wierszy w ETag już tak.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import caching
+
+
+class ConditionalGetMixin:
+    """
+    ETag i Last-Modified dla `list` i `retrieve`. `etag_dependencies` to modele
+    (generacje booksApp.caching), których zmiany nie podbijają `updated_at`
+    obiektów widoku; przy `cache_per_user` znacznik zależy też od półek użytkownika.
+    """
+    etag_dependencies = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def get_validators(self, request, **kwargs):
+        if self.action in getattr(self, 'cached_actions', ()):
+            return self.get_cached_validators(request)
+
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            queryset = self.get_queryset().filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+        state = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        if self.action == 'retrieve' and not state['count']:
+            return None, None
+
+        dependencies = [caching.dependency_name(dep) for dep in self.etag_dependencies]
+        user = 'anonymous'
+        if getattr(self, 'cache_per_user', False) and request.user.is_authenticated:
+            user = str(request.user.pk)
+            dependencies.append(caching.shelves_dependency(user))
+        generations = caching.get_generations(dependencies)
+
+        etag = self.make_etag(
+            request, user, state['count'],
+            state['last_modified'].isoformat() if state['last_modified'] else '', *generations,
+        )
+        last_modified = None
+        if self.action == 'retrieve' and state['last_modified']:
+            last_modified = int(max(state['last_modified'].timestamp(), max(generations, default=0) / 10**9))
+        return etag, last_modified
+
+    def get_cached_validators(self, request):
+        """
+        Akcje z cache odpowiedzi (booksApp.caching) mają znacznik z klucza wpisu
+        i generacji - bez zapytania do bazy. Generacja to czas ostatniej zmiany,
+        więc najnowsza z nich jest też górnym ograniczeniem Last-Modified.
+        """
+        key, generations = self.get_cache_key(request)
+        generations += caching.get_generations([caching.dependency_name(dep) for dep in self.etag_dependencies])
+
+        last_modified = None
+        if self.action == 'retrieve':
+            last_modified = max(generations) // 10**9
+        return self.make_etag(request, key, *generations), last_modified
+
+    @staticmethod
+    def make_etag(request, *state):
+        fingerprint = [request.get_full_path(), request.accepted_renderer.format, *state]
+        return '"%s"' % hashlib.sha256('|'.join(map(str, fingerprint)).encode()).hexdigest()[:32]
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified):
+        if etag is None:
+            return False
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            # If-Modified-Since jest ignorowany, gdy klient przysłał If-None-Match (RFC 9110)
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags or etag in [tag.removeprefix('W/') for tag in etags]
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return last_modified is not None and if_modified_since is not None and last_modified <= if_modified_since
+
+    def conditional_response(self, view, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, **kwargs)
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        if etag is None:
+            return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        if getattr(self, 'cache_per_user', False):
+            patch_vary_headers(response, ['Accept', 'Authorization'])
+        else:
+            patch_vary_headers(response, ['Accept'])
+        return response
@@ -0,0 +1,269 @@
+"""
+Automatyczne planowanie select_related/prefetch_related na podstawie drzewa pól serializera.
+
+Serializer może zdefiniować `prepare_queryset(cls, queryset)` (classmethod), żeby
+dodać adnotacje - plan stosuje go do głównego querysetu i do querysetów Prefetch
+zagnieżdżonych list.
+
+Zagnieżdżone serializery z `object_cache = True` (obiekty referencyjne, booksApp.object_cache)
+nie dostają JOIN-a - plan zbiera ich klucze obce z całej strony i wczytuje obiekty
+hurtowo z cache przed serializacją. Podobnie serializery z `fragment_cache = True`
+(serializers_package.fragments): ich relacje M2M nie są prefetchowane, a fragmenty
+całej strony są pobierane jednym `get_many` przed serializacją.
+"""
+import logging
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Model, Prefetch
+from rest_framework import permissions, serializers
+
+from booksServer.middleware import record_timing
+
+from .object_cache import object_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EagerLoadingPlan:
+    select_related: list = field(default_factory=list)
+    prefetch_related: list = field(default_factory=list)
+    # (ścieżka relacji, kolumna klucza obcego, model) dla obiektów z object_cache
+    cached_objects: list = field(default_factory=list)
+    # (ścieżka relacji, klasa serializera) dla zagnieżdżonych fragmentów z cache
+    fragments: list = field(default_factory=list)
+
+    def add_select(self, path):
+        if path not in self.select_related:
+            self.select_related.append(path)
+
+    def add_prefetch(self, lookup):
+        path = lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+        known = [p.prefetch_to if isinstance(p, Prefetch) else p for p in self.prefetch_related]
+        if path not in known:
+            self.prefetch_related.append(lookup)
+
+    def merge(self, other, prefix):
+        for path in other.select_related:
+            self.add_select(f'{prefix}__{path}')
+        for lookup in other.prefetch_related:
+            if isinstance(lookup, Prefetch):
+                self.add_prefetch(Prefetch(f'{prefix}__{lookup.prefetch_through}', queryset=lookup.queryset))
+            else:
+                self.add_prefetch(f'{prefix}__{lookup}')
+        self.merge_cached(other, prefix)
+
+    def merge_cached(self, other, prefix):
+        for path, attname, model in other.cached_objects:
+            self.cached_objects.append(([*prefix.split('__'), *path], attname, model))
+        for path, serializer_class in other.fragments:
+            self.fragments.append(([*prefix.split('__'), *path], serializer_class))
+
+    def prime(self, instances, context):
+        """
+        Wczytuje hurtowo do object_cache obiekty referencyjne wskazane przez `instances`,
+        a fragmenty zagnieżdżonych serializerów - do `context['fragments']`.
+        """
+        for path, attname, model in self.cached_objects:
+            ids = {getattr(obj, attname) for obj in _walk(instances, path)} - {None}
+            if ids:
+                object_cache.get_many(model, ids)
+        for path, serializer_class in self.fragments:
+            serializer_class(context=context).prime(_walk(instances, path))
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        return queryset
+
+
+def _walk(instances, path):
+    for name in path:
+        related = []
+        for obj in instances:
+            value = getattr(obj, name, None)
+            if isinstance(value, Model):
+                related.append(value)
+            elif value is not None:
+                related.extend(value.all())
+        instances = related
+    return instances
+
+
+def _relation_path(model, source_attrs):
+    """
+    Przechodzi po atrybutach `source` dopóki są relacjami. Zwraca listę
+    relacji (nazwa, pole) aż do pierwszej relacji wielokrotnej włącznie.
+    """
+    path = []
+    for attr in source_attrs:
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        if not model_field.is_relation or attr != model_field.name:
+            # `book_id` to wartość kolumny, a nie relacja
+            break
+        path.append((attr, model_field))
+        if model_field.many_to_many or model_field.one_to_many:
+            break
+        model = model_field.related_model
+    return path
+
+
+def _nested_plan(serializer, model):
+    plan = build_eager_loading_plan(serializer, model)
+    prepare = getattr(serializer, 'prepare_queryset', None)
+    if prepare is None and not plan.select_related:
+        return plan, None
+    queryset = model._default_manager.all()
+    if prepare is not None:
+        queryset = prepare(queryset)
+    return plan, plan.apply(queryset)
+
+
+def build_eager_loading_plan(serializer, model):
+    plan = EagerLoadingPlan()
+
+    for serializer_field in serializer.fields.values():
+        if serializer_field.write_only:
+            continue
+
+        relations = _relation_path(model, serializer_field.source_attrs)
+        if not relations:
+            continue
+
+        lookup = '__'.join(name for name, _ in relations)
+        last = relations[-1][1]
+        is_many = last.many_to_many or last.one_to_many
+        related_model = last.related_model
+
+        nested = serializer_field.child if isinstance(serializer_field, serializers.ListSerializer) else serializer_field
+
+        if isinstance(nested, serializers.Serializer) and getattr(nested, 'fragment_cache', False):
+            # Wiersze obiektów są potrzebne (klucz fragmentu), ich relacje tylko przy chybieniu cache
+            if is_many:
+                plan.add_prefetch(lookup)
+            else:
+                plan.add_select(lookup)
+            plan.fragments.append((lookup.split('__'), type(nested)))
+        elif isinstance(serializer_field, serializers.ListSerializer) and is_many:
+            child_plan, queryset = _nested_plan(serializer_field.child, related_model)
+            if queryset is not None:
+                plan.add_prefetch(Prefetch(lookup, queryset=queryset))
+                plan.merge_cached(child_plan, lookup)
+            else:
+                plan.add_prefetch(lookup)
+                plan.merge(child_plan, lookup)
+        elif (
+            isinstance(serializer_field, serializers.Serializer) and not is_many
+            and getattr(serializer_field, 'object_cache', False) and len(relations) == 1
+            and object_cache.is_cached(related_model)
+        ):
+            # Wystarczy klucz obcy z wiersza, obiekt przyjdzie z object_cache
+            plan.cached_objects.append(([], last.attname, related_model))
+        elif isinstance(serializer_field, serializers.Serializer) and not is_many:
+            plan.add_select(lookup)
+            plan.merge(build_eager_loading_plan(serializer_field, related_model), lookup)
+        elif is_many:
+            plan.add_prefetch(lookup)
+        elif (
+            isinstance(serializer_field, serializers.PrimaryKeyRelatedField)
+            and len(relations) == 1 and serializer_field.use_pk_only_optimization()
+        ):
+            # Wystarczy wartość klucza obcego z wiersza
+            continue
+        else:
+            plan.add_select(lookup)
+
+    return plan
+
+
+_plans = {}
+
+
+def get_eager_loading_plan(serializer_class):
+    if serializer_class not in _plans:
+        _plans[serializer_class] = build_eager_loading_plan(serializer_class(), serializer_class.Meta.model)
+    return _plans[serializer_class]
+
+
+class EagerLoadingMixin:
+    """
+    Dodaje do querysetu widoku eager loading wyliczony z `serializer_class`.
+
+    Plan jest nakładany w `filter_queryset`, więc obejmuje list, retrieve
+    i akcje dodatkowe niezależnie od nadpisanego `get_queryset`. W trybie DEBUG
+    każde zapytanie wykonane podczas serializacji jest logowane jako ostrzeżenie.
+    """
+
+    def filter_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+
+        # Adnotacje przed filtrami, żeby dało się po nich sortować
+        prepare = getattr(serializer_class, 'prepare_queryset', None)
+        if prepare is not None:
+            queryset = prepare(queryset)
+
+        queryset = super().filter_queryset(queryset)
+        return get_eager_loading_plan(serializer_class).apply(queryset)
+
+    def get_serializer(self, *args, **kwargs):
+        instance = args[0] if args else kwargs.get('instance')
+        if instance is not None and self.request.method in permissions.SAFE_METHODS:
+            if kwargs.get('many'):
+                # Serializer i tak przejdzie po całym querysecie - wczytujemy go tylko raz
+                instances = list(instance)
+                if args:
+                    args = (instances, *args[1:])
+                else:
+                    kwargs['instance'] = instances
+            else:
+                instances = [instance]
+            context = kwargs.setdefault('context', self.get_serializer_context())
+            with record_timing('object_cache'):
+                get_eager_loading_plan(self.get_serializer_class()).prime(instances, context)
+
+        serializer = super().get_serializer(*args, **kwargs)
+        if settings.DEBUG and self.request.method in permissions.SAFE_METHODS:
+            serializer.to_representation = self._guard_lazy_loading(serializer.to_representation)
+        serializer.to_representation = self._timed(serializer.to_representation)
+        return serializer
+
+    @staticmethod
+    def _timed(to_representation):
+        def timed(instance):
+            with record_timing('serializer'):
+                return to_representation(instance)
+        return timed
+
+    def _guard_lazy_loading(self, to_representation):
+        def guarded(instance):
+            if hasattr(instance, '_fetch_all'):
+                instance = list(instance)
+
+            queries = []
+
+            def record(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record))
+                data = to_representation(instance)
+
+            if queries:
+                logger.warning(
+                    "%s: serializacja wykonała %d zapytań poza planem eager loading, np.: %s",
+                    self.__class__.__name__, len(queries), queries[0]
+                )
+            return data
+
+        return guarded
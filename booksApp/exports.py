@@ -0,0 +1,84 @@
+from itertools import islice
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Book
+from .serializers_package.fields import ImageUrlsField
+from .serializers_package.serializers import BookCompactSerializer
+
+EXPORT_CHUNK_SIZE = 1000
+
+STREAM_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _related_names(through, field_name, book_ids):
+    """Nazwy autorów lub gatunków dla całej paczki książek w jednym zapytaniu."""
+    names = {book_id: [] for book_id in book_ids}
+    related = through.objects.filter(book_id__in=book_ids).select_related(field_name).order_by('pk')
+    for row in related:
+        names[row.book_id].append(str(getattr(row, field_name)))
+    return names
+
+
+def iter_compact_books(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Zwraca kolejne paczki słowników w formacie `BookCompactSerializer`.
+
+    Wiersze książek są czytane przez `values().iterator()`, a autorzy i gatunki
+    dociągani raz na paczkę, więc zużycie pamięci nie zależy od rozmiaru katalogu.
+    """
+    fields = BookCompactSerializer().fields
+    columns = set()
+    for name, field in fields.items():
+        if isinstance(field, ImageUrlsField):
+            columns.update((field.url_field, field.renditions_field))
+        elif name not in ('authors', 'genres'):
+            columns.add(name)
+    rows = queryset.select_related(None).prefetch_related(None).values(*columns)
+
+    for chunk in _chunks(rows.iterator(chunk_size=chunk_size), chunk_size):
+        book_ids = [row['id'] for row in chunk]
+        authors = _related_names(Book.authors.through, 'author', book_ids)
+        genres = _related_names(Book.genres.through, 'genre', book_ids)
+
+        items = []
+        for row in chunk:
+            item = {}
+            for name in fields:
+                if name == 'authors':
+                    item[name] = authors[row['id']]
+                elif name == 'genres':
+                    item[name] = genres[row['id']]
+                elif isinstance(fields[name], ImageUrlsField):
+                    item[name] = fields[name].build(row[fields[name].url_field], row[fields[name].renditions_field])
+                else:
+                    value = row[name]
+                    item[name] = None if value is None else fields[name].to_representation(value)
+            items.append(item)
+        yield items
+
+
+def stream_compact_books(queryset, stream_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Generator tekstu NDJSON lub tablicy JSON, po jednym kawałku na paczkę."""
+    encoder = JSONEncoder(ensure_ascii=False)
+
+    if stream_format == 'ndjson':
+        for items in iter_compact_books(queryset, chunk_size):
+            yield ''.join(encoder.encode(item) + '\n' for item in items)
+        return
+
+    yield '['
+    separator = ''
+    for items in iter_compact_books(queryset, chunk_size):
+        yield separator + ','.join(encoder.encode(item) for item in items)
+        separator = ','
+    yield ']'
@@ -1,5 +1,8 @@
 from django_filters import rest_framework as filters
+from rest_framework.filters import SearchFilter
+
 from .models import Book
+from .search import get_search_backend
 
 class BookFilter(filters.FilterSet):
     published_year__gte = filters.NumberFilter(field_name="published_year", lookup_expr="gte")
@@ -7,4 +10,14 @@ class BookFilter(filters.FilterSet):
 
     class Meta:
         model = Book
-        fields = ['authors', 'genres', 'publisher', 'published_year__gte', 'published_year__lte']
\ No newline at end of file
+        fields = ['authors', 'genres', 'publisher', 'published_year__gte', 'published_year__lte']
+
+
+class BookSearchFilter(SearchFilter):
+    """`?search=` obsługiwane przez indeks wyszukiwania zamiast LIKE po polach."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_search_backend().search(queryset, query)
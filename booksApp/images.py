@@ -0,0 +1,148 @@
+"""
+Miniatury okładek i awatarów.
+
+Po uploadzie obraz jest dekodowany raz, w puli procesów (poza wątkiem żądania),
+i zapisywany w rozmiarach `IMAGE_RENDITION_SIZES` (szerokość w px) jako WebP
+i JPEG bez metadanych. Mapa URL-i trafia do `Book.cover_renditions` /
+`Profile.avatar_renditions` razem z URL-em oryginału, z którego powstały:
+
+    {"source": "...", "96": {"webp": "...", "jpeg": "..."}, "256": {...}, "600": {...}}
+
+Mapa jest też zapamiętywana w `StoredBlob.renditions`, skąd sygnały kopiują ją do
+obiektów, którym URL przypisano przed zakończeniem zadania lub po nim.
+
+Pillow jest zależnością opcjonalną - bez niego miniatury nie powstają,
+a klienci dostają oryginał.
+"""
+import importlib.util
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_process_pool = None
+_thread_pool = None
+_lock = threading.Lock()
+
+
+def renditions_enabled():
+    return settings.IMAGE_RENDITIONS_ENABLED and importlib.util.find_spec('PIL') is not None
+
+
+def render(path, sizes):
+    """
+    Wykonywane w procesie roboczym: zwraca {rozmiar: {format: bajty}}.
+    Większe rozmiary są skalowane pierwsze, a każdy mniejszy powstaje z poprzedniego.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as source:
+        # Dekoder JPEG może od razu zmniejszyć obraz (DCT scaling); oba wymiary,
+        # bo orientacja z EXIF może je zamienić
+        source.draft('RGB', (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+    results = {}
+    for size in sorted(sizes, reverse=True):
+        if image.width > size:
+            image = image.copy()
+            image.thumbnail((size, image.height), Image.Resampling.LANCZOS)
+
+        results[size] = {}
+        for name, (pil_format, _, options) in RENDITION_FORMATS.items():
+            output = io.BytesIO()
+            frame = image
+            if pil_format == 'JPEG' and image.mode == 'RGBA':
+                # JPEG nie ma przezroczystości - podkładamy białe tło
+                frame = Image.new('RGB', image.size, 'white')
+                frame.paste(image, mask=image.getchannel('A'))
+            # Zapis bez exif/icc_profile - metadane nie są przenoszone
+            frame.save(output, pil_format, **options)
+            results[size][name] = output.getvalue()
+    return results
+
+
+def _get_pools():
+    global _process_pool, _thread_pool
+    with _lock:
+        if _process_pool is None:
+            # spawn: proces roboczy nie dziedziczy wątków i połączeń Django
+            _process_pool = ProcessPoolExecutor(
+                settings.IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+            _thread_pool = ThreadPoolExecutor(settings.IMAGE_WORKERS, thread_name_prefix='image-renditions')
+        return _process_pool, _thread_pool
+
+
+def _rendition_name(url, size, extension):
+    stem = os.path.splitext(url.rsplit('/', 1)[-1])[0]
+    return f"{stem}_{size}w.{extension}"
+
+
+def _process(spooled, bucket, url, save_urls):
+    # Importy Django tutaj - proces roboczy (spawn) importuje ten moduł bez konfiguracji
+    from django.core.files.base import ContentFile
+
+    from .models import StoredBlob
+    from .storage import get_storage
+
+    process_pool, _ = _get_pools()
+    storage = get_storage()
+    try:
+        rendered = process_pool.submit(render, spooled.name, settings.IMAGE_RENDITION_SIZES).result()
+        urls = {'source': url}
+        for size, formats in rendered.items():
+            urls[str(size)] = {}
+            for extension, data in formats.items():
+                name = _rendition_name(url, size, extension)
+                content_type = RENDITION_FORMATS[extension][1]
+                urls[str(size)][extension] = storage.save(bucket, name, ContentFile(data, name=name), content_type)
+        # Kolejny upload tej samej treści dostanie miniatury od razu
+        StoredBlob.objects.filter(bucket=bucket, url=url).update(renditions=urls)
+        save_urls(urls)
+    except Exception:
+        logger.exception("Nie udało się przygotować miniatur dla %s", url)
+    finally:
+        spooled.close()
+        close_old_connections()
+
+
+def create_renditions(spooled, bucket, url, save_urls):
+    """
+    Planuje w tle miniatury treści z pliku tymczasowego `spooled` (przejmuje go
+    i zamyka), której oryginał jest pod `url`. Po zapisaniu wszystkich rozmiarów
+    wywołuje `save_urls(mapa_urli)`.
+    """
+    _, thread_pool = _get_pools()
+    thread_pool.submit(_process, spooled, bucket, url, save_urls)
+
+
+def upload_image(bucket, file, save_urls, on_error=None):
+    """
+    Zapisuje obraz w magazynie (`storage.upload`) i zwraca jego `StoredBlob`.
+    Miniatury są generowane tylko dla treści, która jeszcze ich nie ma - z kopii
+    pliku zrobionej przy uploadzie i dopiero wtedy, gdy wiersz `StoredBlob` jest
+    zatwierdzony, żeby zadanie mogło zapisać w nim mapę miniatur.
+    """
+    from .storage import upload
+
+    def on_stored(blob, spooled):
+        if blob.renditions:
+            spooled.close()
+        else:
+            create_renditions(spooled, bucket, blob.url, save_urls)
+
+    return upload(bucket, file, on_error=on_error, on_stored=on_stored if renditions_enabled() else None)
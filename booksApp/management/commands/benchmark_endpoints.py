@@ -0,0 +1,136 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from booksApp.models import Conversation
+
+
+def _percentile(sorted_values, percent):
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Mierzy przepustowość, opóźnienia p50/p99 i liczbę zapytań głównych endpointów API w procesie."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help="Liczba mierzonych żądań na endpoint.")
+        parser.add_argument('--warmup', type=int, default=5, help="Liczba żądań rozgrzewających na endpoint.")
+        parser.add_argument('--user', help="Nazwa użytkownika, w imieniu którego wysyłane są żądania.")
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help="Ogranicza pomiar do wybranych endpointów (można podać wielokrotnie).")
+        parser.add_argument('--baseline', help="Plik JSON z wynikami odniesienia do porównania.")
+        parser.add_argument('--save-baseline', help="Zapisuje wyniki do pliku JSON jako nowe odniesienie.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Dopuszczalny względny wzrost opóźnień względem odniesienia (domyślnie 25%%).")
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+
+        endpoints = self.get_endpoints(user)
+        if options['endpoints']:
+            endpoints = {name: url for name, url in endpoints.items() if name in options['endpoints']}
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, url in endpoints.items():
+                results[name] = self.measure(client, url, options['requests'], options['warmup'])
+                self.report(name, results[name])
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump(results, baseline_file, indent=2)
+            self.stdout.write(f"Zapisano odniesienie: {options['save_baseline']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = self.compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError("Regresje wydajności:\n" + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS("Brak regresji względem odniesienia."))
+
+    @staticmethod
+    def get_user(username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"Użytkownik {username} nie istnieje.")
+        # Domyślnie użytkownik z rozmowami, żeby endpointy wiadomości nie były puste
+        conversation = Conversation.objects.order_by('pk').first()
+        user = conversation.participants.first() if conversation else User.objects.order_by('pk').first()
+        if user is None:
+            raise CommandError("Brak użytkowników - najpierw uruchom seed_dataset.")
+        return user
+
+    @staticmethod
+    def get_endpoints(user):
+        conversation = user.conversations.order_by('pk').first()
+        messages_url = '/api/messages/'
+        if conversation:
+            messages_url += f'?conversation={conversation.pk}'
+        return {
+            'books': '/api/books/',
+            'books/compact': '/api/books/compact/',
+            'listings': '/api/listings/',
+            'conversations': '/api/conversations/',
+            'messages': messages_url,
+            'users': '/api/users/',
+            'wishlist': '/api/wishlist/',
+        }
+
+    @staticmethod
+    def measure(client, url, requests, warmup):
+        for _ in range(warmup):
+            client.get(url)
+
+        durations = []
+        queries = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                request_started = time.perf_counter()
+                response = client.get(url)
+                durations.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url} zwrócił {response.status_code}")
+            queries += len(context.captured_queries)
+        elapsed = time.perf_counter() - started
+
+        durations.sort()
+        return {
+            'url': url,
+            'throughput_rps': round(requests / elapsed, 1),
+            'p50_ms': round(_percentile(durations, 50), 2),
+            'p99_ms': round(_percentile(durations, 99), 2),
+            'queries': round(queries / requests, 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<15} {result['throughput_rps']:>8} req/s  p50 {result['p50_ms']:>8} ms  "
+            f"p99 {result['p99_ms']:>8} ms  {result['queries']:>5} zapytań"
+        )
+
+    @staticmethod
+    def compare(results, baseline, tolerance):
+        regressions = []
+        for name, result in results.items():
+            reference = baseline.get(name)
+            if reference is None:
+                continue
+            for metric in ('p50_ms', 'p99_ms'):
+                if result[metric] > reference[metric] * (1 + tolerance):
+                    regressions.append(f"{name}: {metric} {reference[metric]} -> {result[metric]}")
+            if result['queries'] > reference['queries']:
+                regressions.append(f"{name}: zapytania {reference['queries']} -> {result['queries']}")
+        return regressions
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from booksApp.models import Book, Profile, StoredBlob
+from booksApp.storage import StorageError, get_storage
+
+
+def blob_names(blob):
+    """Nazwy wszystkich obiektów w magazynie należących do blobu - oryginał i miniatury."""
+    names = [blob.name]
+    for size, formats in blob.renditions.items():
+        if size == 'source':
+            continue
+        names.extend(url.rsplit('/', 1)[-1] for url in formats.values())
+    return names
+
+
+def unused_blobs(cutoff):
+    """Pliki nieużyte od `cutoff`, na które nie wskazuje żadna książka ani profil."""
+    return StoredBlob.objects.filter(last_used_at__lt=cutoff).filter(
+        ~Exists(Book.objects.filter(cover_url=OuterRef('url'))),
+        ~Exists(Profile.objects.filter(avatar=OuterRef('url'))),
+    )
+
+
+class Command(BaseCommand):
+    help = "Usuwa z magazynu plików obrazy (i ich miniatury), do których nie odwołuje się żadna książka ani profil."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Tylko wypisuje nieużywane pliki, bez usuwania.")
+        parser.add_argument('--min-age', type=int, default=24,
+                            help="Pomija pliki przesłane (także ponownie) w ciągu podanej liczby godzin (upload mógł jeszcze nie trafić do modelu).")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['min_age'])
+        orphans = unused_blobs(cutoff).order_by('pk')
+
+        storage = get_storage()
+        removed = failed = 0
+        for blob in orphans.iterator(chunk_size=500):
+            if options['dry_run']:
+                self.stdout.write(f"{blob.bucket}/{blob.name} ({blob.size} B, plików: {len(blob_names(blob))})")
+                removed += 1
+                continue
+            try:
+                with transaction.atomic():
+                    # Ponowne sprawdzenie pod blokadą wiersza: upload tej samej treści (storage._touch)
+                    # czeka na nią, a plik mógł zostać użyty od czasu wybrania kandydatów
+                    blob = unused_blobs(cutoff).select_for_update().filter(pk=blob.pk).first()
+                    if blob is None:
+                        continue
+                    for name in blob_names(blob):
+                        storage.delete(blob.bucket, name)
+                    blob.delete()
+            except StorageError as e:
+                self.stderr.write(f"Nie udało się usunąć {blob.bucket}/{blob.name}: {e.detail}")
+                failed += 1
+                continue
+            removed += 1
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Nieużywanych plików: {removed}."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Usunięto {removed} nieużywanych plików, błędów: {failed}."))
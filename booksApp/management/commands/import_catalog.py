@@ -0,0 +1,370 @@
+import csv
+import gzip
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from booksApp import caching
+from booksApp.models import Author, Book, Genre, Publisher
+from booksApp.search import index_books
+
+# Pola książki, które można zaimportować (i nadpisać przy istniejącym ISBN)
+BOOK_FIELDS = ('title', 'description', 'pages', 'publisher', 'published_year', 'edition_type', 'cover_url')
+EDITION_TYPES = {value for value, _ in Book.EDITION_TYPES}
+LIST_SEPARATORS = (';', '|')
+
+# ONIX 3.0: ProductIDType 15 = ISBN-13, 02 = ISBN-10; ExtentType 00 = liczba stron
+ONIX_ISBN_TYPES = ('15', '02')
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8-sig', newline='')
+    return open(path, encoding='utf-8-sig', newline='')
+
+
+def _split(value):
+    """Lista nazw z pola rekordu; pary (imię, nazwisko) z ONIX przechodzą bez zmian."""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        items = []
+        for item in value:
+            if isinstance(item, (list, tuple)):
+                if any(str(part or '').strip() for part in item):
+                    items.append(tuple(item))
+            elif str(item).strip():
+                items.append(str(item).strip())
+        return items
+    for separator in LIST_SEPARATORS:
+        if separator in value:
+            return [item.strip() for item in value.split(separator) if item.strip()]
+    return [value.strip()] if value.strip() else []
+
+
+def _int(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def author_key(name):
+    """'Jan Kowalski', 'Kowalski, Jan' albo ('Jan', 'Kowalski') -> ('Jan', 'Kowalski')."""
+    if isinstance(name, (list, tuple)):
+        parts = [str(part or '').strip() for part in name]
+        if len(parts) == 2:
+            return parts[0][:100], parts[1][:100]
+        name = ' '.join(part for part in parts if part)
+    if ',' in name:
+        last_name, first_name = name.split(',', 1)
+    else:
+        first_name, _, last_name = name.strip().rpartition(' ')
+        if not first_name:
+            first_name, last_name = last_name, ''
+    return first_name.strip()[:100], last_name.strip()[:100]
+
+
+# - READERS
+# Każdy czytnik zwraca słowniki z kluczami z BOOK_FIELDS oraz isbn, authors, genres;
+# brak klucza oznacza, że rekord nie zmienia tego pola.
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield {key.strip(): value for key, value in row.items() if key and value is not None}
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _find_text(element, *path):
+    for child in element:
+        if _local(child.tag) == path[0]:
+            if len(path) == 1:
+                return (child.text or '').strip()
+            found = _find_text(child, *path[1:])
+            if found:
+                return found
+    return None
+
+
+def _find_all(element, name):
+    return [child for child in element.iter() if _local(child.tag) == name]
+
+
+def read_onix(stream):
+    """Rekordy <Product> w stylu ONIX 3.0 (znaczniki referencyjne), czytane strumieniowo."""
+    for _, element in ET.iterparse(stream, events=('end',)):
+        if _local(element.tag) != 'Product':
+            continue
+
+        record = {'isbn': None}
+        for identifier in _find_all(element, 'ProductIdentifier'):
+            if _find_text(identifier, 'ProductIDType') in ONIX_ISBN_TYPES:
+                record['isbn'] = _find_text(identifier, 'IDValue')
+                break
+        title = _find_text(element, 'DescriptiveDetail', 'TitleDetail', 'TitleElement', 'TitleText')
+        if title:
+            record['title'] = title
+
+        authors = []
+        for contributor in _find_all(element, 'Contributor'):
+            if _find_text(contributor, 'KeyNames'):
+                authors.append((_find_text(contributor, 'NamesBeforeKey') or '', _find_text(contributor, 'KeyNames')))
+            elif _find_text(contributor, 'PersonName'):
+                authors.append(_find_text(contributor, 'PersonName'))
+        if authors:
+            record['authors'] = authors
+
+        genres = [text for subject in _find_all(element, 'Subject') if (text := _find_text(subject, 'SubjectHeadingText'))]
+        if genres:
+            record['genres'] = genres
+
+        for extent in _find_all(element, 'Extent'):
+            if _find_text(extent, 'ExtentType') == '00':
+                record['pages'] = _find_text(extent, 'ExtentValue')
+        for name in _find_all(element, 'PublisherName'):
+            record['publisher'] = (name.text or '').strip()
+        for date in _find_all(element, 'PublishingDate'):
+            record['published_year'] = (_find_text(date, 'Date') or '')[:4]
+        for text in _find_all(element, 'Text'):
+            record['description'] = ''.join(text.itertext()).strip()
+            break
+
+        yield record
+        # Przetworzony produkt jest zwalniany - pamięć nie rośnie z rozmiarem pliku
+        element.clear()
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'onix': read_onix}
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.xml': 'onix', '.onix': 'onix'}
+
+
+def clean(record):
+    """Rekord z pliku -> (isbn, pola książki, autorzy, gatunki); None dla rekordu bez ISBN lub tytułu."""
+    isbn = ''.join(char for char in str(record.get('isbn') or '') if char.isalnum()).upper()
+    if not isbn or len(isbn) > 13:
+        return None
+
+    fields = {}
+    for name in BOOK_FIELDS:
+        if name in record:
+            value = record[name]
+            if name in ('pages', 'published_year'):
+                value = _int(value)
+            elif name == 'edition_type':
+                value = value if value in EDITION_TYPES else Book.HARDCOVER
+            elif isinstance(value, str):
+                value = value.strip() or None
+            fields[name] = value
+    if not fields.get('title'):
+        return None
+    fields['title'] = fields['title'][:200]
+    if fields.get('publisher'):
+        fields['publisher'] = fields['publisher'][:100]
+
+    authors = _split(record.get('authors'))
+    genres = _split(record.get('genres'))
+    return (
+        isbn, fields,
+        None if authors is None else list(dict.fromkeys(author_key(name) for name in authors)),
+        None if genres is None else list(dict.fromkeys(name[:100] for name in genres)),
+    )
+
+
+# - LOOKUP CACHES
+
+class NameCache:
+    """Mapa nazwa -> id dla modeli z unikalną nazwą (Genre, Publisher); brakujące są tworzone hurtowo."""
+
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+
+    def resolve(self, names):
+        missing = {name for name in names if name not in self.ids}
+        if missing:
+            self.ids.update(self.model.objects.filter(name__in=missing).values_list('name', 'pk'))
+            to_create = missing - self.ids.keys()
+            if to_create:
+                # ignore_conflicts: inny proces mógł właśnie dodać tę samą nazwę
+                self.model.objects.bulk_create([self.model(name=name) for name in to_create], ignore_conflicts=True)
+                self.ids.update(self.model.objects.filter(name__in=to_create).values_list('name', 'pk'))
+        return self.ids
+
+
+class AuthorCache:
+    """Mapa (imię, nazwisko) -> id autora. Author nie ma unikalnych pól - dopasowanie po obu."""
+
+    def __init__(self):
+        self.ids = {}
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key not in self.ids}
+        if missing:
+            existing = Author.objects.filter(last_name__in={last for _, last in missing}).order_by('pk')
+            for pk, first_name, last_name in existing.values_list('pk', 'first_name', 'last_name'):
+                if (first_name, last_name) in missing:
+                    self.ids.setdefault((first_name, last_name), pk)
+            to_create = [key for key in missing if key not in self.ids]
+            created = Author.objects.bulk_create(
+                [Author(first_name=first_name, last_name=last_name) for first_name, last_name in to_create]
+            )
+            if any(author.pk is None for author in created):
+                return self.resolve(keys)
+            self.ids.update(((author.first_name, author.last_name), author.pk) for author in created)
+        return self.ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Importuje katalog książek z pliku CSV, JSONL lub ONIX (XML) - tworzy brakujących autorów, "
+        "gatunki i wydawców, a książki aktualizuje po ISBN. Plik jest czytany strumieniowo, partiami."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Plik z katalogiem (może być skompresowany .gz).")
+        parser.add_argument('--format', choices=READERS, help="Format pliku; domyślnie według rozszerzenia.")
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help="Liczba rekordów zapisywanych w jednej transakcji.")
+        parser.add_argument('--resume', action='store_true',
+                            help="Wznawia import od ostatniego punktu kontrolnego (<plik>.checkpoint).")
+        parser.add_argument('--added-by', help="Nazwa użytkownika zapisywana jako dodający nowe książki.")
+        parser.add_argument('--skip-search-index', action='store_true',
+                            help="Nie indeksuje książek (szybciej; potem uruchom rebuild_search_index).")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"Plik {path} nie istnieje.")
+        file_format = options['format'] or EXTENSIONS.get(os.path.splitext(path.removesuffix('.gz'))[1].lower())
+        if file_format is None:
+            raise CommandError("Nie rozpoznano formatu pliku - podaj --format.")
+
+        self.added_by_id = None
+        if options['added_by']:
+            self.added_by_id = User.objects.filter(username=options['added_by']).values_list('pk', flat=True).first()
+            if self.added_by_id is None:
+                raise CommandError(f"Użytkownik {options['added_by']} nie istnieje.")
+        self.skip_search_index = options['skip_search_index']
+        self.authors = AuthorCache()
+        self.genres = NameCache(Genre)
+        self.publishers = NameCache(Publisher)
+
+        checkpoint_path = f"{path}.checkpoint"
+        start = self.read_checkpoint(checkpoint_path, path) if options['resume'] else 0
+        if start:
+            self.stdout.write(f"Wznawianie od rekordu {start}")
+
+        batch_size = options['batch_size']
+        processed, saved, skipped = start, 0, 0
+        started = time.perf_counter()
+        with _open(path) as stream:
+            records = islice(READERS[file_format](stream), start, None)
+            while batch := list(islice(records, batch_size)):
+                with transaction.atomic():
+                    written = self.import_batch(batch)
+                processed += len(batch)
+                saved += written
+                skipped += len(batch) - written
+                self.write_checkpoint(checkpoint_path, path, processed)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"Przetworzono {processed} rekordów ({(processed - start) / elapsed:.0f} rek./s)")
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Zapisano {saved} książek, pominięto {skipped} rekordów bez ISBN lub tytułu, w {elapsed:.1f} s."
+        ))
+
+    def import_batch(self, batch):
+        # Ostatnie wystąpienie ISBN w partii wygrywa (ON CONFLICT nie zmieni wiersza dwa razy)
+        books = {}
+        for record in batch:
+            cleaned = clean(record)
+            if cleaned is not None:
+                books[cleaned[0]] = cleaned
+        if not books:
+            return 0
+
+        author_ids = self.authors.resolve({key for _, _, authors, _ in books.values() for key in authors or ()})
+        genre_ids = self.genres.resolve({name for _, _, _, genres in books.values() for name in genres or ()})
+        publisher_ids = self.publishers.resolve({
+            fields['publisher'] for _, fields, _, _ in books.values() if fields.get('publisher')
+        })
+
+        # Rekordy grupowane po zestawie pól - nieobecne w pliku pola istniejącej książki zostają bez zmian
+        groups = {}
+        for isbn, fields, _, _ in books.values():
+            fields = dict(fields)
+            if 'publisher' in fields:
+                fields['publisher_id'] = publisher_ids.get(fields.pop('publisher'))
+            groups.setdefault(frozenset(fields), []).append(
+                Book(isbn=isbn, added_by_id=self.added_by_id, **fields)
+            )
+        for field_names, objects in groups.items():
+            Book.objects.bulk_create(
+                objects, update_conflicts=True, unique_fields=['isbn'], update_fields=sorted(field_names | {'updated_at'})
+            )
+
+        book_ids = dict(Book.objects.filter(isbn__in=books).values_list('isbn', 'pk'))
+        self.sync_relation(Book.authors.through, 'author_id', book_ids, {
+            isbn: {author_ids[key] for key in authors} for isbn, _, authors, _ in books.values() if authors is not None
+        })
+        self.sync_relation(Book.genres.through, 'genre_id', book_ids, {
+            isbn: {genre_ids[name] for name in genres} for isbn, _, _, genres in books.values() if genres is not None
+        })
+
+        if not self.skip_search_index:
+            index_books(book_ids.values())
+        # bulk_create nie wysyła sygnałów - cache odpowiedzi unieważniamy po zatwierdzeniu partii
+        caching.bump(Book, Author, Genre, Publisher)
+        return len(books)
+
+    @staticmethod
+    def sync_relation(through, column, book_ids, wanted_by_isbn):
+        """Doprowadza tabelę pośrednią M2M do stanu z pliku: usuwa nadmiarowe i dodaje brakujące wiersze."""
+        wanted = {(book_ids[isbn], related_id) for isbn, related in wanted_by_isbn.items() for related_id in related}
+        rows = through.objects.filter(book_id__in=[book_ids[isbn] for isbn in wanted_by_isbn])
+        existing = {(book_id, related_id): pk for pk, book_id, related_id in rows.values_list('pk', 'book_id', column)}
+
+        stale = [pk for pair, pk in existing.items() if pair not in wanted]
+        if stale:
+            through.objects.filter(pk__in=stale).delete()
+        through.objects.bulk_create(
+            [through(book_id=book_id, **{column: related_id}) for book_id, related_id in wanted - existing.keys()],
+            ignore_conflicts=True,
+        )
+
+    @staticmethod
+    def read_checkpoint(checkpoint_path, path):
+        try:
+            with open(checkpoint_path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return 0
+        if checkpoint.get('size') != os.path.getsize(path):
+            raise CommandError("Plik zmienił się od ostatniego importu - usuń punkt kontrolny, aby zacząć od nowa.")
+        return checkpoint['records']
+
+    @staticmethod
+    def write_checkpoint(checkpoint_path, path, records):
+        # Zapis atomowy: przerwanie w trakcie nie zostawi uszkodzonego pliku
+        with open(f"{checkpoint_path}.tmp", 'w') as checkpoint_file:
+            json.dump({'size': os.path.getsize(path), 'records': records}, checkpoint_file)
+        os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
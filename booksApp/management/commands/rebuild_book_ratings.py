@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Now
+
+from booksApp import caching
+from booksApp.models import Book
+from booksApp.signals import rating_stats_expressions
+
+COUNT_FIELDS = ('rating_sum', 'rating_count', *(f'rating_{star}_count' for star in range(1, 6)))
+
+
+class Command(BaseCommand):
+    help = "Przelicza zdenormalizowane agregaty ocen książek (suma, liczba, histogram, średnia) i wykrywa rozbieżności."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Tylko sprawdza rozbieżności, bez zapisu. Kończy się błędem, jeśli jakieś znajdzie.")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Liczba książek przeliczanych w jednej transakcji.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drifted = self.find_drift()
+            if drifted:
+                raise CommandError(f"Rozbieżne agregaty ocen w {len(drifted)} książkach, np. id: {drifted[:20]}")
+            self.stdout.write(self.style.SUCCESS("Agregaty ocen są spójne."))
+            return
+
+        batch_size = options['batch_size']
+        max_id = Book.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Book.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+                    updated_at=Now(), **rating_stats_expressions()
+                )
+            self.stdout.write(f"Przeliczono książki do id {min(start + batch_size - 1, max_id)}")
+
+        caching.bump(Book)
+        self.stdout.write(self.style.SUCCESS(f"Przeliczono agregaty ocen {updated} książek."))
+
+    def find_drift(self):
+        expected = {f'expected_{name}': expr for name, expr in rating_stats_expressions().items()}
+        rows = Book.objects.annotate(**expected).values_list(
+            'pk', *COUNT_FIELDS, 'average_rating', *expected
+        ).order_by('pk').iterator(chunk_size=2000)
+
+        size = len(COUNT_FIELDS) + 1
+        drifted = []
+        for pk, *values in rows:
+            stored, actual = values[:size], values[size:]
+            # Średnia jest zaokrąglona do 2 miejsc - porównujemy z tolerancją zaokrąglenia
+            if stored[:-1] != actual[:-1] or abs(stored[-1] - actual[-1]) > 0.006:
+                drifted.append(pk)
+        return drifted
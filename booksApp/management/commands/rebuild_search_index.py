@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from booksApp.models import Book
+from booksApp.search import index_books
+
+
+class Command(BaseCommand):
+    help = "Przebudowuje indeks wyszukiwania książek."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Liczba książek indeksowanych w jednej transakcji.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        book_ids = Book.objects.order_by('pk').values_list('pk', flat=True)
+
+        indexed = 0
+        batch = []
+        for book_id in book_ids.iterator(chunk_size=batch_size):
+            batch.append(book_id)
+            if len(batch) == batch_size:
+                index_books(batch)
+                indexed += len(batch)
+                batch = []
+                self.stdout.write(f"Zaindeksowano {indexed} książek")
+        index_books(batch)
+        indexed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Zaindeksowano {indexed} książek."))
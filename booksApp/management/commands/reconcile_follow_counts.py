@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from booksApp import caching
+from booksApp.models import Profile
+from booksApp.object_cache import object_cache
+from booksApp.signals import follow_counts_expressions
+
+COUNT_FIELDS = ('followers_count', 'following_count')
+
+
+class Command(BaseCommand):
+    help = "Uzgadnia zdenormalizowane liczniki obserwujących/obserwowanych w profilach z tabelą Follow."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Tylko sprawdza rozbieżności, bez zapisu. Kończy się błędem, jeśli jakieś znajdzie.")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Liczba profili przeliczanych w jednej transakcji.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drifted = self.find_drift()
+            if drifted:
+                raise CommandError(f"Rozbieżne liczniki w {len(drifted)} profilach, np. id użytkowników: {drifted[:20]}")
+            self.stdout.write(self.style.SUCCESS("Liczniki obserwacji są spójne."))
+            return
+
+        batch_size = options['batch_size']
+        max_id = Profile.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Profile.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+                    **follow_counts_expressions()
+                )
+            self.stdout.write(f"Przeliczono profile do id {min(start + batch_size - 1, max_id)}")
+
+        caching.bump(Profile)
+        object_cache.invalidate(User)
+        self.stdout.write(self.style.SUCCESS(f"Przeliczono liczniki {updated} profili."))
+
+    def find_drift(self):
+        expected = {f'expected_{name}': expr for name, expr in follow_counts_expressions().items()}
+        rows = Profile.objects.annotate(**expected).values_list(
+            'user_id', *COUNT_FIELDS, *expected
+        ).order_by('pk').iterator(chunk_size=2000)
+
+        drifted = []
+        for user_id, *values in rows:
+            if values[:len(COUNT_FIELDS)] != values[len(COUNT_FIELDS):]:
+                drifted.append(user_id)
+        return drifted
@@ -0,0 +1,246 @@
+import random
+import time
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from booksApp import caching
+from booksApp.models import (
+    Author, Book, Conversation, Follow, Genre, Listing, Message, Profile, Publisher
+)
+from booksApp.object_cache import object_cache
+from booksApp.search import index_books
+from booksApp.signals import market_stats_expressions, rebuild_inbox_state
+
+PRESETS = {
+    'small': {
+        'users': 200, 'authors': 400, 'publishers': 50, 'books': 2000, 'listings': 10000,
+        'conversations': 1000, 'messages': 20000, 'follows': 2000,
+    },
+    'large': {
+        'users': 50000, 'authors': 20000, 'publishers': 2000, 'books': 100000, 'listings': 1000000,
+        'conversations': 200000, 'messages': 5000000, 'follows': 500000,
+    },
+}
+
+GENRES = [
+    'Fantastyka', 'Kryminał', 'Reportaż', 'Poezja', 'Literatura piękna', 'Biografia',
+    'Historia', 'Science fiction', 'Horror', 'Romans', 'Dla dzieci', 'Poradnik',
+]
+FIRST_NAMES = ['Anna', 'Jan', 'Zofia', 'Stanisław', 'Łucja', 'Michał', 'Wisława', 'Józef', 'Olga', 'Bolesław']
+LAST_NAMES = ['Nowak', 'Kowalska', 'Wiśniewski', 'Lem', 'Szymborska', 'Żeromski', 'Tokarczuk', 'Prus', 'Mróz', 'Sapkowski']
+WORDS = ['dom', 'noc', 'miasto', 'las', 'księga', 'cień', 'rzeka', 'wojna', 'podróż', 'sen', 'łąka', 'gwiazda']
+CITIES = ['Warszawa', 'Kraków', 'Łódź', 'Wrocław', 'Poznań', 'Gdańsk', '']
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Zasiewa bazę syntetycznymi danymi (użytkownicy, książki, ogłoszenia, rozmowy, obserwacje) do testów wydajności."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=PRESETS, default='small',
+                            help="Skala danych. Poszczególne liczności można nadpisać opcjami poniżej.")
+        for name in PRESETS['small']:
+            parser.add_argument(f'--{name}', type=int, help=f"Liczba rekordów: {name}.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0, help="Ziarno generatora liczb losowych.")
+        parser.add_argument('--skip-search-index', action='store_true',
+                            help="Nie buduje indeksu wyszukiwania (można to zrobić później rebuild_search_index).")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        counts = {name: options[name] if options[name] is not None else value
+                  for name, value in PRESETS[options['preset']].items()}
+
+        started = time.perf_counter()
+        users = self.step('users', self.create_users, counts['users'])
+        genres = self.step('genres', self.create_genres)
+        authors = self.step('authors', self.create_authors, counts['authors'])
+        publishers = self.step('publishers', self.create_publishers, counts['publishers'])
+        books = self.step('books', self.create_books, counts['books'], authors, genres, publishers, users)
+        self.step('listings', self.create_listings, counts['listings'], books, users)
+        conversations = self.step('conversations', self.create_conversations, counts['conversations'], users)
+        self.step('messages', self.create_messages, counts['messages'], conversations, books)
+        self.step('follows', self.create_follows, counts['follows'], users)
+
+        # bulk_create pomija sygnały - dane zdenormalizowane liczymy hurtowo
+        self.step('market stats', self.rebuild_market_stats, books)
+        self.step('inbox state', self.rebuild_inbox_state, conversations)
+        if not options['skip_search_index']:
+            self.step('search index', self.rebuild_search_index, books)
+
+        caching.bump(Book, Author, Genre, Publisher, Listing, Profile, Follow)
+        object_cache.invalidate(User)
+        self.stdout.write(self.style.SUCCESS(f"Gotowe w {time.perf_counter() - started:.1f} s."))
+
+    def step(self, name, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        self.stdout.write(f"{name}: {time.perf_counter() - started:.1f} s")
+        return result
+
+    def bulk_create(self, model, objects):
+        created = []
+        for batch in _batches(objects, self.batch_size):
+            with transaction.atomic():
+                created += [obj.pk for obj in model.objects.bulk_create(batch)]
+        return created
+
+    def new_ids(self, model, previous_max, created):
+        # Nie każda baza zwraca klucze z bulk_create - wtedy bierzemy nowe wiersze po id
+        if all(pk is not None for pk in created):
+            return created
+        return list(model.objects.filter(pk__gt=previous_max).values_list('pk', flat=True))
+
+    def create(self, model, objects):
+        previous_max = model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0
+        return self.new_ids(model, previous_max, self.bulk_create(model, objects))
+
+    def create_users(self, count):
+        password = make_password('benchmark')
+        prefix = f"bench{int(time.time())}"
+        user_ids = self.create(User, (
+            User(username=f"{prefix}_{i}", email=f"{prefix}_{i}@example.com", password=password)
+            for i in range(count)
+        ))
+        self.bulk_create(Profile, (Profile(user_id=user_id) for user_id in user_ids))
+        return user_ids
+
+    def create_genres(self):
+        Genre.objects.bulk_create([Genre(name=name) for name in GENRES], ignore_conflicts=True)
+        return list(Genre.objects.values_list('pk', flat=True))
+
+    def create_authors(self, count):
+        rnd = self.random
+        return self.create(Author, (
+            Author(first_name=rnd.choice(FIRST_NAMES), last_name=f"{rnd.choice(LAST_NAMES)} {i}")
+            for i in range(count)
+        ))
+
+    def create_publishers(self, count):
+        prefix = f"Wydawnictwo {int(time.time())}"
+        return self.create(Publisher, (Publisher(name=f"{prefix}-{i}") for i in range(count)))
+
+    def create_books(self, count, authors, genres, publishers, users):
+        rnd = self.random
+        isbn_base = 9780000000000 + (Book.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) * 1000
+        book_ids = self.create(Book, (
+            Book(
+                title=' '.join(rnd.choices(WORDS, k=rnd.randint(1, 4))).capitalize(),
+                isbn=str(isbn_base + i),
+                pages=rnd.randint(80, 900),
+                published_year=rnd.randint(1950, 2025),
+                edition_type=rnd.choice(Book.EDITION_TYPES)[0],
+                publisher_id=rnd.choice(publishers),
+                added_by_id=rnd.choice(users),
+            )
+            for i in range(count)
+        ))
+
+        Book.authors.through.objects.bulk_create((
+            Book.authors.through(book_id=book_id, author_id=author_id)
+            for book_id in book_ids
+            for author_id in set(rnd.choices(authors, k=rnd.choice([1, 1, 1, 2, 3])))
+        ), batch_size=self.batch_size)
+        Book.genres.through.objects.bulk_create((
+            Book.genres.through(book_id=book_id, genre_id=genre_id)
+            for book_id in book_ids
+            for genre_id in set(rnd.choices(genres, k=rnd.choice([1, 2])))
+        ), batch_size=self.batch_size)
+        return book_ids
+
+    def create_listings(self, count, books, users):
+        rnd = self.random
+        self.bulk_create(Listing, (
+            Listing(
+                user_id=rnd.choice(users),
+                book_id=rnd.choice(books),
+                listing_type=Listing.EXCHANGE if rnd.random() < 0.2 else Listing.SALE,
+                condition=rnd.choice([Listing.NEW, Listing.USED]),
+                city=rnd.choice(CITIES),
+                price=Decimal(rnd.randint(500, 15000)) / 100,
+                allow_exchange=rnd.random() < 0.3,
+                is_active=rnd.random() < 0.9,
+            )
+            for _ in range(count)
+        ))
+
+    def create_conversations(self, count, users):
+        rnd = self.random
+        # Rozmowy bezpośrednie są unikalne dla pary użytkowników
+        pairs = set()
+        while len(pairs) < min(count, len(users) * (len(users) - 1) // 2):
+            pairs.add(tuple(sorted(rnd.sample(users, 2))))
+
+        conversation_ids = self.create(Conversation, (
+            Conversation(min_user_id=min_user_id, max_user_id=max_user_id) for min_user_id, max_user_id in pairs
+        ))
+        conversations = {
+            conversation_id: [min_user_id, max_user_id]
+            for conversation_id, min_user_id, max_user_id in Conversation.objects.filter(
+                pk__range=(min(conversation_ids), max(conversation_ids))
+            ).values_list('pk', 'min_user_id', 'max_user_id').iterator()
+        } if conversation_ids else {}
+        Conversation.participants.through.objects.bulk_create((
+            Conversation.participants.through(conversation_id=conversation_id, user_id=user_id)
+            for conversation_id, participants in conversations.items()
+            for user_id in participants
+        ), batch_size=self.batch_size)
+        return conversations
+
+    def create_messages(self, count, conversations, books):
+        rnd = self.random
+        conversation_ids = list(conversations)
+        self.bulk_create(Message, (
+            self.new_message(rnd, conversations, rnd.choice(conversation_ids), books)
+            for _ in range(count)
+        ))
+
+    @staticmethod
+    def new_message(rnd, conversations, conversation_id, books):
+        return Message(
+            conversation_id=conversation_id,
+            sender_id=rnd.choice(conversations[conversation_id]),
+            content=' '.join(rnd.choices(WORDS, k=rnd.randint(2, 12))),
+            is_read=rnd.random() < 0.7,
+            book_id=rnd.choice(books) if rnd.random() < 0.1 else None,
+        )
+
+    def create_follows(self, count, users):
+        rnd = self.random
+        pairs = set()
+        # Graf o rozkładzie potęgowym: część użytkowników jest obserwowana dużo częściej
+        popular = users[:max(1, len(users) // 50)]
+        while len(pairs) < min(count, len(users) * (len(users) - 1)):
+            follower = rnd.choice(users)
+            following = rnd.choice(popular) if rnd.random() < 0.5 else rnd.choice(users)
+            if follower != following:
+                pairs.add((follower, following))
+        Follow.objects.bulk_create(
+            (Follow(follower_id=follower, following_id=following) for follower, following in pairs),
+            batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def rebuild_market_stats(self, books):
+        for batch in _batches(books, self.batch_size):
+            Book.objects.filter(pk__in=batch).update(**market_stats_expressions())
+
+    def rebuild_inbox_state(self, conversations):
+        for batch in _batches(conversations, self.batch_size):
+            with transaction.atomic():
+                rebuild_inbox_state(*batch)
+
+    def rebuild_search_index(self, books):
+        for batch in _batches(books, 1000):
+            index_books(batch)
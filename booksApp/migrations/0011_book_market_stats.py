@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_market_stats(apps, schema_editor):
+    Book = apps.get_model('booksApp', 'Book')
+    Listing = apps.get_model('booksApp', 'Listing')
+
+    active = Listing.objects.filter(book=OuterRef('pk'), is_active=True).order_by().values('book')
+    exchange = active.filter(Q(listing_type='exchange') | Q(allow_exchange=True))
+    Book.objects.update(
+        lowest_price=Subquery(active.annotate(value=Min('price')).values('value')),
+        listings_count=Coalesce(Subquery(active.annotate(value=Count('pk')).values('value')), 0),
+        exchange_listings_count=Coalesce(Subquery(exchange.annotate(value=Count('pk')).values('value')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksApp', '0010_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='exchange_listings_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='listings_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='lowest_price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=8, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['lowest_price', 'id'], name='book_price_keyset_idx'),
+        ),
+        migrations.RunPython(fill_market_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-16 20:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_postgres_indexes(apps, schema_editor):
+    # Indeksy GIN istnieją tylko na PostgreSQL, inne bazy korzystają z BookSearchTerm
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX booksearch_document_fts_idx ON "booksApp_booksearchdocument" '
+        "USING gin (to_tsvector('simple'::regconfig, document))"
+    )
+    schema_editor.execute(
+        'CREATE INDEX booksearch_document_trgm_idx ON "booksApp_booksearchdocument" '
+        'USING gin (document gin_trgm_ops)'
+    )
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS booksearch_document_fts_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS booksearch_document_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksApp', '0012_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchDocument',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='booksApp.book')),
+                ('title', models.TextField()),
+                ('document', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BookSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='booksApp.book')),
+            ],
+            options={
+                'unique_together': {('term', 'book')},
+            },
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_follow_counts(apps, schema_editor):
+    Profile = apps.get_model('booksApp', 'Profile')
+    Follow = apps.get_model('booksApp', 'Follow')
+
+    follows = Follow.objects.order_by()
+    Profile.objects.update(
+        followers_count=Coalesce(Subquery(
+            follows.filter(following=OuterRef('user')).values('following').annotate(value=Count('pk')).values('value')
+        ), 0),
+        following_count=Coalesce(Subquery(
+            follows.filter(follower=OuterRef('user')).values('follower').annotate(value=Count('pk')).values('value')
+        ), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksApp', '0013_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_follow_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.7 on 2026-10-16 21:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_inbox_state(apps, schema_editor):
+    Conversation = apps.get_model('booksApp', 'Conversation')
+    ConversationParticipant = apps.get_model('booksApp', 'ConversationParticipant')
+    Message = apps.get_model('booksApp', 'Message')
+
+    Conversation.objects.update(last_message=Subquery(
+        Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-pk').values('pk')[:1]
+    ))
+    ConversationParticipant.objects.update(unread_count=Coalesce(Subquery(
+        Message.objects.filter(conversation=OuterRef('conversation'), is_read=False)
+        .filter(~Q(sender=OuterRef('user')))
+        .order_by().values('conversation').annotate(value=Count('pk')).values('value')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksApp', '0014_profile_follow_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Istniejąca tabela pośrednia M2M staje się jawnym modelem - bez zmian w bazie
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='booksApp.conversation')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'booksApp_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='booksApp.ConversationParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='booksApp.message'),
+        ),
+        migrations.RunPython(fill_inbox_state, migrations.RunPython.noop),
+    ]
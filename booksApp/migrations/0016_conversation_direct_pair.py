@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:15
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_direct_pairs(apps, schema_editor):
+    Conversation = apps.get_model('booksApp', 'Conversation')
+    ConversationParticipant = apps.get_model('booksApp', 'ConversationParticipant')
+    Message = apps.get_model('booksApp', 'Message')
+
+    # Rozmowy dokładnie dwóch uczestników pogrupowane po parze - najstarsza zostaje
+    direct = (
+        ConversationParticipant.objects.values('conversation')
+        .annotate(participants=Count('user'), min_user=Min('user'), max_user=Max('user'))
+        .filter(participants=2).order_by('conversation')
+    )
+    pairs = defaultdict(list)
+    for row in direct.iterator():
+        pairs[row['min_user'], row['max_user']].append(row['conversation'])
+
+    merged = []
+    for (min_user_id, max_user_id), conversation_ids in pairs.items():
+        keeper, duplicates = conversation_ids[0], conversation_ids[1:]
+        if duplicates:
+            Message.objects.filter(conversation_id__in=duplicates).update(conversation_id=keeper)
+            Conversation.objects.filter(pk__in=duplicates).delete()
+            merged.append(keeper)
+        Conversation.objects.filter(pk=keeper).update(min_user_id=min_user_id, max_user_id=max_user_id)
+
+    # Połączone rozmowy - ostatnia wiadomość, czas aktualizacji i liczniki od nowa
+    if merged:
+        latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-pk')
+        for start in range(0, len(merged), 500):
+            batch = merged[start:start + 500]
+            Conversation.objects.filter(pk__in=batch).update(
+                last_message=Subquery(latest.values('pk')[:1]),
+                updated_at=Coalesce(Subquery(latest.values('timestamp')[:1]), 'updated_at'),
+            )
+            ConversationParticipant.objects.filter(conversation_id__in=batch).update(unread_count=Coalesce(Subquery(
+                Message.objects.filter(conversation=OuterRef('conversation'), is_read=False)
+                .filter(~Q(sender=OuterRef('user')))
+                .order_by().values('conversation').annotate(value=Count('pk')).values('value')
+            ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksApp', '0015_conversation_inbox_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='max_user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='min_user',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_direct_pairs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Osobna migracja (i transakcja): PostgreSQL nie pozwala na ALTER TABLE
+    # po zmianie danych z odroczonymi kluczami obcymi w tej samej transakcji
+
+    dependencies = [
+        ('booksApp', '0016_conversation_direct_pair'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('min_user', 'max_user'), name='conversation_direct_pair_uniq'),
+        ),
+    ]
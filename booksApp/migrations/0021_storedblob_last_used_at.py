@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-16 22:05
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    # Istniejące pliki: ostatnie użycie = upload
+    StoredBlob = apps.get_model('booksApp', 'StoredBlob')
+    StoredBlob.objects.update(last_used_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booksApp', '0020_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedblob',
+            name='last_used_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
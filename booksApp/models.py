@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -7,8 +7,14 @@ from django.utils import timezone
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.URLField(blank=True, null=True)
+    # Miniatury awatara {rozmiar: {format: url}}, zapisywane przez booksApp.images
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(blank=True, null=True)
 
+    # Liczniki obserwacji, utrzymywane przez sygnały Follow
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):
         return f"Profil: {self.user.username}"
 
@@ -17,12 +23,14 @@ class Author(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100, blank=True)
     bio = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
 class Genre(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -30,11 +38,29 @@ class Genre(models.Model):
 class Publisher(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+class BookQuerySet(models.QuerySet):
+    def with_shelves(self, user):
+        """
+        Adnotacje `in_library` i `in_wishlist` dla użytkownika - podzapytania EXISTS
+        po indeksie unique_together (user, book). Dla anonimowego zawsze False.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                in_library=models.Value(False, output_field=models.BooleanField()),
+                in_wishlist=models.Value(False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            in_library=models.Exists(UserLibrary.objects.filter(user=user, book=models.OuterRef('pk'))),
+            in_wishlist=models.Exists(Wishlist.objects.filter(user=user, book=models.OuterRef('pk'))),
+        )
+
+
 class Book(models.Model):
     HARDCOVER = 'hardcover'
     PAPERBACK = 'paperback'
@@ -64,13 +90,43 @@ class Book(models.Model):
     published_year = models.PositiveIntegerField(blank=True, null=True)
     edition_type = models.CharField(max_length=20, choices=EDITION_TYPES, default=HARDCOVER, verbose_name='Typ wydania')
     cover_url = models.URLField(blank=True, null=True)
+    # Miniatury okładki {rozmiar: {format: url}}, zapisywane przez booksApp.images
+    cover_renditions = models.JSONField(default=dict, blank=True, editable=False)
     added_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, related_name='added_books')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Także przy zmianach przez QuerySet.update() (agregaty, autorzy, gatunki) - podstawa ETag/Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
     average_rating = models.FloatField(default=0.0)
 
+    # Agregaty ocen, utrzymywane przyrostowo przez sygnały Review
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Dane rynkowe z aktywnych ogłoszeń, utrzymywane przez sygnały Listing
+    lowest_price = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True, editable=False)
+    listings_count = models.PositiveIntegerField(default=0, editable=False)
+    exchange_listings_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='book_created_keyset_idx'),
+            models.Index(fields=['lowest_price', 'id'], name='book_price_keyset_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.get_edition_type_display()})"
 
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
 # --- LISTING MODELS
 
 class Listing(models.Model):
@@ -97,6 +153,20 @@ class Listing(models.Model):
     allow_exchange = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['price', 'id'], name='listing_price_keyset_idx'),
+            models.Index(fields=['created_at', 'id'], name='listing_created_keyset_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Zapamiętujemy książkę z bazy, żeby po zmianie book_id przeliczyć też starą
+        instance._loaded_book_id = instance.__dict__.get('book_id')
+        return instance
 
     def __str__(self):
         return f"{self.book.title} ({self.listing_type}) by {self.user.username}"
@@ -129,16 +199,38 @@ class Review(models.Model):
     class Meta:
         unique_together = ('user', 'book')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='review_created_keyset_idx'),
+            models.Index(fields=['book', 'created_at', 'id'], name='review_book_keyset_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Sygnały zmieniają agregaty ocen książki o różnicę względem zapisanej oceny,
+        # którą blokują do końca transakcji (select_for_update wymaga transakcji)
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Review by {self.user} for {self.book}"
 
 
+class FollowQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        from .signals import update_follow_counts
+
+        # bulk_create nie wysyła post_save - liczniki przeliczamy dla wszystkich dotkniętych użytkowników
+        objs = super().bulk_create(objs, *args, **kwargs)
+        update_follow_counts(*{user_id for obj in objs for user_id in (obj.follower_id, obj.following_id)})
+        return objs
+
+
 class Follow(models.Model):
     follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
     following = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         unique_together = ('follower', 'following')
 
@@ -146,17 +238,64 @@ class Follow(models.Model):
         return f"{self.follower} → {self.following}"
 
 
+class ConversationQuerySet(models.QuerySet):
+    def get_or_create_direct(self, user_a, user_b):
+        """
+        Rozmowa dwóch użytkowników wyszukiwana po kluczu (min_user, max_user).
+        Unikalny indeks rozstrzyga wyścig równoległych żądań - przegrany
+        dostaje IntegrityError wewnątrz get_or_create i pobiera rozmowę zwycięzcy.
+        """
+        min_user_id, max_user_id = sorted((user_a.pk, user_b.pk))
+        with transaction.atomic():
+            conversation, created = self.get_or_create(min_user_id=min_user_id, max_user_id=max_user_id)
+            if created:
+                conversation.participants.add(min_user_id, max_user_id)
+        return conversation, created
+
+
 class Conversation(models.Model):
-    participants = models.ManyToManyField(User, related_name='conversations')
+    participants = models.ManyToManyField(User, related_name='conversations', through='ConversationParticipant')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Ostatnia wiadomość (zdenormalizowana) - lista rozmów nie wczytuje historii
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
+
+    # Klucz rozmowy bezpośredniej: uczestnicy w kolejności rosnących id (puste dla innych rozmów)
+    min_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, editable=False, related_name='+')
+    max_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, editable=False, related_name='+')
+
+    objects = ConversationQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='conversation_keyset_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['min_user', 'max_user'], name='conversation_direct_pair_uniq'),
+        ]
 
     def __str__(self):
         return f"Rozmowa {self.pk}"
 
+
+class ConversationParticipant(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    # Nieprzeczytane wiadomości od pozostałych uczestników
+    unread_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        db_table = 'booksApp_conversation_participants'
+        unique_together = ('conversation', 'user')
+
+    def __str__(self):
+        return f"{self.user} w {self.conversation}"
+
+
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
@@ -170,6 +309,16 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['conversation', 'timestamp', 'id'], name='message_keyset_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Poprzedni stan odczytu jest potrzebny do aktualizacji liczników nieprzeczytanych
+        instance._loaded_is_read = instance.__dict__.get('is_read')
+        return instance
 
     def __str__(self):
         return f"Message {self.pk} in {self.conversation}"
@@ -213,3 +362,50 @@ class Activity(models.Model):
     def __str__(self):
         return f"{self.user.username}: {self.action}"
 
+
+
+# --- SEARCH MODELS
+
+class BookSearchDocument(models.Model):
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title = models.TextField()
+    document = models.TextField()    # znormalizowane: tytuł, autorzy, wydawca, gatunki, ISBN
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Indeks: {self.book_id}"
+
+
+class BookSearchTerm(models.Model):
+    term = models.CharField(max_length=100)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='search_terms')
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('term', 'book')
+
+    def __str__(self):
+        return f"{self.term} → {self.book_id}"
+
+
+# --- STORAGE MODELS
+
+class StoredBlob(models.Model):
+    """Plik w magazynie adresowany skrótem SHA-256 treści - ten sam plik jest wysyłany tylko raz."""
+    bucket = models.CharField(max_length=100)
+    sha256 = models.CharField(max_length=64)
+    name = models.CharField(max_length=255)
+    url = models.URLField(max_length=500, db_index=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    # Miniatury {rozmiar: {format: url}} w formacie Book.cover_renditions
+    renditions = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Ostatni upload tej treści (także deduplikowany) - gc_stored_blobs pomija świeżo użyte pliki
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        unique_together = ('bucket', 'sha256')
+
+    def __str__(self):
+        return f"{self.bucket}/{self.name}"
@@ -0,0 +1,199 @@
+"""
+Dwupoziomowy cache często serializowanych obiektów referencyjnych
+(użytkownicy z profilami, autorzy, gatunki, wydawcy).
+
+Poziom 1 to LRU w pamięci procesu (OBJECT_CACHE_LOCAL_SIZE wpisów, każdy żyje
+najwyżej OBJECT_CACHE_LOCAL_TTL sekund), poziom 2 to cache współdzielony
+(OBJECT_CACHE_ALIAS), a dopiero brakujące obiekty są czytane z bazy - hurtowo,
+jednym zapytaniem na model.
+
+Unieważnianie korzysta z generacji booksApp.caching, które sygnały podbijają przy
+zapisie modelu. Klucz we współdzielonym cache zawiera generację, a proces przy
+pierwszym odczycie w każdym żądaniu pobiera bieżące generacje (jedno `get_many`)
+i pomija lokalne wpisy ze starszych - zmiana w jednym workerze jest więc
+widoczna w pozostałych od ich następnego żądania.
+
+Często zmieniane modele (użytkownicy - liczniki obserwacji, profile) są
+rejestrowane z `per_object=True`: każdy obiekt ma własną wersję, którą sygnały
+podbijają przez `invalidate(model, *pks)`, więc obserwacja unieważnia tylko dwóch
+użytkowników, a nie wszystkich. Wersje obiektów czytanych w żądaniu są pobierane
+jednym `get_many` na wywołanie.
+
+Zwracane obiekty są współdzielone między żądaniami - wolno je tylko czytać.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.signals import request_started
+from django.db import transaction
+
+from . import caching
+from .models import Author, Genre, Publisher
+
+
+class ObjectCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = OrderedDict()    # (label, pk) -> (wygasa, generacja, obiekt)
+        self._models = {}    # model -> (queryset, nazwy zależności)
+        self._generations = {}
+        self._versions = {}    # (label, pk) -> wersja obiektu odczytana w bieżącym żądaniu
+        self._per_object = set()
+        self._synced_request = None
+        self._requests = 0
+
+    def register(self, model, queryset=None, dependencies=(), per_object=False):
+        """
+        `dependencies` - modele, których zmiana (poza samym `model`) zmienia zapisany obiekt.
+        Przy `per_object=True` zależności nie są używane - zmiany zgłasza `invalidate`.
+        """
+        if per_object:
+            self._per_object.add(model)
+            names = [self._model_dependency(model)]
+        else:
+            names = [caching.dependency_name(dep) for dep in (model, *dependencies)]
+        self._models[model] = (queryset if queryset is not None else model._default_manager.all(), names)
+
+    @staticmethod
+    def _model_dependency(model):
+        return f'objects:{model._meta.label_lower}'
+
+    @staticmethod
+    def _version_key(label, pk):
+        return f'object:version:{label}:{pk}'
+
+    def invalidate(self, model, *pks):
+        """Po COMMIT unieważnia obiekty `pks` modelu zarejestrowanego z `per_object` (bez `pks` - wszystkie)."""
+        if model not in self._per_object:
+            return
+        if not pks:
+            caching.bump(self._model_dependency(model))
+            return
+
+        label = model._meta.label_lower
+        keys = {self._version_key(label, pk): pk for pk in set(pks) if pk is not None}
+
+        def set_versions():
+            caches[settings.OBJECT_CACHE_ALIAS].set_many({key: time.time_ns() for key in keys}, None)
+            with self._lock:
+                for pk in keys.values():
+                    self._versions.pop((label, pk), None)
+                    self._local.pop((label, pk), None)
+
+        transaction.on_commit(set_versions)
+
+    def is_cached(self, model):
+        return model in self._models
+
+    def request_started(self, **kwargs):
+        with self._lock:
+            self._requests += 1
+
+    def _sync(self):
+        if self._synced_request == self._requests:
+            return
+        requests = self._requests
+        names = sorted({name for _, dependencies in self._models.values() for name in dependencies})
+        generations = dict(zip(names, caching.get_generations(names)))
+        with self._lock:
+            self._generations = generations
+            self._versions = {}
+            self._synced_request = requests
+
+    def _generation(self, model):
+        return '.'.join(str(self._generations.get(name, 0)) for name in self._models[model][1])
+
+    def _object_generations(self, model, label, pks):
+        """{pk: generacja}: generacja modelu, przy `per_object` z dołączoną wersją obiektu."""
+        generation = self._generation(model)
+        if model not in self._per_object:
+            return {pk: generation for pk in pks}
+
+        with self._lock:
+            versions = {pk: self._versions[(label, pk)] for pk in pks if (label, pk) in self._versions}
+        missing = {self._version_key(label, pk): pk for pk in pks if pk not in versions}
+        if missing:
+            shared = caches[settings.OBJECT_CACHE_ALIAS]
+            stored = shared.get_many(missing)
+            for key in missing.keys() - stored.keys():
+                # Brak wersji (pierwszy odczyt lub wyrzucona z cache) - nowa, stare wpisy nie wrócą
+                shared.add(key, time.time_ns(), None)
+                stored[key] = shared.get(key, 0)
+            fetched = {pk: stored[key] for key, pk in missing.items()}
+            versions.update(fetched)
+            with self._lock:
+                self._versions.update(((label, pk), version) for pk, version in fetched.items())
+        return {pk: f'{generation}.{versions[pk]}' for pk in pks}
+
+    def get(self, model, pk):
+        return self.get_many(model, [pk]).get(pk)
+
+    def get_many(self, model, pks):
+        """Słownik {pk: obiekt}; obiektów nieistniejących w bazie w nim nie ma."""
+        self._sync()
+        label = model._meta.label_lower
+        generations = self._object_generations(model, label, pks)
+        now = time.monotonic()
+
+        found, missing = {}, []
+        with self._lock:
+            for pk in pks:
+                entry = self._local.get((label, pk))
+                if entry is not None and entry[0] > now and entry[1] == generations[pk]:
+                    self._local.move_to_end((label, pk))
+                    found[pk] = entry[2]
+                else:
+                    missing.append(pk)
+        if not missing:
+            return found
+
+        shared = caches[settings.OBJECT_CACHE_ALIAS]
+        keys = {f'object:{label}:{generations[pk]}:{pk}': pk for pk in missing}
+        loaded = {keys[key]: obj for key, obj in shared.get_many(keys).items()}
+
+        from_db = [pk for pk in missing if pk not in loaded]
+        if from_db:
+            queryset = self._models[model][0]
+            fetched = queryset.in_bulk(from_db)
+            shared.set_many(
+                {f'object:{label}:{generations[pk]}:{pk}': obj for pk, obj in fetched.items()},
+                settings.OBJECT_CACHE_TIMEOUT,
+            )
+            loaded.update(fetched)
+
+        self._store(label, generations, loaded, now)
+        found.update(loaded)
+        return found
+
+    def _store(self, label, generations, objects, now):
+        expires = now + settings.OBJECT_CACHE_LOCAL_TTL
+        with self._lock:
+            for pk, obj in objects.items():
+                self._local[(label, pk)] = (expires, generations[pk], obj)
+                self._local.move_to_end((label, pk))
+            while len(self._local) > settings.OBJECT_CACHE_LOCAL_SIZE:
+                self._local.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._versions = {}
+            self._synced_request = None
+
+
+object_cache = ObjectCache()
+# Użytkownika unieważniają sygnały User, Profile i Follow (liczniki obserwacji) - tylko jego.
+# Współdzielony cache dostaje tylko pola karty użytkownika - bez hasła, e-maila i uprawnień.
+object_cache.register(User, User.objects.select_related('profile').only(
+    'id', 'username', 'profile__user', 'profile__avatar', 'profile__avatar_renditions', 'profile__bio',
+    'profile__followers_count', 'profile__following_count',
+), per_object=True)
+object_cache.register(Author)
+object_cache.register(Genre)
+object_cache.register(Publisher)
+
+request_started.connect(object_cache.request_started, dispatch_uid='booksApp.object_cache')
@@ -0,0 +1,195 @@
+import json
+import operator
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginacja kursorowa (keyset) z pozycją złożoną z wartości wszystkich pól
+    sortowania oraz `pk` jako rozstrzygacza remisów.
+
+    Kolejna strona jest wyznaczana warunkiem `WHERE (pole, pk) > (wartość, id)`
+    zamiast OFFSET, więc pobranie strony N kosztuje tyle samo co strony 1,
+    o ile istnieje indeks złożony (pole, id). Wartości NULL zawsze trafiają
+    na koniec listy.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.terms = self._get_terms(queryset, self.ordering)
+
+        self.cursor = self.decode_cursor(request)
+        reverse, position = self.cursor if self.cursor else (False, None)
+
+        queryset = queryset.order_by(*self._order_by(reverse))
+        try:
+            # Wartości z kursora są walidowane już przy budowie warunku (filter), nie dopiero w zapytaniu
+            if position is not None:
+                queryset = queryset.filter(self._keyset_filter(position, reverse))
+            results = list(queryset[:self.page_size + 1])
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_position = self._get_position(self.page[0]) if self.page else position
+        self.last_position = self._get_position(self.page[-1]) if self.page else position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+
+        if not ordering:
+            ordering = (
+                getattr(view, 'ordering', None)
+                or queryset.query.order_by
+                or queryset.model._meta.ordering
+                or ('pk',)
+            )
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+
+        assert all(isinstance(term, str) and '__' not in term for term in ordering), (
+            'Keyset pagination supports only plain field or annotation names in ordering.'
+        )
+
+        # Klucz musi być unikalny, więc zawsze dokładamy pk w kierunku pierwszego pola.
+        if not any(term.lstrip('-') in ('pk', 'id') for term in ordering):
+            ordering += ('-pk' if ordering[0].startswith('-') else 'pk',)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor((False, self.last_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor((True, self.first_position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            reverse = bool(tokens['r'])
+            position = tokens['p']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.terms):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, cursor):
+        reverse, position = cursor
+        tokens = json.dumps({'r': int(reverse), 'p': position}, separators=(',', ':'))
+        encoded = urlsafe_b64encode(tokens.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_terms(self, queryset, ordering):
+        terms = []
+        for term in ordering:
+            name = term.lstrip('-')
+            terms.append((name, term.startswith('-'), self._is_nullable(queryset, name)))
+        return terms
+
+    @staticmethod
+    def _is_nullable(queryset, name):
+        if name == 'pk':
+            return False
+        if name in queryset.query.annotations:
+            return True
+        try:
+            return queryset.model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            return True
+
+    def _get_position(self, instance):
+        position = []
+        for name, _, _ in self.terms:
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            position.append(None if value is None else str(value))
+        return position
+
+    def _order_by(self, reverse):
+        order_by = []
+        for name, descending, nullable in self.terms:
+            nulls = {('nulls_first' if reverse else 'nulls_last'): True} if nullable else {}
+            if descending != reverse:
+                order_by.append(F(name).desc(**nulls))
+            else:
+                order_by.append(F(name).asc(**nulls))
+        return order_by
+
+    def _keyset_filter(self, position, reverse):
+        conditions = []
+        equal = Q()
+        for (name, descending, nullable), value in zip(self.terms, position):
+            beyond = self._beyond(name, descending, nullable, value, reverse)
+            if beyond is not None:
+                conditions.append(equal & beyond)
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+
+        if not conditions:
+            return Q(pk__in=[])
+
+        # Warunek na pierwszym polu pozwala bazie zawęzić skan indeksu, zanim
+        # zostanie sprawdzona pełna alternatywa porównań.
+        name, descending, nullable = self.terms[0]
+        value = position[0]
+        if value is None:
+            bound = Q() if reverse else Q(**{f'{name}__isnull': True})
+        else:
+            lookup = 'gte' if descending == reverse else 'lte'
+            bound = Q(**{f'{name}__{lookup}': value})
+            if nullable and not reverse:
+                bound |= Q(**{f'{name}__isnull': True})
+
+        return bound & reduce(operator.or_, conditions)
+
+    @staticmethod
+    def _beyond(name, descending, nullable, value, reverse):
+        """Warunek "ściśle za pozycją" dla pojedynczego pola sortowania."""
+        if value is None:
+            # NULL-e są na końcu: dalej nie ma już nic, wcześniej jest każda wartość.
+            return Q(**{f'{name}__isnull': False}) if reverse else None
+
+        lookup = 'gt' if descending == reverse else 'lt'
+        condition = Q(**{f'{name}__{lookup}': value})
+        if nullable and not reverse:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
@@ -0,0 +1,262 @@
+"""
+Powiadomienia w czasie rzeczywistym przez WebSocket (`/ws/events/`).
+
+Klient łączy się z tokenem dostępu simplejwt (`?token=<access>` albo podprotokół
+`jwt, <access>`) i dostaje zdarzenia JSON dla swoich rozmów:
+
+    {"type": "message.created", "conversation": 5, "message": {...}}
+    {"type": "message.read", "conversation": 5, "message_ids": [10]}
+    {"type": "conversation.read", "conversation": 5, "reader": 3, "up_to": 11, "until": null}
+    {"type": "exchange_offer.updated", "exchange_offer": {...}}
+    {"type": "resync"}    # kolejka klienta się przepełniła - trzeba odświeżyć dane z API
+
+Zdarzenia trafiają na kanał `user:<id>` każdego uczestnika przez brokera z ustawienia
+`REALTIME_BROKER`. `InProcessBroker` działa w obrębie jednego procesu (dev, testy),
+`PostgresBroker` rozsyła zdarzenia między workerami przez LISTEN/NOTIFY.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+logger = logging.getLogger(__name__)
+
+# Kody zamknięcia z zakresu aplikacji (4000-4999)
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+
+# Klucze DATABASES[...]['OPTIONS'], których Django nie przekazuje do psycopg
+DJANGO_ONLY_OPTIONS = ('pool', 'server_side_binding', 'isolation_level', 'assume_role')
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Ograniczona kolejka zdarzeń jednego połączenia, zasilana z dowolnego wątku."""
+
+    def __init__(self, loop, max_size):
+        self._loop = loop
+        self._queue = asyncio.Queue(max_size)
+
+    def put(self, event):
+        self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event):
+        if self._queue.full():
+            # Wolny klient - zamiast gubić pojedyncze zdarzenia każemy mu odświeżyć stan
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            event = {'type': 'resync'}
+        self._queue.put_nowait(event)
+
+    async def get(self):
+        return await self._queue.get()
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.queue_size = getattr(settings, 'REALTIME_QUEUE_SIZE', 100)
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, event):
+        self._dispatch(channel, event)
+
+    def _dispatch(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Rozsyłanie między procesami przez PostgreSQL LISTEN/NOTIFY.
+
+    Każdy proces ma jedno połączenie nasłuchujące i rozdziela zdarzenia lokalnym
+    subskrybentom. Treść NOTIFY jest ograniczona do 8000 bajtów - większe zdarzenia
+    są wysyłane bez danych, z samymi identyfikatorami.
+    """
+    notify_channel = 'booksapp_realtime'
+    max_payload = 7900
+    reconnect_delay = 5
+
+    def __init__(self, database='default'):
+        super().__init__()
+        self.database = database
+        self._listener = None
+
+    def publish(self, channel, event):
+        payload = json.dumps({'channel': channel, 'event': event}, cls=JSONEncoder)
+        if len(payload.encode()) > self.max_payload:
+            payload = json.dumps({'channel': channel, 'event': _strip_event(event)}, cls=JSONEncoder)
+        with connections[self.database].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.notify_channel, payload])
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        async with super().subscribe(channel) as subscription:
+            yield subscription
+
+    def _connection_params(self):
+        database = settings.DATABASES[self.database]
+        # Jak w połączeniach Django: OPTIONS (sslmode, connect_timeout...) bez opcji, które
+        # Django obsługuje samo, zamiast przekazywać do libpq
+        params = {'dbname': database['NAME']} if database['NAME'] else {}
+        params.update(
+            (name, value) for name, value in database.get('OPTIONS', {}).items() if name not in DJANGO_ONLY_OPTIONS
+        )
+        for name, key in (('user', 'USER'), ('password', 'PASSWORD'), ('host', 'HOST'), ('port', 'PORT')):
+            if database.get(key):
+                params[name] = database[key]
+        return params
+
+    async def _listen(self):
+        import psycopg
+
+        while True:
+            try:
+                connection = await psycopg.AsyncConnection.connect(autocommit=True, **self._connection_params())
+                async with connection:
+                    await connection.execute(f'LISTEN {self.notify_channel}')
+                    async for notify in connection.notifies():
+                        data = json.loads(notify.payload)
+                        self._dispatch(data['channel'], data['event'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Utracono połączenie LISTEN, ponowna próba za %s s", self.reconnect_delay)
+                # Zdarzenia z przerwy przepadły - klienci muszą odświeżyć stan
+                with self._lock:
+                    channels = list(self._subscribers)
+                for channel in channels:
+                    self._dispatch(channel, {'type': 'resync'})
+                await asyncio.sleep(self.reconnect_delay)
+
+
+def _strip_event(event):
+    stripped = {}
+    for key, value in event.items():
+        if isinstance(value, dict):
+            stripped[key] = {'id': value.get('id')}
+        elif not isinstance(value, str) or key == 'type':
+            stripped[key] = value
+    stripped['truncated'] = True
+    return stripped
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'REALTIME_BROKER', 'booksApp.realtime.InProcessBroker'))()
+        return _broker
+
+
+def publish_to_users(user_ids, event):
+    broker = get_broker()
+    for user_id in set(user_ids):
+        try:
+            broker.publish(user_channel(user_id), event)
+        except Exception:
+            # Powiadomienie to dodatek - błąd brokera nie może wycofać zapisu
+            logger.exception("Nie udało się opublikować zdarzenia %s", event.get('type'))
+
+
+# - WEBSOCKET
+
+def _get_token(scope):
+    subprotocols = scope.get('subprotocols') or []
+    if len(subprotocols) == 2 and subprotocols[0] == 'jwt':
+        return subprotocols[1], 'jwt'
+    query = parse_qs(scope.get('query_string', b'').decode())
+    return (query.get('token') or [None])[0], None
+
+
+@sync_to_async
+def authenticate(raw_token):
+    close_old_connections()
+    try:
+        authentication = JWTAuthentication()
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    finally:
+        close_old_connections()
+
+
+def _is_ping(text):
+    try:
+        return json.loads(text or '').get('type') == 'ping'
+    except (ValueError, AttributeError):
+        return False
+
+
+async def _forward_events(subscription, send):
+    encoder = JSONEncoder(ensure_ascii=False)
+    while True:
+        event = await subscription.get()
+        await send({'type': 'websocket.send', 'text': encoder.encode(event)})
+
+
+async def websocket_application(scope, receive, send):
+    """Aplikacja ASGI obsługująca połączenia WebSocket (podpinana w `booksServer/asgi.py`)."""
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+
+    if scope['path'] != getattr(settings, 'REALTIME_PATH', '/ws/events/'):
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    raw_token, subprotocol = _get_token(scope)
+    user = await authenticate(raw_token) if raw_token else None
+    if user is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    async with get_broker().subscribe(user_channel(user.pk)) as subscription:
+        await send({'type': 'websocket.accept', 'subprotocol': subprotocol})
+        forwarder = asyncio.create_task(_forward_events(subscription, send))
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message['type'] == 'websocket.receive' and _is_ping(message.get('text')):
+                    await send({'type': 'websocket.send', 'text': '{"type": "pong"}'})
+        finally:
+            forwarder.cancel()
@@ -0,0 +1,188 @@
+"""
+Wyszukiwarka książek.
+
+Dla każdej książki utrzymywany jest dokument wyszukiwania (`BookSearchDocument`)
+ze znormalizowanym tekstem: tytuł, autorzy, wydawca, gatunki i ISBN. Na
+PostgreSQL zapytania idą przez indeksy GIN (tsvector + pg_trgm) na tym
+dokumencie, na pozostałych bazach przez wbudowany indeks odwrócony
+(`BookSearchTerm`), dzięki czemu całość działa też lokalnie na SQLite.
+"""
+import math
+import operator
+import re
+import unicodedata
+from functools import reduce
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Func, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils.module_loading import import_string
+
+from .models import Book, BookSearchDocument, BookSearchTerm
+
+TITLE_WEIGHT = 3
+ISBN_WEIGHT = 3
+AUTHOR_WEIGHT = 2
+DEFAULT_WEIGHT = 1
+
+# Litery, których NFKD nie rozkłada na literę bazową i znak diakrytyczny
+_TRANSLITERATION = str.maketrans({'ł': 'l', 'Ł': 'L', 'ß': 'ss', 'æ': 'ae', 'Æ': 'AE', 'ø': 'o', 'Ø': 'O', 'đ': 'd', 'Đ': 'D'})
+_ISBN_HYPHEN = re.compile(r'(?<=\d)[-\s](?=\d)')
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+# - TOKENIZATION
+
+def normalize(text):
+    """Małe litery bez znaków diakrytycznych ("Łódź" -> "lodz"), ISBN bez myślników."""
+    text = unicodedata.normalize('NFKD', (text or '').translate(_TRANSLITERATION))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return _ISBN_HYPHEN.sub('', text)
+
+
+def tokenize(text):
+    return list(dict.fromkeys(_TOKEN.findall(normalize(text))))
+
+
+# - INDEXING
+
+def build_terms(book):
+    terms = {}
+    fields = [
+        (book.title, TITLE_WEIGHT),
+        (book.isbn, ISBN_WEIGHT),
+        (book.publisher.name if book.publisher else '', DEFAULT_WEIGHT),
+    ]
+    fields += [(f"{author.first_name} {author.last_name}", AUTHOR_WEIGHT) for author in book.authors.all()]
+    fields += [(genre.name, DEFAULT_WEIGHT) for genre in book.genres.all()]
+
+    for text, weight in fields:
+        for term in tokenize(text):
+            term = term[:100]
+            terms[term] = max(weight, terms.get(term, 0))
+    return terms
+
+
+def index_books(book_ids):
+    """Przebudowuje dokumenty wyszukiwania podanych książek."""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+
+    backend = get_search_backend()
+    books = Book.objects.filter(pk__in=book_ids).select_related('publisher').prefetch_related('authors', 'genres')
+
+    documents = []
+    search_terms = []
+    for book in books:
+        terms = build_terms(book)
+        documents.append(BookSearchDocument(book=book, title=' '.join(tokenize(book.title)), document=' '.join(terms)))
+        search_terms += [BookSearchTerm(term=term, book=book, weight=weight) for term, weight in terms.items()]
+
+    # Stała liczba zapytań niezależnie od liczby książek (import hurtowy, przebudowa indeksu)
+    with transaction.atomic():
+        BookSearchDocument.objects.bulk_create(
+            documents, update_conflicts=True, unique_fields=['book'], update_fields=['title', 'document', 'updated_at']
+        )
+        if backend.uses_term_index:
+            BookSearchTerm.objects.filter(book_id__in=book_ids).delete()
+            BookSearchTerm.objects.bulk_create(search_terms, batch_size=5000)
+
+
+# - BACKENDS
+
+class InvertedIndexSearchBackend:
+    """
+    Indeks odwrócony w tabeli `BookSearchTerm`. Wszystkie słowa zapytania muszą
+    wystąpić w dokumencie (ostatnie jako prefiks), trafność to suma wag pól
+    przemnożonych przez IDF słowa.
+    """
+    uses_term_index = True
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+
+        conditions = [Q(term=token) for token in tokens[:-1]] + [self._prefix(tokens[-1])]
+        terms = BookSearchTerm.objects.filter(reduce(operator.or_, conditions))
+
+        total = max(BookSearchDocument.objects.count(), 1)
+        frequencies = terms.aggregate(**{
+            f'df{i}': Count('book', filter=condition, distinct=True) for i, condition in enumerate(conditions)
+        })
+        idf = Case(
+            *[
+                When(condition, then=Value(math.log(1 + total / max(frequencies[f'df{i}'], 1))))
+                for i, condition in enumerate(conditions)
+            ],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        matched = reduce(operator.add, [
+            Max(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+            for condition in conditions
+        ])
+
+        ranked = terms.values('book').annotate(
+            score=Sum(F('weight') * idf, output_field=FloatField()),
+            matched=matched,
+        ).filter(matched=len(conditions)).order_by()
+
+        return queryset.filter(pk__in=ranked.values('book')).annotate(
+            search_rank=Subquery(ranked.filter(book=OuterRef('pk')).values('score'))
+        )
+
+    @staticmethod
+    def _prefix(token):
+        # Zakres zamiast LIKE 'x%', żeby zawsze korzystać z indeksu na term
+        return Q(term__gte=token, term__lt=token[:-1] + chr(ord(token[-1]) + 1))
+
+
+class PostgresSearchBackend:
+    """
+    Pełnotekstowe `to_tsvector('simple', document)` z dopasowaniem prefiksowym
+    ostatniego słowa oraz podobieństwo trigramowe (pg_trgm) dla literówek.
+    Oba warunki są obsługiwane przez indeksy GIN z migracji 0013.
+    """
+    uses_term_index = False
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.lookups import TrigramWordSimilar
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVectorExact, SearchVectorField, TrigramWordSimilarity
+        )
+
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+
+        text = ' '.join(tokens)
+        search_query = SearchQuery(' & '.join(tokens) + ':*', config='simple', search_type='raw')
+
+        def vector(field):
+            return Func(
+                F(field), function='to_tsvector', template="%(function)s('simple'::regconfig, %(expressions)s)",
+                output_field=SearchVectorField(),
+            )
+
+        matches = BookSearchDocument.objects.filter(
+            Q(SearchVectorExact(vector('document'), search_query))
+            | Q(TrigramWordSimilar(F('document'), Value(text)))
+        ).values('book')
+
+        return queryset.filter(pk__in=matches).annotate(
+            search_rank=(
+                SearchRank(vector('search_document__document'), search_query)
+                + TrigramWordSimilarity(text, 'search_document__title')
+            )
+        )
+
+
+def get_search_backend():
+    backend_path = getattr(settings, 'BOOK_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return InvertedIndexSearchBackend()
@@ -0,0 +1,86 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+from booksApp.object_cache import object_cache
+
+
+class ImageUrlsField(serializers.Field):
+    """
+    Mapa adresów obrazu: oryginał i miniatury w dostępnych rozmiarach,
+    np. {"original": "...", "96": {"webp": "...", "jpeg": "..."}}.
+    Miniatury innego pliku niż bieżący (po zmianie URL-a) są pomijane.
+    Bez obrazu zwraca None.
+    """
+
+    def __init__(self, url_field, renditions_field, **kwargs):
+        self.url_field = url_field
+        self.renditions_field = renditions_field
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def build(url, renditions):
+        if not url:
+            return None
+        urls = {'original': url}
+        if renditions and renditions.get('source') == url:
+            urls.update((size, formats) for size, formats in renditions.items() if size != 'source')
+        return urls
+
+    def to_representation(self, instance):
+        return self.build(getattr(instance, self.url_field), getattr(instance, self.renditions_field))
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, który najpierw szuka obiektu w `context['related_objects']`
+    ({model: {pk: obiekt}}). Zapis hurtowy wczytuje tam wszystkie wskazane obiekty
+    jednym zapytaniem na model zamiast zapytania na każde id.
+    """
+
+    def to_internal_value(self, data):
+        cached = self.context.get('related_objects', {}).get(self.get_queryset().model)
+        if cached is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return cached[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class ObjectCacheMixin:
+    """
+    Serializer obiektu referencyjnego zagnieżdżany przez klucz obcy (np. `user`
+    w ogłoszeniu): obiekt jest brany z booksApp.object_cache po wartości klucza,
+    bez JOIN-a i bez zapytania, o ile nie został już wczytany razem z rodzicem.
+    Plan eager loading pomija takie pola i zamiast tego wczytuje obiekty strony hurtowo.
+    """
+    object_cache = True
+
+    def get_attribute(self, instance):
+        model_field = _forward_foreign_key(instance, self.source_attrs)
+        if (
+            model_field is None or model_field.is_cached(instance)
+            or not object_cache.is_cached(model_field.related_model)
+        ):
+            return super().get_attribute(instance)
+        pk = getattr(instance, model_field.attname)
+        if pk is None:
+            return None
+        return object_cache.get(model_field.related_model, pk)
+
+
+def _forward_foreign_key(instance, source_attrs):
+    if len(source_attrs) != 1 or not hasattr(instance, '_meta'):
+        return None
+    try:
+        model_field = instance._meta.get_field(source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if model_field.many_to_one or (model_field.one_to_one and model_field.concrete):
+        return model_field
+    return None
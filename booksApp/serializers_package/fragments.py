@@ -0,0 +1,91 @@
+"""
+Cache wyrenderowanych fragmentów serializera (np. karty książki).
+
+Fragment jest zapisywany pod kluczem id obiektu + `updated_at`, więc każda zmiana
+obiektu (także przez UPDATE agregatów, M2M i ogłoszenia - patrz sygnały) daje
+nowy klucz, a stare wpisy po prostu wygasają. Pola zależne od użytkownika
+(`fragment_exclude`) nie trafiają do cache i są dopisywane przy każdym renderze.
+
+Fragmenty całej odpowiedzi są pobierane jednym `get_many`: listy robią to same
+(`FragmentListSerializer`), a serializery zagnieżdżone przez klucz obcy - plan
+eager loading przed serializacją (`prime`). Relacje z `fragment_prefetch` są
+dociągane tylko dla obiektów, których fragmentu nie było w cache.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+
+class FragmentListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        self.child.prime(items)
+        return [self.child.to_representation(item) for item in items]
+
+
+class FragmentCacheMixin:
+    """Serializer używający go ustawia też `Meta.list_serializer_class = FragmentListSerializer`."""
+    fragment_cache = True
+    fragment_exclude = ()
+    fragment_prefetch = ()
+
+    def fragment_key(self, instance):
+        version = getattr(instance, 'updated_at', None)
+        if instance.pk is None or version is None:
+            return None
+        return f'fragment:{type(self).__name__}:{instance.pk}:{version.timestamp()}'
+
+    def _fragments(self):
+        return self.context.setdefault('fragments', {}) if isinstance(self.context, dict) else {}
+
+    def prime(self, instances):
+        """Wczytuje fragmenty `instances` jednym zapytaniem do cache; brakujące renderuje i zapisuje."""
+        fragments = self._fragments()
+        keys = {}
+        for instance in instances:
+            key = self.fragment_key(instance)
+            if key is not None and key not in fragments:
+                keys.setdefault(key, instance)
+        if not keys:
+            return
+
+        cache = caches[settings.FRAGMENT_CACHE_ALIAS]
+        fragments.update(cache.get_many(keys))
+
+        missing = [instance for key, instance in keys.items() if key not in fragments]
+        if missing:
+            if self.fragment_prefetch:
+                prefetch_related_objects(missing, *self.fragment_prefetch)
+            rendered = {self.fragment_key(instance): self.render_fragment(instance) for instance in missing}
+            cache.set_many(rendered, settings.FRAGMENT_CACHE_TIMEOUT)
+            fragments.update(rendered)
+
+    def render_fragment(self, instance):
+        data = super().to_representation(instance)
+        return {name: value for name, value in data.items() if name not in self.fragment_exclude}
+
+    def to_representation(self, instance):
+        key = self.fragment_key(instance)
+        if key is None:
+            return super().to_representation(instance)
+
+        fragments = self._fragments()
+        if key not in fragments:
+            self.prime([instance])
+        fragment = fragments[key]
+
+        data = {}
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in self.fragment_exclude:
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+                data[name] = None if attribute is None else field.to_representation(attribute)
+            else:
+                data[name] = fragment[name]
+        return data
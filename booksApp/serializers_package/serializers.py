@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
 from booksApp.models import (
     Author, Genre, Book, Review, Follow,
@@ -6,43 +7,45 @@ from booksApp.models import (
     BookRanking, Activity, Profile, Publisher,
     Conversation, ExchangeOffer  # Dodajemy import Conversation
 )
+from booksApp.serializers_package.fields import CachedPrimaryKeyRelatedField, ImageUrlsField, ObjectCacheMixin
+from booksApp.serializers_package.fragments import FragmentCacheMixin, FragmentListSerializer
 from booksApp.serializers_package.user_serializers import UserSerializer
 
 
 # - BOOKS DATA
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(ObjectCacheMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = ['id', 'first_name', 'last_name', 'bio']
 
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(ObjectCacheMixin, serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = ['id', 'name']
 
-class PublisherSerializer(serializers.ModelSerializer):
+class PublisherSerializer(ObjectCacheMixin, serializers.ModelSerializer):
     class Meta:
         model = Publisher
         fields = ['id', 'name', 'description']
 
 class BookSerializer(serializers.ModelSerializer):
     # write
-    author_ids = serializers.PrimaryKeyRelatedField(
+    author_ids = CachedPrimaryKeyRelatedField(
         source="authors",
         queryset=Author.objects.all(),
         many=True,
         write_only=True
     )
-    genre_ids = serializers.PrimaryKeyRelatedField(
+    genre_ids = CachedPrimaryKeyRelatedField(
         source="genres",
         queryset=Genre.objects.all(),
         many=True,
         write_only=True
     )
 
-    publisher_id = serializers.PrimaryKeyRelatedField(
+    publisher_id = CachedPrimaryKeyRelatedField(
         source="publisher",
         queryset=Publisher.objects.all(),
         write_only=True
@@ -54,10 +57,19 @@ class BookSerializer(serializers.ModelSerializer):
     publisher = PublisherSerializer(read_only=True)
     added_by = UserSerializer(read_only=True)
     average_rating = serializers.FloatField(read_only=True)
+    rating_count = serializers.IntegerField(read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
 
-    # Market data (annotated)
+    # Market data (denormalized)
     lowest_price = serializers.DecimalField(max_digits=8, decimal_places=2, read_only=True)
     listings_count = serializers.IntegerField(read_only=True)
+    exchange_listings_count = serializers.IntegerField(read_only=True)
+
+    cover_urls = ImageUrlsField('cover_url', 'cover_renditions', source='*')
+
+    # Adnotacje BookQuerySet.with_shelves (bieżący użytkownik)
+    in_library = serializers.BooleanField(read_only=True, default=False)
+    in_wishlist = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = Book
@@ -65,26 +77,85 @@ class BookSerializer(serializers.ModelSerializer):
             'id', 'title','authors', 'genres','author_ids',
             'genre_ids', 'description', 'pages', 'isbn',
             'publisher', 'publisher_id','published_year',
-            'edition_type', 'cover_url', 'added_by',
-            'average_rating', 'created_at', 'lowest_price',
-            'listings_count'
+            'edition_type', 'cover_url', 'cover_urls', 'added_by',
+            'average_rating', 'rating_count', 'rating_histogram',
+            'created_at', 'lowest_price', 'listings_count',
+            'exchange_listings_count', 'in_library', 'in_wishlist'
         ]
 
 
-class BookCompactSerializer(serializers.ModelSerializer):
+class BookBulkSerializer(BookSerializer):
+    """
+    Pojedyncza książka w `POST /api/books/bulk/`. Unikalność ISBN sprawdza widok
+    jednym zapytaniem dla całej partii, więc walidator per rekord jest wyłączony.
+    """
+
+    class Meta(BookSerializer.Meta):
+        extra_kwargs = {'isbn': {'validators': []}}
+
+
+class BookCompactSerializer(FragmentCacheMixin, serializers.ModelSerializer):
+    # Karta książki jest cache'owana per (id, updated_at); flagi półek liczone przy każdym renderze
+    fragment_exclude = ('in_library', 'in_wishlist')
+    fragment_prefetch = ('authors', 'genres')
+
     authors = serializers.StringRelatedField(many=True)
     genres = serializers.StringRelatedField(many=True)
     average_rating = serializers.FloatField(read_only=True)
 
     lowest_price = serializers.DecimalField(max_digits=8, decimal_places=2, read_only=True)
     listings_count = serializers.IntegerField(read_only=True)
+    exchange_listings_count = serializers.IntegerField(read_only=True)
+
+    cover_urls = ImageUrlsField('cover_url', 'cover_renditions', source='*')
+
+    in_library = serializers.BooleanField(read_only=True, default=False)
+    in_wishlist = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = Book
         fields = [
-            'id', 'title', 'authors', 'genres', 'cover_url',
-            'average_rating', 'lowest_price', 'listings_count'
+            'id', 'title', 'authors', 'genres', 'cover_url', 'cover_urls',
+            'average_rating', 'lowest_price', 'listings_count',
+            'exchange_listings_count', 'in_library', 'in_wishlist'
         ]
+        list_serializer_class = FragmentListSerializer
+
+    def prime(self, instances):
+        instances = list(instances)
+        super().prime(instances)
+        self.prime_shelves(instances)
+
+    def prime_shelves(self, instances):
+        """
+        Flagi półek dla książek wczytanych bez adnotacji `with_shelves` (karty
+        zagnieżdżone przez klucz obcy: półki, ogłoszenia, wiadomości) - jedno
+        zapytanie na całą odpowiedź.
+        """
+        missing = {}
+        for book in instances:
+            if not hasattr(book, 'in_library'):
+                missing.setdefault(book.pk, []).append(book)
+        request = self.context.get('request') if isinstance(self.context, dict) else None
+        if not missing or request is None:
+            return
+
+        rows = {pk: (False, False) for pk in missing}
+        if request.user.is_authenticated:
+            rows.update(
+                (pk, (in_library, in_wishlist)) for pk, in_library, in_wishlist in
+                Book.objects.filter(pk__in=missing).with_shelves(request.user).values_list(
+                    'pk', 'in_library', 'in_wishlist'
+                )
+            )
+        for pk, books in missing.items():
+            for book in books:
+                book.in_library, book.in_wishlist = rows[pk]
+
+    def to_representation(self, instance):
+        if not hasattr(instance, 'in_library'):
+            self.prime_shelves([instance])
+        return super().to_representation(instance)
 
 
 # - REVIEWS
@@ -191,19 +262,30 @@ class MessageSerializer(serializers.ModelSerializer):
         ]
 
 
+class MessagePreviewSerializer(serializers.ModelSerializer):
+    """Skrót wiadomości na liście rozmów - załączniki tylko jako identyfikatory."""
+    sender = UserSerializer(read_only=True)
+
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'content', 'timestamp', 'is_read', 'book_id', 'listing_id', 'exchange_offer_id']
+
+
 class ConversationSerializer(serializers.ModelSerializer):
     participants = UserSerializer(many=True, read_only=True)
-    last_message = serializers.SerializerMethodField()
+    last_message = MessagePreviewSerializer(read_only=True)
+    # Adnotacja z ConversationViewSet.get_queryset (licznik bieżącego użytkownika)
+    unread_count = serializers.IntegerField(read_only=True, default=0)
 
     class Meta:
         model = Conversation
-        fields = ['id', 'participants', 'updated_at', 'last_message']
+        fields = ['id', 'participants', 'updated_at', 'last_message', 'unread_count']
 
-    def get_last_message(self, obj):
-        messages = list(obj.messages.all())
-        if messages:
-            return MessageSerializer(messages[-1]).data
-        return None
+
+class MarkReadSerializer(serializers.Serializer):
+    """Zakres wiadomości do oznaczenia jako przeczytane; bez parametrów - wszystkie."""
+    up_to = serializers.IntegerField(required=False, min_value=1)
+    until = serializers.DateTimeField(required=False)
 
 
 # - USER LIBRARY
@@ -218,6 +300,23 @@ class UserLibrarySerializer(serializers.ModelSerializer):
 
 
 
+class ShelfBulkSerializer(serializers.Serializer):
+    """Zmiana półki (biblioteka, lista życzeń) w jednym żądaniu: id książek do dodania i do usunięcia."""
+    add = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    remove = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+
+    def validate(self, attrs):
+        limit = settings.BULK_WRITE_MAX_ITEMS
+        if len(attrs['add']) + len(attrs['remove']) > limit:
+            raise serializers.ValidationError(f"Maksymalnie {limit} książek w jednym żądaniu.")
+        overlap = sorted(set(attrs['add']) & set(attrs['remove']))
+        if overlap:
+            raise serializers.ValidationError(
+                f"Książki nie mogą być jednocześnie dodawane i usuwane: {', '.join(map(str, overlap))}."
+            )
+        return attrs
+
+
 class WishlistSerializer(serializers.ModelSerializer):
     book_id = serializers.PrimaryKeyRelatedField(source='book', queryset=Book.objects.all(), write_only=True)
     book = BookCompactSerializer(read_only=True)
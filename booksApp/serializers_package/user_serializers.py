@@ -2,17 +2,20 @@ from django.contrib.auth.models import User
 from rest_framework import serializers
 
 from booksApp.models import Profile, UserLibrary
+from booksApp.serializers_package.fields import ImageUrlsField, ObjectCacheMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
-    followers_count = serializers.IntegerField(read_only=True)
-    following_count = serializers.IntegerField(read_only=True)
+class UserSerializer(ObjectCacheMixin, serializers.ModelSerializer):
+    followers_count = serializers.IntegerField(source='profile.followers_count', read_only=True)
+    following_count = serializers.IntegerField(source='profile.following_count', read_only=True)
     avatar = serializers.URLField(source='profile.avatar', read_only=True)
+    avatar_urls = ImageUrlsField('avatar', 'avatar_renditions', source='profile')
     bio = serializers.CharField(source='profile.bio', read_only=True)
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'followers_count', 'following_count', 'avatar', 'bio']
+        # Publiczna karta użytkownika - własny e-mail zwraca tylko ProfileSerializer
+        fields = ['id', 'username', 'followers_count', 'following_count', 'avatar', 'avatar_urls', 'bio']
 
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -33,7 +36,8 @@ class RegisterSerializer(serializers.ModelSerializer):
 class ProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
+    avatar_urls = ImageUrlsField('avatar', 'avatar_renditions', source='*')
 
     class Meta:
         model = Profile
-        fields = ['id', 'username', 'email', 'avatar', 'bio']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'avatar', 'avatar_urls', 'bio']
\ No newline at end of file
@@ -1,7 +1,17 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models import Count, F, FloatField, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Greatest, Now, NullIf, Round
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile, Review
+from . import caching
+from .object_cache import object_cache
+from .models import (
+    Author, Book, Conversation, ConversationParticipant, ExchangeOffer, Follow, Genre, Listing, Message, Profile,
+    Publisher, Review, StoredBlob, UserLibrary, Wishlist
+)
+from .realtime import publish_to_users
+from .search import index_books
 
 
 @receiver(post_save, sender=User)
@@ -12,19 +22,437 @@ def create_or_update_user_profile(sender, instance, created, **kwargs):
         instance.profile.save()
 
 
-def update_book_average_rating(book):
-    reviews = book.reviews.all()
-    if reviews.exists():
-        avg = round(sum(r.rating for r in reviews) / reviews.count(), 2)
-        book.average_rating = avg
-    else:
-        book.average_rating = 0.0
-    book.save(update_fields=['average_rating'])
+# - FOLLOWS
+
+def follow_counts_expressions():
+    """Podzapytania liczące obserwujących i obserwowanych dla `Profile.objects.update(...)`."""
+    follows = Follow.objects.order_by()
+    return {
+        'followers_count': Coalesce(Subquery(
+            follows.filter(following=OuterRef('user')).values('following').annotate(value=Count('pk')).values('value')
+        ), 0),
+        'following_count': Coalesce(Subquery(
+            follows.filter(follower=OuterRef('user')).values('follower').annotate(value=Count('pk')).values('value')
+        ), 0),
+    }
+
+
+def update_follow_counts(*user_ids, batch_size=1000):
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        Profile.objects.filter(user_id__in=user_ids[start:start + batch_size]).update(**follow_counts_expressions())
+    caching.bump(Profile)
+    object_cache.invalidate(User, *user_ids)
+
+
+def change_follow_counts(follow, delta):
+    Profile.objects.filter(user_id=follow.following_id).update(
+        followers_count=Greatest(F('followers_count') + delta, 0)
+    )
+    Profile.objects.filter(user_id=follow.follower_id).update(
+        following_count=Greatest(F('following_count') + delta, 0)
+    )
+    object_cache.invalidate(User, follow.following_id, follow.follower_id)
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        change_follow_counts(instance, 1)
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    # Wywoływane także dla obserwacji usuwanych kaskadowo i przez QuerySet.delete()
+    change_follow_counts(instance, -1)
+
+
+# - CONVERSATIONS
+
+def inbox_state_expressions():
+    """Podzapytania odtwarzające ostatnią wiadomość rozmowy i liczniki nieprzeczytanych uczestników."""
+    return {
+        'last_message': Subquery(
+            Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-pk').values('pk')[:1]
+        ),
+        'unread_count': Coalesce(Subquery(
+            Message.objects.filter(conversation=OuterRef('conversation'), is_read=False)
+            .exclude(sender=OuterRef('user'))
+            .order_by().values('conversation').annotate(value=Count('pk')).values('value')
+        ), 0),
+    }
+
+
+def rebuild_inbox_state(*conversation_ids):
+    expressions = inbox_state_expressions()
+    Conversation.objects.filter(pk__in=conversation_ids).update(last_message=expressions['last_message'])
+    ConversationParticipant.objects.filter(conversation_id__in=conversation_ids).update(
+        unread_count=expressions['unread_count']
+    )
+
+
+def mark_conversation_read(conversation_id, user, up_to=None, until=None):
+    """
+    Oznacza jednym UPDATE wiadomości innych uczestników jako przeczytane (do
+    wiadomości `up_to` lub chwili `until` włącznie) i przelicza liczniki rozmowy.
+    Zwraca liczbę oznaczonych wiadomości.
+    """
+    messages = Message.objects.filter(conversation_id=conversation_id, is_read=False).exclude(sender=user)
+    if up_to is not None:
+        messages = messages.filter(pk__lte=up_to)
+    if until is not None:
+        messages = messages.filter(timestamp__lte=until)
+
+    with transaction.atomic():
+        marked = messages.update(is_read=True)
+        if marked:
+            # update() pomija sygnały - liczniki wszystkich uczestników liczymy od nowa
+            ConversationParticipant.objects.filter(conversation_id=conversation_id).update(
+                unread_count=inbox_state_expressions()['unread_count']
+            )
+            publish_to_participants(conversation_id, {
+                'type': 'conversation.read', 'conversation': conversation_id, 'reader': user.pk,
+                'up_to': up_to, 'until': until,
+            })
+    return marked
+
+
+def change_unread_counts(message, delta):
+    ConversationParticipant.objects.filter(conversation_id=message.conversation_id).exclude(
+        user_id=message.sender_id
+    ).update(unread_count=Greatest(F('unread_count') + delta, 0))
+
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, created, **kwargs):
+    if created:
+        Conversation.objects.filter(pk=instance.conversation_id).update(
+            last_message=instance, updated_at=instance.timestamp
+        )
+        if not instance.is_read:
+            change_unread_counts(instance, 1)
+    elif not hasattr(instance, '_loaded_is_read'):
+        rebuild_inbox_state(instance.conversation_id)
+    elif instance._loaded_is_read != instance.is_read:
+        change_unread_counts(instance, -1 if instance.is_read else 1)
+        if instance.is_read:
+            publish_to_participants(instance.conversation_id, {
+                'type': 'message.read', 'conversation': instance.conversation_id, 'message_ids': [instance.pk],
+            })
+
+    if created:
+        publish_to_participants(instance.conversation_id, {
+            'type': 'message.created', 'conversation': instance.conversation_id, 'message': message_payload(instance),
+        })
+    instance._loaded_is_read = instance.is_read
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, **kwargs):
+    if not getattr(instance, '_loaded_is_read', instance.is_read):
+        change_unread_counts(instance, -1)
+    # Usunięcie ostatniej wiadomości zeruje wskaźnik (SET_NULL) - wskazujemy poprzednią
+    Conversation.objects.filter(pk=instance.conversation_id, last_message__isnull=True).update(
+        last_message=inbox_state_expressions()['last_message']
+    )
+
+
+# - REALTIME
+
+def message_payload(message):
+    return {
+        'id': message.pk, 'sender_id': message.sender_id, 'content': message.content,
+        'timestamp': message.timestamp, 'is_read': message.is_read, 'book_id': message.book_id,
+        'listing_id': message.listing_id, 'exchange_offer_id': message.exchange_offer_id,
+    }
+
+
+def publish_to_participants(conversation_id, event):
+    # Po zatwierdzeniu transakcji, żeby klient nie pobrał z API stanu sprzed zapisu
+    def publish():
+        user_ids = ConversationParticipant.objects.filter(conversation_id=conversation_id).values_list(
+            'user_id', flat=True
+        )
+        publish_to_users(user_ids, event)
+
+    transaction.on_commit(publish)
+
+@receiver(post_save, sender=ExchangeOffer)
+def exchange_offer_saved(sender, instance, created, **kwargs):
+    event = {'type': 'exchange_offer.updated', 'exchange_offer': {
+        'id': instance.pk, 'book_a_id': instance.book_a_id, 'chosen_book_b_id': instance.chosen_book_b_id,
+        'user_a_id': instance.user_a_id, 'user_b_id': instance.user_b_id, 'accepted_a': instance.accepted_a,
+        'accepted_b': instance.accepted_b, 'rejected': instance.rejected,
+    }}
+    transaction.on_commit(lambda: publish_to_users([instance.user_a_id, instance.user_b_id], event))
+
+
+# - RATINGS
+
+def average_rating_expression(rating_sum, rating_count):
+    return Coalesce(Round(Cast(rating_sum, FloatField()) / NullIf(rating_count, 0), 2), 0.0)
+
+
+def update_book_rating(book_id, added=None, removed=None):
+    """
+    Dodaje ocenę `added` i/lub usuwa ocenę `removed` z agregatów książki
+    jednym atomowym UPDATE na wyrażeniach F - bez wczytywania recenzji.
+    """
+    rating_sum = F('rating_sum') + (added or 0) - (removed or 0)
+    rating_count = F('rating_count') + int(added is not None) - int(removed is not None)
+
+    histogram = {}
+    for rating, delta in ((added, 1), (removed, -1)):
+        if rating in range(1, 6):
+            field = f'rating_{rating}_count'
+            histogram[field] = histogram.get(field, F(field)) + delta
+
+    Book.objects.filter(pk=book_id).update(
+        rating_sum=rating_sum,
+        rating_count=rating_count,
+        average_rating=average_rating_expression(rating_sum, rating_count),
+        updated_at=Now(),
+        **histogram
+    )
+
+
+def rating_stats_expressions():
+    """
+    Podzapytania liczące agregaty ocen książki z jej recenzji, do użycia
+    w `Book.objects.update(...)` lub `annotate(...)`.
+    """
+    reviews = Review.objects.filter(book=OuterRef('pk')).order_by().values('book')
+
+    def count(**filters):
+        return Coalesce(Subquery(reviews.filter(**filters).annotate(value=Count('pk')).values('value')), 0)
+
+    stats = {
+        'rating_sum': Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+        'rating_count': count(),
+        **{f'rating_{star}_count': count(rating=star) for star in range(1, 6)},
+    }
+    stats['average_rating'] = average_rating_expression(stats['rating_sum'], stats['rating_count'])
+    return stats
+
+
+def stored_rating(review):
+    """(ocena, id książki) zapisane w bazie; wiersz jest zablokowany do końca transakcji."""
+    if review.pk is None:
+        return None
+    return Review.objects.select_for_update().filter(pk=review.pk).values_list('rating', 'book_id').first()
+
+@receiver(pre_save, sender=Review)
+def review_saving(sender, instance, **kwargs):
+    # Poprzednią ocenę bierzemy z wiersza, nie z instancji - ta mogła być wczytana przed cudzą zmianą.
+    # Review.save działa w transakcji, więc równoległa zmiana tej recenzji czeka na nasz COMMIT.
+    instance._stored_rating = stored_rating(instance)
 
 @receiver(post_save, sender=Review)
-def review_saved(sender, instance, **kwargs):
-    update_book_average_rating(instance.book)
+def review_saved(sender, instance, created, **kwargs):
+    stored = instance.__dict__.pop('_stored_rating', None)
+    if created or stored is None:
+        update_book_rating(instance.book_id, added=instance.rating)
+        return
+
+    rating, book_id = stored
+    if book_id != instance.book_id:
+        update_book_rating(book_id, removed=rating)
+        update_book_rating(instance.book_id, added=instance.rating)
+    elif rating != instance.rating:
+        update_book_rating(instance.book_id, added=instance.rating, removed=rating)
+
+@receiver(pre_delete, sender=Review)
+def review_deleting(sender, instance, **kwargs):
+    # Usuwanie (także kaskadowe i przez QuerySet.delete()) zawsze działa w transakcji
+    instance._stored_rating = stored_rating(instance)
 
 @receiver(post_delete, sender=Review)
 def review_deleted(sender, instance, **kwargs):
-    update_book_average_rating(instance.book)
\ No newline at end of file
+    stored = instance.__dict__.pop('_stored_rating', None)
+    if stored is not None:
+        update_book_rating(stored[1], removed=stored[0])
+
+
+# - MARKET STATS
+
+LISTING_MARKET_FIELDS = {'book', 'price', 'is_active', 'listing_type', 'allow_exchange'}
+
+
+def market_stats_expressions():
+    """
+    Podzapytania liczące dane rynkowe książki z jej aktywnych ogłoszeń,
+    do użycia w `Book.objects.update(...)` lub `annotate(...)`.
+    """
+    active = Listing.objects.filter(book=OuterRef('pk'), is_active=True).order_by().values('book')
+    exchange = active.filter(Q(listing_type=Listing.EXCHANGE) | Q(allow_exchange=True))
+    return {
+        'lowest_price': Subquery(active.annotate(value=Min('price')).values('value')),
+        'listings_count': Coalesce(Subquery(active.annotate(value=Count('pk')).values('value')), 0),
+        'exchange_listings_count': Coalesce(Subquery(exchange.annotate(value=Count('pk')).values('value')), 0),
+    }
+
+
+def update_book_market_stats(*book_ids):
+    # Jeden UPDATE liczony w bazie - bez wyścigu między równoległymi zmianami ogłoszeń
+    book_ids = {book_id for book_id in book_ids if book_id is not None}
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(updated_at=Now(), **market_stats_expressions())
+
+@receiver(post_save, sender=Listing)
+def listing_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not LISTING_MARKET_FIELDS & set(update_fields):
+        return
+    update_book_market_stats(instance.book_id, getattr(instance, '_loaded_book_id', None))
+    instance._loaded_book_id = instance.book_id
+
+@receiver(post_delete, sender=Listing)
+def listing_deleted(sender, instance, **kwargs):
+    update_book_market_stats(instance.book_id)
+
+
+# - SEARCH INDEX
+
+def book_relations_updated(book_ids):
+    """Autorzy, gatunki lub wydawca książek się zmienili: indeks wyszukiwania i znacznik modyfikacji."""
+    book_ids = list(book_ids)
+    index_books(book_ids)
+    if book_ids:
+        Book.objects.filter(pk__in=book_ids).update(updated_at=Now())
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, **kwargs):
+    index_books([instance.pk])
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genres.through)
+def book_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            book_relations_updated([instance.pk])
+    elif action == 'pre_clear':
+        instance._indexed_book_ids = list(instance.books.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        book_relations_updated(instance._indexed_book_ids)
+    elif action in ('post_add', 'post_remove'):
+        book_relations_updated(pk_set)
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Publisher)
+def book_relation_saved(sender, instance, created, **kwargs):
+    if not created:
+        book_relations_updated(instance.books.values_list('pk', flat=True))
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+@receiver(pre_delete, sender=Publisher)
+def book_relation_deleting(sender, instance, **kwargs):
+    instance._indexed_book_ids = list(instance.books.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Publisher)
+def book_relation_deleted(sender, instance, **kwargs):
+    book_relations_updated(getattr(instance, '_indexed_book_ids', []))
+
+
+# - IMAGE RENDITIONS
+
+# model -> (pole z URL-em obrazu, pole z mapą miniatur)
+IMAGE_FIELDS = {Book: ('cover_url', 'cover_renditions'), Profile: ('avatar', 'avatar_renditions')}
+
+
+def stored_renditions(url):
+    """Miniatury pliku spod `url` zapamiętane w `StoredBlob` ({} - jeszcze ich nie ma)."""
+    return StoredBlob.objects.filter(url=url).values_list('renditions', flat=True).first() or {}
+
+
+def save_renditions(model, urls):
+    """Zapisuje miniatury w obiektach `model`, których obraz to `urls['source']`."""
+    url_field, renditions_field = IMAGE_FIELDS[model]
+    changes = {renditions_field: urls}
+    if model is Book:
+        changes['updated_at'] = Now()
+    objects = model.objects.filter(**{url_field: urls['source']})
+    if model is Profile:
+        object_cache.invalidate(User, *objects.values_list('user_id', flat=True))
+    if objects.update(**changes):
+        caching.bump(model)
+
+
+def has_current_renditions(instance):
+    url_field, renditions_field = IMAGE_FIELDS[type(instance)]
+    url = getattr(instance, url_field)
+    return not url or (getattr(instance, renditions_field) or {}).get('source') == url
+
+@receiver(pre_save, sender=Book)
+@receiver(pre_save, sender=Profile)
+def image_saving(sender, instance, update_fields=None, **kwargs):
+    # Obraz przypisany po uploadzie (także URL z /api/upload_cover/ podany później
+    # lub treść, która już była w magazynie) dostaje gotowe miniatury
+    if update_fields is None and not has_current_renditions(instance):
+        url_field, renditions_field = IMAGE_FIELDS[sender]
+        setattr(instance, renditions_field, stored_renditions(getattr(instance, url_field)))
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Profile)
+def image_saved(sender, instance, **kwargs):
+    if has_current_renditions(instance):
+        return
+    url = getattr(instance, IMAGE_FIELDS[sender][0])
+
+    # Miniatury zapisane w tle po odczycie w pre_save, a przed naszym COMMIT, nie trafiły
+    # do tego wiersza (zadanie go nie widziało) - sprawdzamy ponownie po zatwierdzeniu
+    def attach():
+        renditions = stored_renditions(url)
+        if renditions:
+            save_renditions(sender, renditions)
+
+    transaction.on_commit(attach)
+
+
+# - RESPONSE CACHE
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Publisher)
+@receiver(post_delete, sender=Publisher)
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def catalog_changed(sender, **kwargs):
+    caching.bump(sender)
+
+# Pola użytkownika, których nie renderuje żadna odpowiedź - zapis samego logowania niczego nie unieważnia
+USER_UNRENDERED_FIELDS = {'last_login', 'password'}
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= USER_UNRENDERED_FIELDS:
+        return
+    caching.bump(User)
+    object_cache.invalidate(User, instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    object_cache.invalidate(User, instance.user_id)
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genres.through)
+def catalog_relations_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        caching.bump(Book)
+
+@receiver(post_save, sender=UserLibrary)
+@receiver(post_delete, sender=UserLibrary)
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def shelf_changed(sender, instance, **kwargs):
+    caching.bump(caching.shelves_dependency(instance.user_id))
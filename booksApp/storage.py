@@ -0,0 +1,301 @@
+"""
+Klient magazynu plików (okładki, awatary).
+
+Backend wybiera ustawienie `STORAGE_BACKEND`: `SupabaseStorage` wysyła pliki do
+Supabase Storage przez współdzieloną pulę połączeń keep-alive, z limitami czasu
+i ponawianiem z wykładniczym opóźnieniem; `LocalStorage` zapisuje je na dysku
+(praca offline i testy). Pliki są przesyłane strumieniowo - bez `.read()` całości.
+
+Pliki są adresowane treścią: nazwa to SHA-256 liczony strumieniowo podczas
+czytania kawałków, a tabela `StoredBlob` pamięta, co już jest w magazynie.
+Powtórny upload tego samego pliku nie wysyła nic przez sieć i zwraca istniejący URL.
+
+Przy `STORAGE_ASYNC_UPLOADS = True` funkcja `upload()` od razu zwraca docelowy
+URL, a wysyłka kończy się w tle (plik jest najpierw kopiowany do pliku
+tymczasowego, bo plik z żądania znika po jego zakończeniu). Ta sama kopia trafia
+potem do `on_stored` (np. zadania miniatur), więc treść jest kopiowana tylko raz.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from urllib3.util.retry import Retry
+
+from .models import StoredBlob
+
+logger = logging.getLogger(__name__)
+
+
+class StorageError(APIException):
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = 'Nie udało się zapisać pliku.'
+    default_code = 'storage_error'
+
+    def __init__(self, detail=None, status_code=None):
+        super().__init__(detail)
+        if status_code is not None:
+            self.status_code = status_code
+
+
+def guess_content_type(name):
+    content_type, _ = mimetypes.guess_type(name)
+    return content_type or 'application/octet-stream'
+
+
+class SupabaseStorage:
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, base_url=None, key=None):
+        self.base_url = (base_url or settings.SUPABASE_URL or '').rstrip('/')
+        self.timeout = (settings.STORAGE_CONNECT_TIMEOUT, settings.STORAGE_READ_TIMEOUT)
+
+        retry = Retry(
+            total=settings.STORAGE_RETRIES,
+            backoff_factor=settings.STORAGE_RETRY_BACKOFF,
+            status_forcelist=self.retry_statuses,
+            allowed_methods=None,    # upload jest idempotentny dzięki x-upsert
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=settings.STORAGE_POOL_SIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Authorization'] = f"Bearer {key or settings.SUPABASE_KEY}"
+
+    def url(self, bucket, name):
+        return f"{self.base_url}/storage/v1/object/public/{bucket}/{name}"
+
+    def save(self, bucket, name, file, content_type):
+        # Obiekt pliku jako `data`: requests ustawia Content-Length z rozmiaru
+        # i czyta go blokami; urllib3 przewija go przy ponowieniu
+        file.seek(0)
+        try:
+            response = self.session.post(
+                f"{self.base_url}/storage/v1/object/{bucket}/{name}",
+                data=file,
+                headers={'Content-Type': content_type, 'x-upsert': 'true'},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise StorageError(f"Błąd połączenia z Supabase: {e}")
+
+        if response.status_code not in (200, 201):
+            raise StorageError(f"Błąd uploadu do Supabase: {response.text}", status_code=response.status_code)
+        return self.url(bucket, name)
+
+    def delete(self, bucket, name):
+        try:
+            response = self.session.delete(
+                f"{self.base_url}/storage/v1/object/{bucket}/{name}", timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise StorageError(f"Błąd połączenia z Supabase: {e}")
+        if response.status_code not in (200, 204, 404):
+            raise StorageError(f"Błąd usuwania z Supabase: {response.text}", status_code=response.status_code)
+
+
+class LocalStorage:
+    """Pliki w `STORAGE_LOCAL_ROOT/<bucket>/`, serwowane pod `STORAGE_LOCAL_URL` (w trybie DEBUG)."""
+
+    def __init__(self, root=None, base_url=None):
+        self.root = root or settings.STORAGE_LOCAL_ROOT
+        self.base_url = base_url or settings.STORAGE_LOCAL_URL
+
+    def path(self, bucket, name):
+        return os.path.join(self.root, bucket, name)
+
+    def url(self, bucket, name):
+        return f"{self.base_url}{bucket}/{name}"
+
+    def save(self, bucket, name, file, content_type):
+        path = self.path(bucket, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file.seek(0)
+        with open(path, 'wb') as destination:
+            for chunk in File(file).chunks():
+                destination.write(chunk)
+        return self.url(bucket, name)
+
+    def delete(self, bucket, name):
+        try:
+            os.remove(self.path(bucket, name))
+        except FileNotFoundError:
+            pass
+
+
+_storage = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_storage():
+    global _storage
+    with _lock:
+        if _storage is None:
+            _storage = import_string(settings.STORAGE_BACKEND)()
+        return _storage
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.STORAGE_UPLOAD_WORKERS, thread_name_prefix='storage-upload')
+        return _executor
+
+
+def _hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _spool(file):
+    """
+    Kopia pliku do pliku tymczasowego (`name` to jego ścieżka), ze skrótem liczonym
+    w tym samym przebiegu. Plik znika po `close()`.
+    """
+    digest = hashlib.sha256()
+    spooled = tempfile.NamedTemporaryFile()
+    for chunk in file.chunks():
+        digest.update(chunk)
+        spooled.write(chunk)
+    spooled.flush()
+    return File(spooled), digest.hexdigest()
+
+
+def _register(blob):
+    # Równoległy upload tej samej treści zapisał ten sam obiekt - wystarczy jeden wiersz
+    stored, created = StoredBlob.objects.get_or_create(
+        bucket=blob.bucket, sha256=blob.sha256,
+        defaults={'name': blob.name, 'url': blob.url, 'size': blob.size, 'content_type': blob.content_type},
+    )
+    if not created:
+        _touch(stored)
+    return stored
+
+
+def _touch(blob):
+    """
+    Odnotowuje ponowne użycie pliku, co chroni go przed gc_stored_blobs. Zwraca False,
+    gdy wiersza już nie ma - GC usunął plik (czeka na blokadę wiersza, którą trzyma GC).
+    """
+    blob.last_used_at = timezone.now()
+    return bool(StoredBlob.objects.filter(pk=blob.pk).update(last_used_at=blob.last_used_at))
+
+
+def _hand_over(blob, spooled, on_stored):
+    """Przekazuje kopię treści `on_stored`, które ją przejmuje, albo od razu ją usuwa."""
+    if on_stored is None:
+        spooled.close()
+        return
+    try:
+        on_stored(blob, spooled)
+    except Exception:
+        logger.exception("Obsługa zapisanego pliku nie powiodła się: %s/%s", blob.bucket, blob.name)
+        spooled.close()
+
+
+def _finish_upload(storage, blob, spooled, on_error, on_stored):
+    try:
+        storage.save(blob.bucket, blob.name, spooled, blob.content_type)
+        blob = _register(blob)
+    except Exception:
+        logger.exception("Upload w tle nie powiódł się: %s/%s", blob.bucket, blob.name)
+        spooled.close()
+        if on_error is not None:
+            on_error(blob.url)
+    else:
+        # Wiersz StoredBlob jest już zapisany (autocommit wątku roboczego)
+        _hand_over(blob, spooled, on_stored)
+    finally:
+        close_old_connections()
+
+
+class UploadOwner:
+    """
+    Obiekt, któremu przypisano URL z wysyłki w tle, zapisywany dopiero po `upload()`
+    (np. nowa książka). Nieudana wysyłka wywołuje `clear(pk, url)` tylko dla niego -
+    także wtedy, gdy nastąpi przed zapisem obiektu (wtedy w `saved(pk)`).
+    """
+
+    def __init__(self, clear):
+        self.clear = clear
+        self._lock = threading.Lock()
+        self._pk = None
+        self._failed_url = None
+
+    def on_error(self, url):
+        with self._lock:
+            self._failed_url = url
+            pk = self._pk
+        if pk is not None:
+            self.clear(pk, url)
+
+    def saved(self, pk):
+        with self._lock:
+            self._pk = pk
+            url = self._failed_url
+        if url is not None:
+            self.clear(pk, url)
+
+
+def upload(bucket, file, on_error=None, on_stored=None):
+    """
+    Zapisuje przesłany plik pod nazwą z jego skrótu SHA-256 i zwraca `StoredBlob`
+    (z publicznym `url` i znanymi już miniaturami `renditions`).
+
+    W trybie asynchronicznym zwracany jest niezapisany jeszcze `StoredBlob`, zanim
+    wysyłka się zakończy; jeśli się ona nie powiedzie, wywoływane jest `on_error(url)`.
+
+    `on_stored(blob, spooled)` jest wywoływane, gdy wiersz `StoredBlob` jest już
+    zatwierdzony w bazie (po COMMIT, a w trybie asynchronicznym po zakończeniu
+    wysyłki), z kopią treści w pliku tymczasowym `spooled`, którą przejmuje
+    i musi zamknąć.
+    """
+    storage = get_storage()
+    spooled = None
+    if settings.STORAGE_ASYNC_UPLOADS or on_stored is not None:
+        spooled, sha256 = _spool(file)
+    else:
+        sha256 = _hash(file)
+
+    existing = StoredBlob.objects.filter(bucket=bucket, sha256=sha256).first()
+    if existing is not None and _touch(existing):
+        if spooled is not None:
+            transaction.on_commit(lambda: _hand_over(existing, spooled, on_stored))
+        return existing
+
+    name = f"{sha256}{os.path.splitext(file.name)[1].lower()}"
+    blob = StoredBlob(
+        bucket=bucket, sha256=sha256, name=name, url=storage.url(bucket, name),
+        size=file.size, content_type=guess_content_type(file.name),
+    )
+    if settings.STORAGE_ASYNC_UPLOADS:
+        _get_executor().submit(_finish_upload, storage, blob, spooled, on_error, on_stored)
+        return blob
+
+    try:
+        storage.save(bucket, name, spooled or file, blob.content_type)
+    except Exception:
+        if spooled is not None:
+            spooled.close()
+        raise
+    blob = _register(blob)
+    if spooled is not None:
+        transaction.on_commit(lambda: _hand_over(blob, spooled, on_stored))
+    return blob
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from booksApp.models import Author, Book, Publisher
+from booksApp.object_cache import object_cache
+
+
+def clear_caches():
+    for alias in ('default', 'catalog'):
+        caches[alias].clear()
+    object_cache.clear()
+
+
+class CatalogTestCase(TestCase):
+    """Wspólne dane: użytkownik, autor, wydawca i książka; czyste cache przed każdym testem."""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('reader', password='secret')
+        self.author = Author.objects.create(first_name='Stanisław', last_name='Lem')
+        self.publisher = Publisher.objects.create(name='Wydawnictwo Literackie')
+        self.book = Book.objects.create(
+            title='Solaris', isbn='9788308049461', publisher=self.publisher, added_by=self.user
+        )
+        self.book.authors.add(self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def committed(self):
+        # Generacje cache i wersje obiektów są podbijane po COMMIT
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def rename_author(self, last_name):
+        with self.committed():
+            self.author.last_name = last_name
+            self.author.save()
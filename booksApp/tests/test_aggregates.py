@@ -0,0 +1,126 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from booksApp.models import Book, Follow, Listing, Profile, Review
+from booksApp.tests.base import CatalogTestCase, clear_caches
+
+
+class MarketAggregateTests(CatalogTestCase):
+    def test_listing_changes_update_market_stats(self):
+        cheap = Listing.objects.create(user=self.user, book=self.book, price='10.00')
+        Listing.objects.create(user=self.user, book=self.book, price='20.00', allow_exchange=True)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.lowest_price, self.book.listings_count), (10, 2))
+        self.assertEqual(self.book.exchange_listings_count, 1)
+
+        cheap.is_active = False
+        cheap.save()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.lowest_price, self.book.listings_count), (20, 1))
+
+        Listing.objects.filter(book=self.book).delete()
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.lowest_price, self.book.listings_count), (None, 0))
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        Listing.objects.create(user=self.user, book=self.book, price='10.00')
+        Book.objects.filter(pk=self.book.pk).update(listings_count=7)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_market_stats', check=True, stdout=mock.Mock())
+        call_command('rebuild_market_stats', stdout=mock.Mock())
+        call_command('rebuild_market_stats', check=True, stdout=mock.Mock())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.listings_count, 1)
+
+
+class RatingAggregateTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user('critic')
+
+    def assertRatings(self, book, count, total, histogram):
+        book.refresh_from_db()
+        self.assertEqual((book.rating_count, book.rating_sum), (count, total))
+        self.assertEqual(book.rating_histogram, {star: histogram.get(star, 0) for star in range(1, 6)})
+        self.assertEqual(book.average_rating, round(total / count, 2) if count else 0.0)
+
+    def test_create_update_delete(self):
+        review = Review.objects.create(user=self.user, book=self.book, rating=4)
+        Review.objects.create(user=self.other, book=self.book, rating=2)
+        self.assertRatings(self.book, 2, 6, {4: 1, 2: 1})
+
+        review.rating = 5
+        review.save()
+        self.assertRatings(self.book, 2, 7, {5: 1, 2: 1})
+
+        review.delete()
+        self.assertRatings(self.book, 1, 2, {2: 1})
+
+    def test_stale_instance_uses_stored_rating(self):
+        review = Review.objects.create(user=self.user, book=self.book, rating=2)
+        stale = Review.objects.get(pk=review.pk)
+
+        review.rating = 5
+        review.save()
+        stale.delete()
+
+        self.assertRatings(self.book, 0, 0, {})
+
+    def test_moving_review_to_another_book(self):
+        other_book = Book.objects.create(title='Eden', isbn='9788308049478', added_by=self.user)
+        review = Review.objects.create(user=self.user, book=self.book, rating=3)
+
+        review.book = other_book
+        review.save()
+
+        self.assertRatings(self.book, 0, 0, {})
+        self.assertRatings(other_book, 1, 3, {3: 1})
+
+    def test_rebuild_command_detects_and_fixes_drift(self):
+        Review.objects.create(user=self.user, book=self.book, rating=4)
+        Book.objects.filter(pk=self.book.pk).update(rating_sum=40)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_book_ratings', check=True, stdout=mock.Mock())
+        call_command('rebuild_book_ratings', stdout=mock.Mock())
+        call_command('rebuild_book_ratings', check=True, stdout=mock.Mock())
+        self.assertRatings(self.book, 1, 4, {4: 1})
+
+
+class FollowAggregateTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def counts(self, user):
+        profile = Profile.objects.get(user=user)
+        return profile.followers_count, profile.following_count
+
+    def test_follow_and_unfollow(self):
+        follow = Follow.objects.create(follower=self.alice, following=self.bob)
+        self.assertEqual((self.counts(self.alice), self.counts(self.bob)), ((0, 1), (1, 0)))
+
+        follow.delete()
+        self.assertEqual((self.counts(self.alice), self.counts(self.bob)), ((0, 0), (0, 0)))
+
+    def test_bulk_create_recounts(self):
+        Follow.objects.bulk_create([
+            Follow(follower=self.alice, following=self.bob), Follow(follower=self.bob, following=self.alice),
+        ])
+        self.assertEqual((self.counts(self.alice), self.counts(self.bob)), ((1, 1), (1, 1)))
+
+    def test_reconcile_command_detects_and_fixes_drift(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        Profile.objects.filter(user=self.bob).update(followers_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_follow_counts', check=True, stdout=mock.Mock())
+        call_command('reconcile_follow_counts', stdout=mock.Mock())
+        call_command('reconcile_follow_counts', check=True, stdout=mock.Mock())
+        self.assertEqual(self.counts(self.bob), (1, 0))
@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from booksApp.models import Book, BookSearchDocument, Conversation, Follow, Listing, Message, Profile
+from booksApp.tests.base import clear_caches
+
+SMALL_DATASET = {
+    'users': 6, 'authors': 5, 'publishers': 2, 'books': 12, 'listings': 20,
+    'conversations': 4, 'messages': 15, 'follows': 8,
+}
+
+
+class SeedDatasetTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        call_command('seed_dataset', batch_size=7, stdout=StringIO(), **SMALL_DATASET)
+
+    def test_counts_and_derived_state(self):
+        self.assertEqual(Book.objects.count(), 12)
+        self.assertEqual(Listing.objects.count(), 20)
+        self.assertEqual(Message.objects.count(), 15)
+        self.assertEqual(BookSearchDocument.objects.count(), 12)
+
+        # Agregaty zdenormalizowane zgodne ze źródłem prawdy
+        call_command('rebuild_market_stats', check=True, stdout=StringIO())
+        for profile in Profile.objects.all():
+            self.assertEqual(profile.followers_count, Follow.objects.filter(following=profile.user).count())
+        for conversation in Conversation.objects.all():
+            self.assertEqual(conversation.last_message, conversation.messages.order_by('timestamp', 'pk').last())
+
+    def test_benchmark_reports_and_compares_with_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            call_command(
+                'benchmark_endpoints', requests=2, warmup=1, endpoint=['books', 'listings'],
+                save_baseline=baseline, stdout=StringIO()
+            )
+            with open(baseline) as baseline_file:
+                results = json.load(baseline_file)
+            self.assertEqual(set(results), {'books', 'listings'})
+
+            # Lista książek z ciepłego cache nie odpytuje bazy - regresję symulujemy na ogłoszeniach
+            results['listings']['queries'] = 0
+            with open(baseline, 'w') as baseline_file:
+                json.dump(results, baseline_file)
+            with self.assertRaisesMessage(CommandError, 'listings: zapytania'):
+                call_command(
+                    'benchmark_endpoints', requests=2, warmup=1, endpoint=['listings'],
+                    baseline=baseline, stdout=StringIO()
+                )
@@ -0,0 +1,83 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from booksApp.models import Book, Genre, UserLibrary, Wishlist
+from booksApp.tests.base import CatalogTestCase
+
+
+class BookBulkCreateTests(CatalogTestCase):
+    def test_reports_status_per_item(self):
+        genre = Genre.objects.create(name='Fantastyka')
+        common = {'author_ids': [self.author.pk], 'genre_ids': [genre.pk], 'publisher_id': self.publisher.pk}
+        items = [
+            {'title': 'Eden', 'isbn': '9788308049478', **common},
+            {'title': 'Solaris', 'isbn': self.book.isbn, **common},
+            {'title': 'Eden bis', 'isbn': '9788308049478', **common},
+            {'isbn': '9788308049485', **common},
+        ]
+
+        with self.committed():
+            response = self.client.post('/api/books/bulk/', items, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']], ['created', 'conflict', 'conflict', 'invalid']
+        )
+        book = Book.objects.get(pk=response.data['results'][0]['id'])
+        self.assertEqual(list(book.authors.all()), [self.author])
+        self.assertEqual(book.added_by, self.user)
+        # Nowa książka jest od razu w wyszukiwarce i na liście (cache unieważniony)
+        self.assertEqual(self.client.get('/api/books/search/', {'q': 'eden'}).data['results'][0]['id'], book.pk)
+
+    def test_empty_or_invalid_payload_is_rejected(self):
+        self.assertEqual(self.client.post('/api/books/bulk/', [], format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/books/bulk/', {'title': 'Eden'}, format='json').status_code, 400)
+
+
+class ShelfBulkTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.eden = Book.objects.create(title='Eden', isbn='9788308049478', added_by=self.user)
+        UserLibrary.objects.create(user=self.user, book=self.eden)
+
+    def bulk(self, shelf, data):
+        return self.client.post(f'/api/{shelf}/bulk/', data, format='json')
+
+    def test_add_and_remove_with_statuses(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk('library', {'add': [self.book.pk, self.eden.pk, 999], 'remove': [self.eden.pk + 1000]})
+        self.assertLess(len(queries), 10)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(r['action'], r['status']) for r in response.data['results']], [
+            ('add', 'added'), ('add', 'exists'), ('add', 'not_found'), ('remove', 'not_found'),
+        ])
+        self.assertEqual(
+            set(UserLibrary.objects.filter(user=self.user).values_list('book_id', flat=True)), {self.book.pk, self.eden.pk}
+        )
+
+        response = self.bulk('library', {'remove': [self.eden.pk]})
+        self.assertEqual(response.data['results'], [{'book_id': self.eden.pk, 'action': 'remove', 'status': 'removed'}])
+        self.assertFalse(UserLibrary.objects.filter(book=self.eden).exists())
+
+    def test_wishlist_is_separate_shelf(self):
+        self.bulk('wishlist', {'add': [self.eden.pk]})
+
+        self.assertTrue(Wishlist.objects.filter(user=self.user, book=self.eden).exists())
+        self.assertTrue(UserLibrary.objects.filter(user=self.user, book=self.eden).exists())
+
+    def test_same_book_in_add_and_remove_is_rejected(self):
+        response = self.bulk('library', {'add': [self.book.pk, self.eden.pk], 'remove': [self.eden.pk]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.eden.pk), str(response.data))
+        self.assertFalse(UserLibrary.objects.filter(book=self.book).exists())
+
+    def test_shelves_lookup(self):
+        response = self.client.get('/api/books/shelves/', {'ids': f'{self.book.pk},{self.eden.pk}'})
+
+        self.assertEqual(response.data, {
+            str(self.book.pk): {'in_library': False, 'in_wishlist': False},
+            str(self.eden.pk): {'in_library': True, 'in_wishlist': False},
+        })
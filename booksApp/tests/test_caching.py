@@ -0,0 +1,208 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory
+
+from booksApp.caching import CACHE_ALIAS, CachedResponseMixin, SingleFlight, get_generations
+from booksApp.models import Follow, Review
+from booksApp.tests.base import CatalogTestCase, clear_caches
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def test_repeated_list_is_served_from_cache(self):
+        self.assertEqual(self.client.get('/api/authors/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/authors/')['X-Cache'], 'HIT')
+
+    def test_author_rename_invalidates_author_and_book_lists(self):
+        self.client.get('/api/authors/')
+        self.client.get('/api/books/')
+
+        self.rename_author('Lemm')
+
+        response = self.client.get('/api/authors/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['last_name'], 'Lemm')
+        response = self.client.get('/api/books/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['authors'][0]['last_name'], 'Lemm')
+
+    def test_user_rename_is_resolved_in_cached_book_list(self):
+        self.client.get('/api/books/')
+
+        with self.committed():
+            self.user.username = 'renamed'
+            self.user.save()
+
+        response = self.client.get('/api/books/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['results'][0]['added_by']['username'], 'renamed')
+
+    def test_follow_keeps_book_detail_cached_with_fresh_counters(self):
+        self.client.get(f'/api/books/{self.book.pk}/')
+
+        with self.committed():
+            Follow.objects.create(follower=User.objects.create_user('fan'), following=self.user)
+
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['added_by']['followers_count'], 1)
+
+    def test_login_does_not_invalidate(self):
+        self.client.get('/api/books/')
+        generations = get_generations(['auth.user'])
+
+        with self.committed():
+            self.assertTrue(APIClient().login(username='reader', password='secret'))
+
+        self.assertEqual(get_generations(['auth.user']), generations)
+        self.assertEqual(self.client.get('/api/books/')['X-Cache'], 'HIT')
+
+    def test_new_review_invalidates_book_detail(self):
+        self.client.get(f'/api/books/{self.book.pk}/')
+
+        with self.committed():
+            Review.objects.create(user=self.user, book=self.book, rating=4)
+
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['rating_count'], 1)
+
+    def test_shelf_change_invalidates_own_entries(self):
+        self.client.get('/api/books/')
+        with self.committed():
+            response = self.client.post('/api/library/', {'book_id': self.book.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/books/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.data['results'][0]['in_library'])
+
+
+class SlowCatalogView(CachedResponseMixin):
+    basename = 'slow'
+    action = 'list'
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+
+    def run_concurrently(self, count, target):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def test_concurrent_calls_share_one_computation(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls, results = [], []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        threads = self.run_concurrently(5, lambda: results.append(flight.do('key', compute)))
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('result', False)] + [('result', True)] * 4)
+
+    def test_waiters_compute_themselves_when_leader_fails(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        results = []
+
+        def failing():
+            release.wait(5)
+            raise RuntimeError('boom')
+
+        def leader():
+            with self.assertRaises(RuntimeError):
+                flight.do('key', failing)
+
+        threads = self.run_concurrently(1, leader)
+        time.sleep(0.1)
+        threads += self.run_concurrently(1, lambda: results.append(flight.do('key', lambda: 'own')))
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [('own', False)])
+
+    def test_identical_cache_misses_are_coalesced(self):
+        factory = APIRequestFactory()
+        release = threading.Event()
+        calls, responses = [], []
+
+        def expensive_view(request):
+            calls.append(1)
+            release.wait(5)
+            return Response({'results': [1, 2, 3]})
+
+        def get():
+            request = Request(factory.get('/api/books/', {'ordering': '-average_rating'}))
+            responses.append(SlowCatalogView().cached_response(expensive_view, request))
+
+        threads = self.run_concurrently(4, get)
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(response['X-Cache'] for response in responses), ['COALESCED'] * 3 + ['MISS'])
+        self.assertTrue(all(response.data == {'results': [1, 2, 3]} for response in responses))
+
+
+@override_settings(CATALOG_SINGLE_FLIGHT_LOCK=True, CATALOG_SINGLE_FLIGHT_WAIT=5, CATALOG_SINGLE_FLIGHT_POLL=0.01)
+class SharedLockTests(SimpleTestCase):
+    """Inny worker trzyma blokadę wpisu; `leader_done` symuluje jego zakończenie."""
+
+    def setUp(self):
+        clear_caches()
+        self.cache = caches[CACHE_ALIAS]
+        self.view = SlowCatalogView()
+        self.request = Request(APIRequestFactory().get('/api/books/'))
+        self.key, self.generations = self.view.get_cache_key(self.request)
+        self.cache.add(f'{self.key}:lock', True, 5)
+        self.calls = []
+
+    def own_view(self, request):
+        self.calls.append(1)
+        return Response({'results': ['own']})
+
+    def compute_after_leader(self, leader_done):
+        timer = threading.Timer(0.1, leader_done)
+        timer.start()
+        started = time.monotonic()
+        response = self.view.compute_response(self.own_view, self.request, self.key, self.generations)
+        timer.join()
+        return response, time.monotonic() - started
+
+    def test_waiter_uses_entry_stored_by_leader(self):
+        def leader_done():
+            self.cache.set(self.key, (self.generations, {'results': ['leader']}))
+            self.cache.delete(f'{self.key}:lock')
+
+        response, _ = self.compute_after_leader(leader_done)
+
+        self.assertEqual((response['X-Cache'], response.data), ('HIT', {'results': ['leader']}))
+        self.assertEqual(self.calls, [])
+
+    def test_waiter_falls_through_when_leader_does_not_cache(self):
+        response, elapsed = self.compute_after_leader(lambda: self.cache.delete(f'{self.key}:lock'))
+
+        self.assertEqual((response['X-Cache'], response.data), ('MISS', {'results': ['own']}))
+        self.assertEqual(self.calls, [1])
+        self.assertLess(elapsed, 1)
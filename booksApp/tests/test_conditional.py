@@ -0,0 +1,60 @@
+from booksApp.models import Listing
+from booksApp.tests.base import CatalogTestCase
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.listing = Listing.objects.create(user=self.user, book=self.book, price='25.00')
+
+    def test_unchanged_list_returns_not_modified(self):
+        etag = self.client.get('/api/listings/')['ETag']
+        self.assertEqual(self.client.get('/api/listings/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_nested_author_rename_changes_listing_etag(self):
+        etag = self.client.get('/api/listings/')['ETag']
+
+        self.rename_author('Lemm')
+
+        response = self.client.get('/api/listings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['book']['authors'], ['Stanisław Lemm'])
+
+
+class CachedValidatorTests(CatalogTestCase):
+    def test_cached_list_validators_skip_database(self):
+        etag = self.client.get('/api/books/')['ETag']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/books/')['ETag'], etag)
+            self.assertEqual(self.client.get('/api/books/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_book_change_changes_etag(self):
+        etag = self.client.get(f'/api/books/{self.book.pk}/')['ETag']
+
+        with self.committed():
+            self.book.title = 'Solaris (wyd. II)'
+            self.book.save()
+
+        response = self.client.get(f'/api/books/{self.book.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Solaris (wyd. II)')
+
+    def test_added_by_rename_changes_etag(self):
+        etag = self.client.get('/api/books/')['ETag']
+
+        with self.committed():
+            self.user.username = 'renamed'
+            self.user.save()
+
+        response = self.client.get('/api/books/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['added_by']['username'], 'renamed')
+
+    def test_detail_last_modified(self):
+        response = self.client.get(f'/api/books/{self.book.pk}/')
+
+        self.assertEqual(
+            self.client.get(f'/api/books/{self.book.pk}/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code,
+            304,
+        )
@@ -0,0 +1,133 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from booksApp.models import Conversation, ConversationParticipant, Message
+from booksApp.tests.base import clear_caches
+
+
+class ConversationTestCase(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.conversation, _ = Conversation.objects.get_or_create_direct(self.alice, self.bob)
+        self.client = APIClient()
+        self.client.force_authenticate(self.bob)
+
+    def send(self, sender, content):
+        return Message.objects.create(conversation=self.conversation, sender=sender, content=content)
+
+    def unread(self, user):
+        return ConversationParticipant.objects.get(conversation=self.conversation, user=user).unread_count
+
+
+class InboxStateTests(ConversationTestCase):
+    def test_new_messages_update_last_message_and_unread_counts(self):
+        self.send(self.alice, 'Cześć')
+        last = self.send(self.alice, 'Masz Solaris?')
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, last.pk)
+        self.assertEqual((self.unread(self.alice), self.unread(self.bob)), (0, 2))
+
+    def test_conversation_list_shows_own_unread_count(self):
+        self.send(self.alice, 'Cześć')
+
+        response = self.client.get('/api/conversations/')
+        conversation = response.data['results'][0]
+        self.assertEqual(conversation['unread_count'], 1)
+        self.assertEqual(conversation['last_message']['content'], 'Cześć')
+
+        self.client.force_authenticate(self.alice)
+        self.assertEqual(self.client.get('/api/conversations/').data['results'][0]['unread_count'], 0)
+
+    def test_deleting_last_message_points_at_previous(self):
+        first = self.send(self.alice, 'Cześć')
+        self.send(self.alice, 'Masz Solaris?').delete()
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, first.pk)
+        self.assertEqual(self.unread(self.bob), 1)
+
+
+class MarkReadTests(ConversationTestCase):
+    def mark_read(self, data=None):
+        return self.client.post(f'/api/conversations/{self.conversation.pk}/mark_read/', data or {}, format='json')
+
+    def test_marks_up_to_message(self):
+        first = self.send(self.alice, 'Cześć')
+        self.send(self.alice, 'Masz Solaris?')
+        self.send(self.bob, 'Mam')
+
+        response = self.mark_read({'up_to': first.pk})
+        self.assertEqual(response.data, {'marked': 1, 'unread_count': 1})
+
+        response = self.mark_read()
+        self.assertEqual(response.data, {'marked': 1, 'unread_count': 0})
+        self.assertEqual(self.unread(self.alice), 1)
+        self.assertEqual(Message.objects.filter(is_read=True).count(), 2)
+
+    def test_publishes_read_event_after_commit(self):
+        self.send(self.alice, 'Cześć')
+
+        with mock.patch('booksApp.signals.publish_to_users') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.mark_read()
+
+        user_ids, event = publish.call_args.args
+        self.assertEqual(set(user_ids), {self.alice.pk, self.bob.pk})
+        self.assertEqual(event['type'], 'conversation.read')
+        self.assertEqual(event['reader'], self.bob.pk)
+
+    def test_requires_membership(self):
+        self.client.force_authenticate(User.objects.create_user('eve'))
+        self.assertEqual(self.mark_read().status_code, 404)
+
+
+class DirectConversationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def test_same_conversation_for_both_orders(self):
+        conversation, created = Conversation.objects.get_or_create_direct(self.alice, self.bob)
+        again, created_again = Conversation.objects.get_or_create_direct(self.bob, self.alice)
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(conversation.pk, again.pk)
+        self.assertEqual(set(conversation.participants.values_list('pk', flat=True)), {self.alice.pk, self.bob.pk})
+
+    def test_concurrent_insert_returns_winner(self):
+        winner, _ = Conversation.objects.get_or_create_direct(self.alice, self.bob)
+        queryset_class = type(Conversation.objects.all())
+        original_get = queryset_class.get
+        missed = []
+
+        def get_missing_once(queryset, *args, **kwargs):
+            # Pierwszy odczyt "nie widzi" rozmowy wstawionej przez równoległe żądanie
+            if not missed:
+                missed.append(True)
+                raise Conversation.DoesNotExist
+            return original_get(queryset, *args, **kwargs)
+
+        with mock.patch.object(queryset_class, 'get', get_missing_once):
+            conversation, created = Conversation.objects.get_or_create_direct(self.bob, self.alice)
+
+        self.assertFalse(created)
+        self.assertEqual(conversation.pk, winner.pk)
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_create_endpoint_reuses_existing_conversation(self):
+        client = APIClient()
+        client.force_authenticate(self.alice)
+
+        first = client.post('/api/conversations/', {'target_user_id': self.bob.pk}, format='json')
+        client.force_authenticate(self.bob)
+        second = client.post('/api/conversations/', {'target_user_id': self.alice.pk}, format='json')
+
+        self.assertEqual((first.status_code, second.status_code), (201, 200))
+        self.assertEqual(first.data['id'], second.data['id'])
@@ -0,0 +1,57 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from booksApp.models import Book
+from booksApp.tests.base import clear_caches
+from booksServer.db_router import ReplicaRouter, ReplicaRoutingMiddleware
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTests(SimpleTestCase):
+    # Bez transakcji wokół testu - w bloku atomic router zawsze wybiera bazę główną
+    databases = {'default'}
+
+    def setUp(self):
+        clear_caches()
+        self.user = User(pk=1, username='reader')
+        self.factory = RequestFactory()
+
+    def request(self, method, user, status=200, atomic=False):
+        """Wykonuje żądanie przez middleware i zwraca bazę, z której czytałby widok."""
+        used = []
+
+        def view(request):
+            if atomic:
+                with transaction.atomic():
+                    used.append(ReplicaRouter().db_for_read(Book))
+            else:
+                used.append(ReplicaRouter().db_for_read(Book))
+            return HttpResponse(status=status)
+
+        request = getattr(self.factory, method)('/api/books/')
+        request.user = user
+        ReplicaRoutingMiddleware(view)(request)
+        return used[0]
+
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.request('get', AnonymousUser()), 'replica_0')
+        self.assertEqual(self.request('get', self.user), 'replica_0')
+        self.assertEqual(self.request('post', self.user), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.request('get', self.user, atomic=True), DEFAULT_DB_ALIAS)
+
+    def test_successful_write_pins_user_to_primary(self):
+        self.request('post', self.user, status=201)
+
+        self.assertEqual(self.request('get', self.user), DEFAULT_DB_ALIAS)
+        other = User(pk=2, username='other')
+        self.assertEqual(self.request('get', other), 'replica_0')
+
+    def test_failed_write_does_not_pin(self):
+        self.request('post', self.user, status=400)
+
+        self.assertEqual(self.request('get', self.user), 'replica_0')
+
+    def test_outside_request_uses_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Book), DEFAULT_DB_ALIAS)
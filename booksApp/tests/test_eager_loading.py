@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from booksApp.models import Author, Book, Genre, Listing, Review
+from booksApp.tests.base import CatalogTestCase, clear_caches
+
+
+class EagerLoadingTests(CatalogTestCase):
+    def add_rows(self, start, count):
+        for index in range(start, start + count):
+            user = User.objects.create_user(f'user{index}')
+            book = Book.objects.create(title=f'Tom {index}', isbn=f'isbn-{index}', added_by=user)
+            book.authors.add(self.author, Author.objects.create(first_name='Jan', last_name=f'Autor {index}'))
+            book.genres.add(Genre.objects.create(name=f'Gatunek {index}'))
+            Review.objects.create(user=user, book=book, rating=4)
+            Listing.objects.create(user=user, book=book, price='15.00')
+
+    def count_queries(self, url):
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.add_rows(0, 2)
+        few = {url: self.count_queries(url) for url in ('/api/books/', '/api/reviews/', '/api/listings/')}
+
+        self.add_rows(2, 6)
+        many = {url: self.count_queries(url) for url in few}
+
+        self.assertEqual(many, few)
@@ -0,0 +1,35 @@
+import json
+
+from booksApp.models import Book, Genre
+from booksApp.tests.base import CatalogTestCase
+
+
+class CompactStreamTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        genre = Genre.objects.create(name='Fantastyka naukowa')
+        self.book.genres.add(genre)
+        Book.objects.create(title='Eden', isbn='9788308049478', added_by=self.user).authors.add(self.author)
+
+    def stream(self, stream_format):
+        response = self.client.get('/api/books/compact/', {'stream': stream_format, 'ordering': 'title'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson_matches_paginated_compact_list(self):
+        response, body = self.stream('ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = [json.loads(line) for line in body.splitlines()]
+        page = self.client.get('/api/books/compact/', {'ordering': 'title'}).data['results']
+        self.assertEqual(lines, json.loads(json.dumps(page)))
+        self.assertEqual(lines[1]['authors'], ['Stanisław Lem'])
+        self.assertEqual(lines[1]['genres'], ['Fantastyka naukowa'])
+
+    def test_json_array_stream(self):
+        _, body = self.stream('json')
+        self.assertEqual([book['title'] for book in json.loads(body)], ['Eden', 'Solaris'])
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get('/api/books/compact/', {'stream': 'xml'}).status_code, 400)
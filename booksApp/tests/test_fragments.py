@@ -0,0 +1,30 @@
+from booksApp.models import Listing
+from booksApp.serializers_package.serializers import BookCompactSerializer
+from booksApp.tests.base import CatalogTestCase
+
+
+class FragmentCacheTests(CatalogTestCase):
+    def test_patch_response_with_nested_book_card(self):
+        listing = Listing.objects.create(user=self.user, book=self.book, price='25.00')
+
+        response = self.client.patch(f'/api/listings/{listing.pk}/', {'price': '19.99'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['book']['title'], 'Solaris')
+
+    def test_card_follows_book_changes(self):
+        self.client.get('/api/books/compact/')
+
+        with self.committed():
+            self.book.title = 'Solaris (wyd. II)'
+            self.book.save()
+
+        response = self.client.get('/api/books/compact/')
+        self.assertEqual(response.data['results'][0]['title'], 'Solaris (wyd. II)')
+
+    def test_cached_card_skips_relations(self):
+        BookCompactSerializer([self.book], many=True).data
+
+        with self.assertNumQueries(0):
+            data = BookCompactSerializer([self.book], many=True, context={'fragments': {}}).data
+        self.assertEqual(data[0]['authors'], ['Stanisław Lem'])
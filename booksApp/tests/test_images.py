@@ -0,0 +1,77 @@
+import hashlib
+import importlib.util
+import io
+import os
+import tempfile
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from booksApp import images
+from booksApp.models import Book, StoredBlob
+from booksApp.signals import save_renditions
+from booksApp.tests.base import CatalogTestCase
+
+
+class RenditionTests(CatalogTestCase):
+    url = 'https://cdn.example/covers/abc.png'
+
+    def store_blob(self, url, renditions):
+        return StoredBlob.objects.create(
+            bucket='covers', sha256=hashlib.sha256(url.encode()).hexdigest(), name=url.rsplit('/', 1)[-1],
+            url=url, size=3, content_type='image/png', renditions=renditions,
+        )
+
+    def test_assigned_cover_gets_stored_renditions(self):
+        renditions = {'source': self.url, '96': {'webp': 'https://cdn.example/covers/abc_96w.webp'}}
+        self.store_blob(self.url, renditions)
+
+        response = self.client.patch(f'/api/books/{self.book.pk}/', {'cover_url': self.url}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.cover_renditions, renditions)
+
+    def test_renditions_finished_before_commit_are_attached(self):
+        renditions = {'source': self.url, '96': {'webp': 'https://cdn.example/covers/abc_96w.webp'}}
+        with self.committed():
+            self.book.cover_url = self.url
+            self.book.save()
+            self.store_blob(self.url, renditions)
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.cover_renditions, renditions)
+
+    def test_renditions_of_replaced_cover_are_ignored(self):
+        self.book.cover_url = 'https://cdn.example/covers/new.png'
+        self.book.save()
+
+        save_renditions(Book, {'source': self.url, '96': {'webp': 'https://cdn.example/covers/abc_96w.webp'}})
+
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.cover_renditions)
+
+
+@skipUnless(importlib.util.find_spec('PIL'), 'Pillow nie jest zainstalowany')
+class RenderTests(SimpleTestCase):
+    def image_path(self, size, mode='RGB'):
+        from PIL import Image
+
+        fd, path = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        Image.new(mode, size, (200, 10, 10, 128) if mode == 'RGBA' else (200, 10, 10)).save(path)
+        return path
+
+    def test_sizes_and_formats(self):
+        from PIL import Image
+
+        rendered = images.render(self.image_path((800, 400), 'RGBA'), (96, 600, 1200))
+
+        self.assertEqual(set(rendered), {96, 600, 1200})
+        for size, formats in rendered.items():
+            self.assertEqual(set(formats), set(images.RENDITION_FORMATS))
+            with Image.open(io.BytesIO(formats['jpeg'])) as jpeg:
+                # Obraz nie jest powiększany ponad oryginał
+                self.assertEqual(jpeg.width, min(size, 800))
+                self.assertEqual(jpeg.mode, 'RGB')
@@ -0,0 +1,88 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from booksApp.management.commands.import_catalog import author_key, clean
+from booksApp.models import Author, Book, BookSearchDocument, Publisher
+from booksApp.tests.base import clear_caches
+
+ONIX = """<?xml version="1.0" encoding="UTF-8"?>
+<ONIXMessage xmlns="http://ns.editeur.org/onix/3.0/reference">
+  <Product>
+    <ProductIdentifier><ProductIDType>15</ProductIDType><IDValue>978-83-08-04946-1</IDValue></ProductIdentifier>
+    <DescriptiveDetail>
+      <TitleDetail><TitleElement><TitleText>Solaris</TitleText></TitleElement></TitleDetail>
+      <Contributor><NamesBeforeKey>Stanisław</NamesBeforeKey><KeyNames>Lem</KeyNames></Contributor>
+      <Contributor><PersonName>Jerzy Jarzębski</PersonName></Contributor>
+      <Extent><ExtentType>00</ExtentType><ExtentValue>328</ExtentValue></Extent>
+      <Subject><SubjectHeadingText>Fantastyka naukowa</SubjectHeadingText></Subject>
+    </DescriptiveDetail>
+    <PublishingDetail>
+      <Publisher><PublisherName>{publisher}</PublisherName></Publisher>
+      <PublishingDate><Date>20120301</Date></PublishingDate>
+    </PublishingDetail>
+  </Product>
+</ONIXMessage>
+"""
+
+CSV = """isbn,title,authors,genres,pages,publisher
+9788308049478,Eden,"Lem, Stanisław",Fantastyka;Klasyka,250,Wydawnictwo Literackie
+,Bez ISBN,Anonim,,,
+9788308049478,Eden (wyd. 2),Stanisław Lem,Fantastyka,260,
+"""
+
+
+class ImportCatalogTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def import_file(self, content, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as import_file:
+            import_file.write(content)
+        self.addCleanup(os.remove, path)
+        call_command('import_catalog', path, batch_size=2, stdout=StringIO())
+
+    def test_onix_keeps_contributor_name_parts(self):
+        self.import_file(ONIX.format(publisher='P' * 150), '.xml')
+
+        book = Book.objects.get(isbn='9788308049461')
+        self.assertEqual(book.title, 'Solaris')
+        self.assertEqual((book.pages, book.published_year), (328, 2012))
+        self.assertEqual(
+            sorted(book.authors.values_list('first_name', 'last_name')),
+            [('Jerzy', 'Jarzębski'), ('Stanisław', 'Lem')],
+        )
+        self.assertEqual(list(book.genres.values_list('name', flat=True)), ['Fantastyka naukowa'])
+        # Nazwa wydawcy przycięta do Publisher.name.max_length
+        self.assertEqual(book.publisher.name, 'P' * 100)
+        self.assertTrue(BookSearchDocument.objects.filter(book=book).exists())
+
+    def test_csv_updates_by_isbn_and_skips_incomplete_records(self):
+        self.import_file(CSV, '.csv')
+
+        book = Book.objects.get(isbn='9788308049478')
+        # W partii wygrywa ostatnie wystąpienie ISBN; puste pole wydawcy go nie zmienia
+        self.assertEqual((book.title, book.pages), ('Eden (wyd. 2)', 260))
+        self.assertEqual(list(book.authors.values_list('first_name', 'last_name')), [('Stanisław', 'Lem')])
+        self.assertEqual(list(book.genres.values_list('name', flat=True)), ['Fantastyka'])
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_reimport_is_idempotent(self):
+        self.import_file(ONIX.format(publisher='Wydawnictwo Literackie'), '.xml')
+        self.import_file(ONIX.format(publisher='Wydawnictwo Literackie'), '.xml')
+
+        self.assertEqual(Book.objects.count(), 1)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Publisher.objects.count(), 1)
+
+    def test_author_key_formats(self):
+        self.assertEqual(author_key('Stanisław Lem'), ('Stanisław', 'Lem'))
+        self.assertEqual(author_key('Lem, Stanisław'), ('Stanisław', 'Lem'))
+        self.assertEqual(author_key(('Stanisław', 'Lem')), ('Stanisław', 'Lem'))
+        self.assertEqual(author_key(('', 'Homer')), ('', 'Homer'))
+        self.assertEqual(clean({'isbn': '1', 'title': 'X', 'authors': [('Jan', 'Nowak')]})[2], [('Jan', 'Nowak')])
@@ -0,0 +1,35 @@
+import re
+
+from django.test import override_settings
+
+from booksApp.tests.base import CatalogTestCase
+from booksServer.middleware import route_stats
+
+
+class RequestMetricsTests(CatalogTestCase):
+    def timings(self, response):
+        return dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+
+    def test_server_timing_header(self):
+        response = self.client.get('/api/books/')
+
+        timings = self.timings(response)
+        self.assertLessEqual({'db', 'view', 'serializer', 'total'}, set(timings))
+        self.assertLessEqual(float(timings['db']), float(timings['total']))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_route_stats_are_collected(self):
+        self.client.get('/api/authors/')
+
+        summary = route_stats.summary()
+        self.assertIn('GET author-list', summary)
+        self.assertGreaterEqual(summary['GET author-list']['count'], 1)
+
+    @override_settings(SLOW_REQUEST_QUERIES=1)
+    def test_slow_request_is_logged(self):
+        with self.assertLogs('booksServer.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/books/')
+        self.assertIn('GET book-list', logs.output[0])
+
+    def test_metrics_endpoint_requires_admin(self):
+        self.assertEqual(self.client.get('/api/metrics/requests/').status_code, 403)
@@ -0,0 +1,42 @@
+import pickle
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from booksApp.models import Follow
+from booksApp.object_cache import object_cache
+from booksApp.serializers_package.user_serializers import UserSerializer
+from booksApp.tests.base import clear_caches
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.alice, self.bob, self.carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+
+    def test_follow_invalidates_only_affected_users(self):
+        object_cache.request_started()
+        object_cache.get_many(User, [self.alice.pk, self.bob.pk, self.carol.pk])
+        carol = object_cache.get(User, self.carol.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.alice, following=self.bob)
+
+        object_cache.request_started()
+        self.assertEqual(object_cache.get(User, self.bob.pk).profile.followers_count, 1)
+        self.assertEqual(object_cache.get(User, self.alice.pk).profile.following_count, 1)
+        self.assertIs(object_cache.get(User, self.carol.pk), carol)
+
+    def test_shared_cache_holds_only_rendered_user_fields(self):
+        user = User.objects.create_user('dave', email='dave@example.com', password='secret', is_staff=True)
+        object_cache.request_started()
+        cached = object_cache.get(User, user.pk)
+
+        self.assertTrue({'password', 'email', 'is_staff'} <= cached.get_deferred_fields())
+        # Tak obiekt trafia do współdzielonego cache
+        self.assertNotIn(user.password.encode(), pickle.dumps(cached))
+
+        with self.assertNumQueries(0):
+            data = UserSerializer(cached).data
+        self.assertEqual(data['username'], 'dave')
+        self.assertNotIn('email', data)
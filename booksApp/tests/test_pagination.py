@@ -0,0 +1,39 @@
+import json
+from base64 import urlsafe_b64encode
+
+from booksApp.models import Book
+from booksApp.tests.base import CatalogTestCase
+
+
+class KeysetPaginationTests(CatalogTestCase):
+    def cursor(self, position):
+        return urlsafe_b64encode(json.dumps({'r': 0, 'p': position}).encode()).decode()
+
+    def test_next_page_follows_cursor(self):
+        for index in range(3):
+            Book.objects.create(title=f'Tom {index}', isbn=f'isbn-{index}', added_by=self.user)
+
+        first = self.client.get('/api/books/', {'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        ids = [book['id'] for book in first.data['results'] + second.data['results']]
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_previous_page_returns_to_first(self):
+        for index in range(3):
+            Book.objects.create(title=f'Tom {index}', isbn=f'isbn-{index}', added_by=self.user)
+
+        first = self.client.get('/api/books/', {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(
+            [book['id'] for book in back.data['results']], [book['id'] for book in first.data['results']]
+        )
+
+    def test_tampered_cursor_values_return_not_found(self):
+        for position in (['notadate', '1'], ['2020-01-01T00:00:00Z', 'abc']):
+            with self.subTest(position=position):
+                response = self.client.get('/api/books/', {'cursor': self.cursor(position)})
+                self.assertEqual(response.status_code, 404)
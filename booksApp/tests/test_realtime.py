@@ -0,0 +1,98 @@
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from booksApp import realtime
+
+
+class WebSocketClient:
+    """Minimalny klient ASGI: kolejka wiadomości do aplikacji i lista wysłanych przez nią."""
+
+    def __init__(self, path='/ws/events/', query_string=b'', subprotocols=()):
+        self.scope = {'type': 'websocket', 'path': path, 'query_string': query_string, 'subprotocols': list(subprotocols)}
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        await self.incoming.put({'type': 'websocket.connect'})
+        self.task = asyncio.create_task(realtime.websocket_application(self.scope, self.incoming.get, self.outgoing.put))
+        return await self.receive()
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outgoing.get(), timeout=5)
+
+    async def receive_json(self):
+        message = await self.receive()
+        self.assert_type(message, 'websocket.send')
+        return json.loads(message['text'])
+
+    async def send_json(self, data):
+        await self.incoming.put({'type': 'websocket.receive', 'text': json.dumps(data)})
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, timeout=5)
+
+    @staticmethod
+    def assert_type(message, expected):
+        if message['type'] != expected:
+            raise AssertionError(f"{message['type']} != {expected}")
+
+
+@mock.patch.object(realtime, '_broker', None)
+class WebSocketTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader')
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    async def test_rejects_missing_and_invalid_token(self):
+        for query_string in (b'', b'token=invalid'):
+            with self.subTest(query_string=query_string):
+                message = await WebSocketClient(query_string=query_string).connect()
+                self.assertEqual(message, {'type': 'websocket.close', 'code': realtime.CLOSE_UNAUTHORIZED})
+
+    async def test_unknown_path_is_closed(self):
+        message = await WebSocketClient(path='/ws/other/', query_string=f'token={self.token}'.encode()).connect()
+        self.assertEqual(message['code'], realtime.CLOSE_NOT_FOUND)
+
+    async def test_delivers_events_for_own_channel_only(self):
+        client = WebSocketClient(subprotocols=['jwt', self.token])
+        self.assertEqual(await client.connect(), {'type': 'websocket.accept', 'subprotocol': 'jwt'})
+
+        other = await sync_to_async(User.objects.create_user)('other')
+        realtime.publish_to_users([other.pk], {'type': 'message.created', 'conversation': 2})
+        realtime.publish_to_users([self.user.pk], {'type': 'message.created', 'conversation': 1})
+        self.assertEqual(await client.receive_json(), {'type': 'message.created', 'conversation': 1})
+
+        await client.send_json({'type': 'ping'})
+        self.assertEqual(await client.receive_json(), {'type': 'pong'})
+
+        await client.disconnect()
+        self.assertEqual(realtime.get_broker()._subscribers, {})
+
+    async def test_overflowing_queue_is_replaced_by_resync(self):
+        subscription = realtime.Subscription(asyncio.get_running_loop(), max_size=2)
+        for conversation in range(3):
+            subscription._deliver({'type': 'message.created', 'conversation': conversation})
+
+        self.assertEqual(await subscription.get(), {'type': 'resync'})
+        self.assertTrue(subscription._queue.empty())
+
+
+class PostgresBrokerTests(SimpleTestCase):
+    @override_settings(DATABASES={'default': {
+        'ENGINE': 'django.db.backends.postgresql', 'NAME': 'books', 'USER': 'app', 'PASSWORD': 'secret',
+        'HOST': 'db.example', 'PORT': 6543,
+        'OPTIONS': {'sslmode': 'require', 'connect_timeout': 5, 'pool': {'max_size': 10}},
+    }})
+    def test_connection_params_keep_libpq_options(self):
+        self.assertEqual(realtime.PostgresBroker()._connection_params(), {
+            'dbname': 'books', 'user': 'app', 'password': 'secret', 'host': 'db.example', 'port': 6543,
+            'sslmode': 'require', 'connect_timeout': 5,
+        })
@@ -0,0 +1,37 @@
+from booksApp.models import Author, Book
+from booksApp.search import normalize, tokenize
+from booksApp.tests.base import CatalogTestCase
+
+
+class SearchNormalizationTests(CatalogTestCase):
+    def test_folds_diacritics_and_isbn_hyphens(self):
+        self.assertEqual(normalize('Łódź Żółć'), 'lodz zolc')
+        self.assertEqual(tokenize('978-83-08-04946-1 Solaris solaris'), ['9788308049461', 'solaris'])
+
+
+class BookSearchTests(CatalogTestCase):
+    def search(self, query):
+        response = self.client.get('/api/books/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [book['title'] for book in response.data['results']]
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/books/search/').status_code, 400)
+
+    def test_matches_without_diacritics_and_by_prefix(self):
+        self.assertEqual(self.search('stanislaw lem'), ['Solaris'])
+        self.assertEqual(self.search('sola'), ['Solaris'])
+        self.assertEqual(self.search('978-83-08-04946-1'), ['Solaris'])
+        self.assertEqual(self.search('lem nieistniejace'), [])
+
+    def test_title_match_ranks_above_author_match(self):
+        author = Author.objects.create(first_name='Jan', last_name='Solaris')
+        Book.objects.create(title='Inna książka', isbn='9788308049478', added_by=self.user).authors.add(author)
+
+        self.assertEqual(self.search('solaris'), ['Solaris', 'Inna książka'])
+
+    def test_index_follows_author_rename(self):
+        self.rename_author('Kowalski')
+
+        self.assertEqual(self.search('kowalski'), ['Solaris'])
+        self.assertEqual(self.search('lem'), [])
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+
+from booksApp.models import Book, Conversation, Listing, Message, UserLibrary, Wishlist
+from booksApp.tests.base import CatalogTestCase
+
+
+class NestedShelfFlagsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.eden = Book.objects.create(title='Eden', isbn='9788308049478', added_by=self.user)
+        UserLibrary.objects.create(user=self.user, book=self.book)
+        Wishlist.objects.create(user=self.user, book=self.eden)
+
+    def flags(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return {
+            item['book']['title']: (item['book']['in_library'], item['book']['in_wishlist'])
+            for item in response.data['results']
+        }
+
+    def test_library_and_wishlist_cards_show_shelves(self):
+        Wishlist.objects.create(user=self.user, book=self.book)
+
+        self.assertEqual(self.flags('/api/library/'), {'Solaris': (True, True)})
+        self.assertEqual(self.flags('/api/wishlist/'), {'Solaris': (True, True), 'Eden': (False, True)})
+
+    def test_listing_cards_show_own_shelves(self):
+        Listing.objects.create(user=self.user, book=self.book, price='10.00')
+        Listing.objects.create(user=self.user, book=self.book, price='12.00')
+        Listing.objects.create(user=self.user, book=self.eden, price='15.00')
+
+        response = self.client.get('/api/listings/')
+        self.assertEqual(
+            [(item['book']['title'], item['book']['in_library'], item['book']['in_wishlist'])
+             for item in response.data['results']],
+            [('Solaris', True, False), ('Solaris', True, False), ('Eden', False, True)],
+        )
+
+        self.client.logout()
+        response = self.client.get('/api/listings/')
+        self.assertFalse(any(item['book']['in_library'] for item in response.data['results']))
+
+    def test_shelf_change_changes_listing_etag(self):
+        Listing.objects.create(user=self.user, book=self.eden, price='15.00')
+        etag = self.client.get('/api/listings/')['ETag']
+
+        with self.committed():
+            self.client.post('/api/library/', {'book_id': self.eden.pk}, format='json')
+
+        response = self.client.get('/api/listings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'][0]['book']['in_library'])
+
+    def test_message_attachment_card_shows_shelves(self):
+        conversation, _ = Conversation.objects.get_or_create_direct(self.user, User.objects.create_user('seller'))
+        Message.objects.create(conversation=conversation, sender=self.user, content='Masz?', book=self.book)
+
+        response = self.client.get('/api/messages/', {'conversation': conversation.pk})
+        book = response.data['results'][0]['book']
+        self.assertEqual((book['in_library'], book['in_wishlist']), (True, False))
@@ -0,0 +1,217 @@
+import os
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from booksApp import images, storage
+from booksApp.models import Book, StoredBlob
+from booksApp.views import clear_cover
+
+
+class ImmediateExecutor:
+    """Wykonuje "zadanie w tle" od razu, w wątku testu (i jego transakcji)."""
+
+    def submit(self, function, *args):
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+class SupabaseStorageTests(SimpleTestCase):
+    @override_settings(STORAGE_POOL_SIZE=7, STORAGE_RETRIES=2, SUPABASE_URL='https://project.example', SUPABASE_KEY='key')
+    def test_session_is_pooled_and_retries(self):
+        client = storage.SupabaseStorage()
+
+        adapter = client.session.get_adapter('https://project.example/storage/v1/object/covers/a.png')
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+        self.assertIsNone(adapter.max_retries.allowed_methods)
+
+    @override_settings(SUPABASE_URL='https://project.example', SUPABASE_KEY='key')
+    def test_connection_error_becomes_storage_error(self):
+        client = storage.SupabaseStorage()
+
+        with mock.patch.object(client.session, 'post', side_effect=requests.ConnectionError('down')):
+            with self.assertRaises(storage.StorageError) as error:
+                client.save('covers', 'a.png', SimpleUploadedFile('a.png', b'x'), 'image/png')
+        self.assertEqual(error.exception.status_code, 502)
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings = override_settings(
+            STORAGE_BACKEND='booksApp.storage.LocalStorage', STORAGE_LOCAL_ROOT=self.root.name,
+            STORAGE_ASYNC_UPLOADS=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        storage._storage = None
+        self.addCleanup(setattr, storage, '_storage', None)
+        self.stored = []
+
+    def on_stored(self, blob, spooled):
+        # Wiersz musi już istnieć - zadanie miniatur zapisuje w nim mapę URL-i
+        self.assertTrue(StoredBlob.objects.filter(pk=blob.pk, url=blob.url).exists())
+        with open(spooled.name, 'rb') as copy:
+            self.stored.append((blob.pk, copy.read()))
+        spooled.close()
+        self.assertFalse(os.path.exists(spooled.name))
+
+    def test_sync_upload_hands_over_copy_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            blob = storage.upload('covers', SimpleUploadedFile('cover.png', b'cover'), on_stored=self.on_stored)
+            self.assertEqual(self.stored, [])
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(self.stored, [(blob.pk, b'cover')])
+        with open(os.path.join(self.root.name, 'covers', blob.name), 'rb') as saved:
+            self.assertEqual(saved.read(), b'cover')
+
+    @override_settings(STORAGE_ASYNC_UPLOADS=True)
+    def test_async_upload_spools_once_and_hands_over_after_register(self):
+        with (
+            mock.patch.object(storage, '_get_executor', return_value=ImmediateExecutor()),
+            mock.patch.object(storage, '_spool', wraps=storage._spool) as spool,
+        ):
+            blob = storage.upload('covers', SimpleUploadedFile('cover.png', b'cover'), on_stored=self.on_stored)
+
+        spool.assert_called_once()
+        self.assertIsNone(blob.pk)
+        (stored_pk, content), = self.stored
+        self.assertEqual(content, b'cover')
+        self.assertEqual(StoredBlob.objects.get(pk=stored_pk).url, blob.url)
+
+    @override_settings(STORAGE_ASYNC_UPLOADS=True)
+    def test_failed_async_upload_calls_on_error_only(self):
+        on_error = mock.Mock()
+        with (
+            mock.patch.object(storage, '_get_executor', return_value=ImmediateExecutor()),
+            mock.patch.object(storage.LocalStorage, 'save', side_effect=storage.StorageError()),
+            self.assertLogs('booksApp.storage', 'ERROR'),
+        ):
+            blob = storage.upload(
+                'covers', SimpleUploadedFile('cover.png', b'cover'), on_error=on_error, on_stored=self.on_stored
+            )
+
+        on_error.assert_called_once_with(blob.url)
+        self.assertEqual(self.stored, [])
+        self.assertFalse(StoredBlob.objects.exists())
+
+    def test_existing_content_is_not_saved_again(self):
+        first = storage.upload('covers', SimpleUploadedFile('a.png', b'same'))
+
+        with mock.patch.object(storage.LocalStorage, 'save') as save:
+            second = storage.upload('covers', SimpleUploadedFile('b.png', b'same'))
+
+        save.assert_not_called()
+        self.assertEqual(second.pk, first.pk)
+
+    @override_settings(IMAGE_RENDITIONS_ENABLED=True)
+    def test_upload_image_schedules_renditions_from_upload_copy(self):
+        with (
+            mock.patch.object(images, 'renditions_enabled', return_value=True),
+            mock.patch.object(images, 'create_renditions') as create_renditions,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            blob = images.upload_image('covers', SimpleUploadedFile('cover.png', b'cover'), mock.Mock())
+            create_renditions.assert_not_called()
+
+        spooled, bucket, url, _ = create_renditions.call_args.args
+        self.assertEqual((bucket, url), ('covers', blob.url))
+        with open(spooled.name, 'rb') as copy:
+            self.assertEqual(copy.read(), b'cover')
+        spooled.close()
+
+
+class StoredBlobGcTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings = override_settings(
+            STORAGE_BACKEND='booksApp.storage.LocalStorage', STORAGE_LOCAL_ROOT=self.root.name,
+            STORAGE_ASYNC_UPLOADS=False, IMAGE_RENDITIONS_ENABLED=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        storage._storage = None
+        self.addCleanup(setattr, storage, '_storage', None)
+
+    def upload(self, content):
+        return storage.upload('covers', SimpleUploadedFile('cover.png', content))
+
+    def age(self, blob, days=3):
+        old = timezone.now() - timedelta(days=days)
+        StoredBlob.objects.filter(pk=blob.pk).update(created_at=old, last_used_at=old)
+
+    def test_reupload_protects_unreferenced_blob(self):
+        blob = self.upload(b'cover')
+        self.age(blob)
+
+        self.assertEqual(self.upload(b'cover').pk, blob.pk)
+        call_command('gc_stored_blobs', stdout=mock.Mock())
+
+        self.assertTrue(StoredBlob.objects.filter(pk=blob.pk).exists())
+
+    def test_unused_blob_is_deleted_with_file(self):
+        blob = self.upload(b'orphan')
+        self.age(blob)
+
+        call_command('gc_stored_blobs', stdout=mock.Mock())
+
+        self.assertFalse(StoredBlob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.root.name, 'covers', blob.name)))
+
+    def test_referenced_blob_is_kept(self):
+        blob = self.upload(b'cover')
+        self.age(blob)
+        Book.objects.create(title='Solaris', isbn='9788308049461', cover_url=blob.url)
+
+        call_command('gc_stored_blobs', stdout=mock.Mock())
+
+        self.assertTrue(StoredBlob.objects.filter(pk=blob.pk).exists())
+
+
+class UploadOwnerTests(SimpleTestCase):
+    def test_failure_before_save_clears_after_save(self):
+        clear = mock.Mock()
+        owner = storage.UploadOwner(clear)
+
+        owner.on_error('https://cdn.example/a.png')
+        clear.assert_not_called()
+        owner.saved(5)
+
+        clear.assert_called_once_with(5, 'https://cdn.example/a.png')
+
+    def test_failure_after_save_clears_only_owner(self):
+        clear = mock.Mock()
+        owner = storage.UploadOwner(clear)
+        owner.saved(5)
+
+        owner.on_error('https://cdn.example/a.png')
+
+        clear.assert_called_once_with(5, 'https://cdn.example/a.png')
+
+
+class ClearCoverTests(TestCase):
+    def test_only_matching_cover_is_cleared(self):
+        url = 'https://cdn.example/a.png'
+        owner = Book.objects.create(title='Solaris', isbn='9788308049461', cover_url=url)
+        other = Book.objects.create(title='Eden', isbn='9788308049478', cover_url='https://cdn.example/b.png')
+
+        clear_cover(owner.pk, url)
+
+        owner.refresh_from_db()
+        other.refresh_from_db()
+        self.assertIsNone(owner.cover_url)
+        self.assertEqual(other.cover_url, 'https://cdn.example/b.png')
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from booksApp import views
-from booksApp.views import RegisterView, me, profile_view, add_author
+from booksApp.views import RegisterView, me, profile_view, add_author, request_metrics, cache_metrics
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet)
@@ -31,4 +31,6 @@ urlpatterns = [
     path('me/', me, name='me'),
     path('profile/', profile_view, name='profile'),
     path('authors/add', add_author, name='add-author'),
+    path('metrics/requests/', request_metrics, name='request-metrics'),
+    path('metrics/cache/', cache_metrics, name='cache-metrics'),
 ]
\ No newline at end of file
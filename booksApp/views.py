@@ -1,44 +1,63 @@
-import mimetypes
-import os
-import uuid
-import requests
-
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import viewsets, permissions, filters, status, generics
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Count, Min, Q, Prefetch
-
-from .filters import BookFilter
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Now
+from django.http import StreamingHttpResponse
+
+from . import caching, images, storage
+from .caching import CachedResponseMixin, cache_stats
+from .conditional import ConditionalGetMixin
+from .eager_loading import EagerLoadingMixin
+from .exports import STREAM_CONTENT_TYPES, stream_compact_books
+from .filters import BookFilter, BookSearchFilter
 from .models import (
     Author, Genre, Book, Review, Follow,
     Message, UserLibrary, Wishlist, Listing,
-    BookRanking, Activity, Publisher,
-    Conversation, ExchangeOffer
+    BookRanking, Activity, Profile, Publisher,
+    Conversation, ConversationParticipant, ExchangeOffer
 )
+from .object_cache import object_cache
+from booksServer.middleware import route_stats
 from booksApp.serializers_package.serializers import (
     UserSerializer, AuthorSerializer, GenreSerializer, BookSerializer,
     ReviewSerializer, FollowSerializer, MessageSerializer,
     UserLibrarySerializer, WishlistSerializer, ListingSerializer,
     BookRankingSerializer, ActivitySerializer,
-    PublisherSerializer, BookCompactSerializer,
-    ConversationSerializer, ExchangeOfferSerializer
+    PublisherSerializer, BookCompactSerializer, BookBulkSerializer, ShelfBulkSerializer,
+    ConversationSerializer, ExchangeOfferSerializer, MarkReadSerializer
 )
 from .serializers_package.user_serializers import RegisterSerializer, ProfileSerializer
+from .search import get_search_backend, index_books
+from .signals import mark_conversation_read, save_renditions
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = User.objects.select_related('profile').annotate(
-        followers_count=Count('followers', distinct=True),
-        following_count=Count('following', distinct=True)
-    )
+class UserViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = User.objects.all()
     serializer_class = UserSerializer
     filter_backends = [filters.SearchFilter]
     search_fields = ['username']
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def request_metrics(request):
+    """Kroczące statystyki czasów odpowiedzi per trasa z RequestMetricsMiddleware."""
+    return Response(route_stats.summary())
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_metrics(request):
+    """Trafienia i chybienia cache odpowiedzi katalogu per widok (bieżący proces)."""
+    return Response(cache_stats.summary())
+
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [permissions.AllowAny]
@@ -56,29 +75,24 @@ def me(request):
         "avatar": user.profile.avatar
     })
 
-def upload_avatar_to_supabase(user_id, avatar_file):
-    supabase_url = os.getenv('SUPABASE_URL')
-    supabase_bucket = os.getenv('SUPABASE_BUCKET', 'avatars')
-    supabase_key = os.getenv('SUPABASE_KEY')
+def save_cover_renditions(urls):
+    save_renditions(Book, urls)
+
 
-    filename = f"{user_id}_{uuid.uuid4()}_{avatar_file.name}"
-    upload_url = f"{supabase_url}/storage/v1/object/{supabase_bucket}/{filename}"
+def clear_cover(book_id, url):
+    # Wysyłka w tle się nie powiodła - książka nie może wskazywać na nieistniejący plik
+    if Book.objects.filter(pk=book_id, cover_url=url).update(cover_url=None, updated_at=Now()):
+        caching.bump(Book)
 
-    content_type, _ = mimetypes.guess_type(avatar_file.name)
-    if content_type is None:
-        content_type = "application/octet-stream"
 
-    headers = {
-        "Authorization": f"Bearer {supabase_key}",
-        "Content-Type": content_type,
-    }
+def clear_avatar(profile, url):
+    if Profile.objects.filter(pk=profile.pk, avatar=url).update(avatar=None):
+        caching.bump(Profile)
+        object_cache.invalidate(User, profile.user_id)
 
-    response = requests.post(upload_url, headers=headers, data=avatar_file.read())
 
-    if response.status_code in (200, 201):
-        return f"{supabase_url}/storage/v1/object/public/{supabase_bucket}/{filename}"
-    else:
-        raise Exception(f"Błąd uploadu do Supabase: {response.text}")
+def save_avatar_renditions(urls):
+    save_renditions(Profile, urls)
 
 
 @api_view(['GET', 'PUT'])
@@ -98,16 +112,22 @@ def profile_view(request):
 
             if avatar_file:
                 try:
-                    avatar_url = upload_avatar_to_supabase(request.user.id, avatar_file)
-                    save_kwargs['avatar'] = avatar_url
-                except Exception as e:
-                    return Response({'detail': str(e)}, status=400)
+                    blob = images.upload_image(
+                        settings.SUPABASE_AVATAR_BUCKET, avatar_file,
+                        save_avatar_renditions,
+                        on_error=lambda url: clear_avatar(profile, url),
+                    )
+                except storage.StorageError as e:
+                    return Response({'detail': str(e.detail)}, status=400)
+                # Miniatury (już istniejące lub z zadania w tle) przypisuje sygnał pre_save Profile
+                save_kwargs['avatar'] = blob.url
 
             serializer.save(**save_kwargs)
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, viewsets.ModelViewSet):
+    cache_dependencies = [Author]
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -149,92 +169,235 @@ def add_author(request):
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class GenreViewSet(viewsets.ModelViewSet):
+class GenreViewSet(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, viewsets.ModelViewSet):
+    cache_dependencies = [Genre]
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.OrderingFilter]
     ordering_fields = ['name']
 
-class PublisherViewSet(viewsets.ModelViewSet):
+class PublisherViewSet(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, viewsets.ModelViewSet):
+    cache_dependencies = [Publisher]
     queryset = Publisher.objects.all()
     serializer_class = PublisherSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter]
     search_fields = ['name']
 
-class BookViewSet(viewsets.ModelViewSet):
-    queryset = Book.objects.all().select_related('added_by').prefetch_related('authors', 'genres')
+class BookViewSet(ConditionalGetMixin, CachedResponseMixin, EagerLoadingMixin, viewsets.ModelViewSet):
+    # Dane rynkowe i oceny są częścią odpowiedzi; dodający jest wstawiany z cache obiektów przy odczycie
+    cache_dependencies = [Book, Author, Genre, Publisher, Listing, Review]
+    cache_references = {'added_by': (User, UserSerializer)}
+    # Autorzy, gatunki, wydawca, oceny i dane rynkowe podbijają `updated_at` książki; dodający - nie
+    etag_dependencies = [User, Profile, Follow]
+    cache_per_user = True
+    cached_actions = ('list', 'retrieve', 'compact')
+    queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
-    search_fields = ['title', 'authors__last_name']
+    filter_backends = [BookSearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     ordering_fields = ['title', 'published_year', 'average_rating', 'created_at', 'lowest_price']
     ordering = ['-created_at']
     filterset_class = BookFilter
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        return queryset.annotate(
-            lowest_price=Min('listings__price', filter=Q(listings__is_active=True)),
-            listings_count=Count('listings', filter=Q(listings__is_active=True))
-        )
+        return super().get_queryset().with_shelves(self.request.user)
 
     def perform_create(self, serializer):
         cover_file = self.request.FILES.get('coverFile')
-        cover_url = None
+        save_kwargs = {'cover_url': None}
+        owner = storage.UploadOwner(clear_cover)
 
         if cover_file:
-            SUPABASE_URL = os.getenv('SUPABASE_URL')
-            SUPABASE_BUCKET = os.getenv('SUPABASE_BUCKET', 'covers')
-            SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-
-            filename = f"{uuid.uuid4()}_{cover_file.name}"
-            upload_url = f"{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{filename}"
+            # StorageError jest wyjątkiem API (502)
+            blob = images.upload_image(
+                settings.SUPABASE_COVERS_BUCKET, cover_file, save_cover_renditions,
+                on_error=owner.on_error,
+            )
+            save_kwargs = {'cover_url': blob.url}
 
-            content_type, _ = mimetypes.guess_type(cover_file.name)
-            if content_type is None:
-                content_type = "application/octet-stream"  # fallback
+        book = serializer.save(added_by=self.request.user, **save_kwargs)
+        owner.saved(book.pk)
 
-            headers = {
-                "Authorization": f"Bearer {SUPABASE_KEY}",
-                "Content-Type": content_type,
-            }
+    @action(methods=['post'], detail=False, permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        Tworzy wiele książek w jednym żądaniu (lista obiektów jak w POST /api/books/,
+        bez pliku okładki). Autorzy, gatunki, wydawcy i zajęte ISBN są sprawdzane
+        jednym zapytaniem na model; wynik zawiera status każdej pozycji.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Oczekiwano niepustej listy książek.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.BULK_WRITE_MAX_ITEMS:
+            return Response(
+                {'error': f"Maksymalnie {settings.BULK_WRITE_MAX_ITEMS} książek w jednym żądaniu."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            response = requests.post(upload_url, headers=headers, data=cover_file.read())
+        context = self.get_serializer_context()
+        context['related_objects'] = self.load_related_objects(items)
 
-            if response.status_code in (200, 201):
-                cover_url = f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}/{filename}"
+        results, valid = [], []
+        for index, item in enumerate(items):
+            serializer = BookBulkSerializer(data=item, context=context)
+            if serializer.is_valid():
+                results.append({'index': index, 'status': 'created'})
+                valid.append((results[-1], serializer.validated_data))
             else:
-                raise Exception(f"Błąd uploadu do Supabase: {response.text}")
+                results.append({'index': index, 'status': 'invalid', 'errors': serializer.errors})
+
+        # Zajęte ISBN (w bazie lub wcześniej w tej samej partii) - jedno zapytanie dla całej listy
+        taken = set(Book.objects.filter(isbn__in={data['isbn'] for _, data in valid}).values_list('isbn', flat=True))
+        accepted = []
+        for result, data in valid:
+            if data['isbn'] in taken:
+                result.update(status='conflict', errors={'isbn': ['Książka z tym ISBN już istnieje.']})
+                continue
+            taken.add(data['isbn'])
+            accepted.append((result, data))
+        valid = accepted
+
+        if valid:
+            try:
+                self.create_books(valid)
+            except IntegrityError:
+                # Równoległe żądanie dodało któryś z ISBN - nic nie zostało zapisane
+                return Response({'error': 'Część ISBN została właśnie zajęta, ponów żądanie.'},
+                                status=status.HTTP_409_CONFLICT)
+
+        return Response(
+            {'created': len(valid), 'results': results},
+            status=status.HTTP_201_CREATED if valid else status.HTTP_400_BAD_REQUEST
+        )
+
+    @staticmethod
+    def load_related_objects(items):
+        """Autorzy, gatunki i wydawcy wskazani w całej partii - po jednym zapytaniu na model."""
+        ids = {Author: set(), Genre: set(), Publisher: set()}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            for model, key in ((Author, 'author_ids'), (Genre, 'genre_ids')):
+                values = item.get(key)
+                if isinstance(values, list):
+                    ids[model].update(str(value) for value in values)
+            ids[Publisher].add(str(item.get('publisher_id')))
+        return {
+            model: model.objects.in_bulk([int(pk) for pk in pks if pk.isdigit()])
+            for model, pks in ids.items()
+        }
+
+    def create_books(self, valid):
+        books = []
+        for _, data in valid:
+            fields = {key: value for key, value in data.items() if key not in ('authors', 'genres')}
+            books.append(Book(added_by=self.request.user, **fields))
+
+        with transaction.atomic():
+            Book.objects.bulk_create(books)
+            if any(book.pk is None for book in books):
+                # Bazy bez RETURNING - identyfikatory odczytujemy po ISBN
+                ids = dict(Book.objects.filter(isbn__in=[book.isbn for book in books]).values_list('isbn', 'pk'))
+                for book in books:
+                    book.pk = ids[book.isbn]
+            Book.authors.through.objects.bulk_create([
+                Book.authors.through(book_id=book.pk, author_id=author.pk)
+                for book, (_, data) in zip(books, valid) for author in set(data.get('authors', ()))
+            ])
+            Book.genres.through.objects.bulk_create([
+                Book.genres.through(book_id=book.pk, genre_id=genre.pk)
+                for book, (_, data) in zip(books, valid) for genre in set(data.get('genres', ()))
+            ])
+            # bulk_create nie wysyła post_save ani m2m_changed - indeks i cache odpowiedzi uzupełniamy sami
+            index_books(book.pk for book in books)
+            caching.bump(Book)
+
+        for book, (result, _) in zip(books, valid):
+            result['id'] = book.pk
+
+    @action(methods=['get'], detail=False)
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Parametr q jest wymagany.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = get_search_backend().search(self.get_queryset(), query)
+        # Domyślnie sortujemy po trafności, ?ordering= nadal ma pierwszeństwo
+        self.ordering = ['-search_rank']
+        queryset = self.filter_queryset(queryset)
 
-        serializer.save(added_by=self.request.user, cover_url=cover_url)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset.order_by('-search_rank'), many=True).data)
 
     @action(methods=['get'], detail=False)
     def compact(self, request):
+        """
+        Lista w formacie skróconym, stronicowana. Z `?stream=ndjson` lub
+        `?stream=json` zwraca cały (przefiltrowany) katalog strumieniowo.
+        """
+        stream_format = request.query_params.get('stream')
+        if stream_format:
+            if stream_format not in STREAM_CONTENT_TYPES:
+                return Response(
+                    {'error': f"Nieobsługiwany format: {stream_format}. Dostępne: ndjson, json."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return StreamingHttpResponse(
+                stream_compact_books(self.filter_queryset(self.get_queryset()), stream_format),
+                content_type=STREAM_CONTENT_TYPES[stream_format]
+            )
+
+        return self.cached_response(self.compact_page, request)
+
+    def compact_page(self, request):
         queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(BookCompactSerializer(page, many=True).data)
         serializer = BookCompactSerializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"], permission_classes=[permissions.IsAuthenticated])
+    def shelves(self, request):
+        """
+        Przynależność wielu książek do biblioteki i listy życzeń użytkownika
+        (`?ids=1,2,3`) w jednym zapytaniu: {"1": {"in_library": true, "in_wishlist": false}, ...}.
+        """
+        ids = request.query_params.get('ids', '')
+        try:
+            book_ids = {int(book_id) for book_id in ids.split(',') if book_id.strip()}
+        except ValueError:
+            return Response({'error': 'Parametr ids musi być listą liczb oddzielonych przecinkami.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(book_ids) > settings.BULK_WRITE_MAX_ITEMS:
+            return Response({'error': f"Maksymalnie {settings.BULK_WRITE_MAX_ITEMS} książek w jednym żądaniu."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        rows = Book.objects.filter(pk__in=book_ids).with_shelves(request.user).values_list(
+            'pk', 'in_library', 'in_wishlist'
+        )
+        return Response({
+            str(pk): {'in_library': in_library, 'in_wishlist': in_wishlist} for pk, in_library, in_wishlist in rows
+        })
+
+    # Pojedyncze zapytanie z adnotacją, bez planu eager loading (get_object przechodzi przez filter_queryset)
     @action(detail=True, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def in_library(self, request, pk=None):
-        user = request.user
-        book = self.get_object()
-
-        exists = UserLibrary.objects.filter(user=user, book=book).exists()
-        return Response({"in_library": exists})
+        book = generics.get_object_or_404(self.get_queryset().only('pk'), pk=pk)
+        return Response({"in_library": book.in_library})
 
     @action(detail=True, methods=["get"], permission_classes=[permissions.IsAuthenticated])
     def in_wishlist(self, request, pk=None):
-        user = request.user
-        book = self.get_object()
-
-        exists = Wishlist.objects.filter(user=user, book=book).exists()
-        return Response({"in_wishlist": exists})
+        book = generics.get_object_or_404(self.get_queryset().only('pk'), pk=pk)
+        return Response({"in_wishlist": book.in_wishlist})
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.select_related('user', 'book')
+class ReviewViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
+    queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
@@ -244,8 +407,8 @@ class ReviewViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class FollowViewSet(viewsets.ModelViewSet):
-    queryset = Follow.objects.select_related('follower', 'following')
+class FollowViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
+    queryset = Follow.objects.all()
     serializer_class = FollowSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -253,12 +416,15 @@ class FollowViewSet(viewsets.ModelViewSet):
         serializer.save(follower=self.request.user)
 
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Conversation.objects.filter(participants=self.request.user).prefetch_related('messages')
+        # Jeden JOIN z tabelą uczestników: filtr po użytkowniku i jego licznik nieprzeczytanych
+        return Conversation.objects.filter(memberships__user=self.request.user).annotate(
+            unread_count=F('memberships__unread_count')
+        )
 
     def create(self, request, *args, **kwargs):
         target_user_id = request.data.get('target_user_id')
@@ -272,20 +438,31 @@ class ConversationViewSet(viewsets.ModelViewSet):
         except User.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Sprawdzamy czy istnieje rozmowa zawierająca DOKŁADNIE tych dwóch uczestników
-        existing_conversation = Conversation.objects.filter(participants=me).filter(participants=target_user).first()
-
-        if existing_conversation:
-            return Response(self.get_serializer(existing_conversation).data)
+        conversation, created = Conversation.objects.get_or_create_direct(me, target_user)
+        if not created:
+            # Istniejąca rozmowa - z licznikiem nieprzeczytanych bieżącego użytkownika
+            conversation = self.get_queryset().get(pk=conversation.pk)
+            return Response(self.get_serializer(conversation).data)
 
-        # Jeśli nie istnieje, tworzymy nową
-        conversation = Conversation.objects.create()
-        conversation.participants.add(me, target_user)
-        
         return Response(self.get_serializer(conversation).data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['post'])
+    def mark_read(self, request, pk=None):
+        """
+        Oznacza jako przeczytane wiadomości rozmowy do `up_to` (id wiadomości)
+        lub `until` (czas) włącznie i zwraca nową liczbę nieprzeczytanych.
+        """
+        membership = generics.get_object_or_404(ConversationParticipant, conversation_id=pk, user=request.user)
+        params = MarkReadSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
 
-class MessageViewSet(viewsets.ModelViewSet):
+        marked = mark_conversation_read(membership.conversation_id, request.user, **params.validated_data)
+        if marked:
+            membership.refresh_from_db(fields=['unread_count'])
+        return Response({'marked': marked, 'unread_count': membership.unread_count})
+
+
+class MessageViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -300,27 +477,69 @@ class MessageViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        # Ostatnią wiadomość i liczniki nieprzeczytanych aktualizuje sygnał post_save
         serializer.save(sender=self.request.user)
-        conversation = serializer.validated_data['conversation']
-        conversation.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         message = self.get_object()
 
-        if message.sender == request.user:
+        if message.sender_id == request.user.pk:
             return Response(
                 {'error': 'Użytkownik nie może oznaczyć własnej wiadomości jako przeczytanej.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         message.is_read = True
-        message.save()
+        message.save(update_fields=['is_read'])
         return Response({'status': 'marked as read', 'is_read': True})
 
 
-class UserLibraryViewSet(viewsets.ModelViewSet):
+class ShelfBulkMixin:
+    """
+    `POST .../bulk/` dla półek użytkownika (biblioteka, lista życzeń): dodaje książki
+    z `add` i usuwa te z `remove`. Istnienie książek sprawdza jedno zapytanie `id__in`,
+    a zapis idzie przez bulk_create(ignore_conflicts=True) na unique_together (user, book).
+    """
+
+    @action(methods=['post'], detail=False, permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        params = ShelfBulkSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        add = list(dict.fromkeys(params.validated_data['add']))
+        remove = list(dict.fromkeys(params.validated_data['remove']))
+
+        model = self.queryset.model
+        shelf = model.objects.filter(user=request.user)
+        existing_books = set(Book.objects.filter(id__in=add).values_list('id', flat=True))
+        on_shelf = set(shelf.filter(book_id__in=add + remove).values_list('book_id', flat=True))
+
+        results = []
+        for book_id in add:
+            if book_id not in existing_books:
+                results.append({'book_id': book_id, 'action': 'add', 'status': 'not_found'})
+            else:
+                results.append({'book_id': book_id, 'action': 'add',
+                                'status': 'exists' if book_id in on_shelf else 'added'})
+        for book_id in remove:
+            results.append({'book_id': book_id, 'action': 'remove',
+                            'status': 'removed' if book_id in on_shelf else 'not_found'})
+
+        with transaction.atomic():
+            model.objects.bulk_create(
+                [model(user=request.user, book_id=book_id) for book_id in add
+                 if book_id in existing_books and book_id not in on_shelf],
+                ignore_conflicts=True,
+            )
+            if remove:
+                shelf.filter(book_id__in=remove).delete()
+            caching.bump(caching.shelves_dependency(request.user.pk))
+
+        return Response({'results': results})
+
+
+class UserLibraryViewSet(ShelfBulkMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = UserLibrary.objects.all()
     serializer_class = UserLibrarySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
@@ -338,26 +557,25 @@ class UserLibraryViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class WishlistViewSet(viewsets.ModelViewSet):
+class WishlistViewSet(ShelfBulkMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Wishlist.objects.all()
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        books_queryset = Book.objects.annotate(
-            lowest_price=Min('listings__price', filter=Q(listings__is_active=True)),
-            listings_count=Count('listings', filter=Q(listings__is_active=True))
-        )
-        return self.queryset.filter(user=self.request.user).prefetch_related(
-            Prefetch('book', queryset=books_queryset)
-        )
+        return self.queryset.filter(user=self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class ListingViewSet(viewsets.ModelViewSet):
-    queryset = Listing.objects.select_related('book', 'user')
+class ListingViewSet(ConditionalGetMixin, EagerLoadingMixin, viewsets.ModelViewSet):
+    # Zagnieżdżona karta książki (autorzy, gatunki, dane rynkowe wszystkich ogłoszeń, oceny)
+    # i wystawiający z profilem - ich zmiany nie podbijają `updated_at` ogłoszenia
+    etag_dependencies = [Book, Author, Genre, Publisher, Listing, Review, User, Profile, Follow]
+    # Karta książki zawiera flagi półek bieżącego użytkownika
+    cache_per_user = True
+    queryset = Listing.objects.all()
     serializer_class = ListingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
@@ -370,14 +588,14 @@ class ListingViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class ExchangeOfferViewSet(viewsets.ModelViewSet):
+class ExchangeOfferViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     serializer_class = ExchangeOfferSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         return ExchangeOffer.objects.filter(
             Q(user_a=self.request.user) | Q(user_b=self.request.user)
-        ).select_related('user_a', 'user_b', 'book_a', 'chosen_book_b').prefetch_related('books_b')
+        )
 
     def perform_create(self, serializer):
         exchange_offer = serializer.save(user_b=self.request.user)
@@ -385,10 +603,7 @@ class ExchangeOfferViewSet(viewsets.ModelViewSet):
         user_a = exchange_offer.user_a
         user_b = exchange_offer.user_b
 
-        conversation = Conversation.objects.filter(participants=user_a).filter(participants=user_b).first()
-        if not conversation:
-            conversation = Conversation.objects.create()
-            conversation.participants.add(user_a, user_b)
+        conversation, _ = Conversation.objects.get_or_create_direct(user_a, user_b)
 
         Message.objects.create(
             conversation=conversation,
@@ -464,14 +679,14 @@ class ExchangeOfferViewSet(viewsets.ModelViewSet):
         return Response(self.get_serializer(offer).data)
 
 
-class BookRankingViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = BookRanking.objects.select_related('book')
+class BookRankingViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = BookRanking.objects.all()
     serializer_class = BookRankingSerializer
     ordering_fields = ['score']
 
 
-class ActivityViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Activity.objects.select_related('user')
+class ActivityViewSet(EagerLoadingMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Activity.objects.all()
     serializer_class = ActivitySerializer
 
 
@@ -482,37 +697,17 @@ class ActivityViewSet(viewsets.ReadOnlyModelViewSet):
 @permission_classes([permissions.IsAuthenticatedOrReadOnly])
 def upload_cover(request):
     """
-    Uploaduje obraz okładki do Supabase Storage
+    Uploaduje obraz okładki do magazynu plików (domyślnie Supabase Storage)
     """
     file = request.FILES.get('file')
     if not file:
         return Response({'error': 'Brak pliku'}, status=status.HTTP_400_BAD_REQUEST)
 
-    SUPABASE_URL = os.getenv('SUPABASE_URL')
-    SUPABASE_BUCKET = os.getenv('SUPABASE_COVERS_BUCKET', 'covers')
-    SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-
-    filename = f"{uuid.uuid4()}_{file.name}"
-    upload_url = f"{SUPABASE_URL}/storage/v1/object/{SUPABASE_BUCKET}/{filename}"
-
-    content_type, _ = mimetypes.guess_type(file.name)
-    if content_type is None:
-        content_type = "application/octet-stream"  # fallback
-
-    headers = {
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": content_type,
-    }
-
-    response = requests.post(upload_url, headers=headers, data=file.read())
-
-    if response.status_code not in (200, 201):
-        return Response(
-            {'error': 'Nie udało się wysłać pliku', 'details': response.text},
-            status=response.status_code
-        )
-
-    public_url = f"{SUPABASE_URL}/storage/v1/object/public/{SUPABASE_BUCKET}/{filename}"
+    try:
+        # Miniatury trafią do książek z tym URL-em okładki - także przypisanym później (sygnał pre_save Book)
+        blob = images.upload_image(settings.SUPABASE_COVERS_BUCKET, file, save_cover_renditions)
+    except storage.StorageError as e:
+        return Response({'error': 'Nie udało się wysłać pliku', 'details': str(e.detail)}, status=e.status_code)
 
-    return Response({'url': public_url}, status=status.HTTP_201_CREATED)
+    return Response({'url': blob.url}, status=status.HTTP_201_CREATED)
 
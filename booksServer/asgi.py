@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'booksServer.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Import po inicjalizacji Django (modele, ustawienia)
+from booksApp.realtime import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await websocket_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,97 @@
+"""
+Kierowanie odczytów na repliki bazy danych.
+
+`ReplicaRoutingMiddleware` oznacza żądania GET/HEAD jako tylko do odczytu -
+zapytania SELECT takich żądań `ReplicaRouter` wysyła na losową replikę
+z `DATABASE_REPLICAS`. Wszystko inne (zapisy, żądania modyfikujące, komendy
+zarządzania, wątki w tle) idzie na `default`.
+
+Po udanym zapisie użytkownik jest przez `REPLICA_STICKY_SECONDS` "przypięty"
+do bazy głównej (read-your-writes), żeby nie zobaczył na replice stanu sprzed
+własnej zmiany. Znacznik przypięcia trzyma cache Django - przy wielu workerach
+musi to być cache współdzielony.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import LazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current_request = ContextVar('replica_routing_request', default=None)
+
+
+def _pin_key(user_id):
+    return f'db-router:pinned:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Kieruje odczyty użytkownika na bazę główną przez REPLICA_STICKY_SECONDS."""
+    cache.set(_pin_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def _user_id(request):
+    user = request.__dict__.get('user')
+    # Nie rozwijamy leniwego użytkownika - jego wczytanie samo wymaga zapytania do bazy
+    if isinstance(user, LazyObject) and user._wrapped is empty:
+        return None
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+class RoutingState:
+    def __init__(self, request):
+        self.request = request
+        self.read_only = request.method in SAFE_METHODS
+        self._pinned = {}
+
+    def use_replica(self):
+        if not self.read_only or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return False
+        # Uwierzytelnienie DRF (JWT) ustawia użytkownika dopiero w widoku - sprawdzamy przy każdym odczycie
+        user_id = _user_id(self.request)
+        if user_id is None:
+            return True
+        if user_id not in self._pinned:
+            self._pinned[user_id] = bool(cache.get(_pin_key(user_id)))
+        return not self._pinned[user_id]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _current_request.get()
+        if state is None or not settings.DATABASE_REPLICAS or not state.use_replica():
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Repliki zawierają te same dane co baza główna
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(RoutingState(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            user_id = _user_id(request)
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
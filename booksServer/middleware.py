@@ -0,0 +1,163 @@
+"""
+Pomiar czasu i zapytań SQL dla każdego (próbkowanego) żądania.
+
+Middleware dodaje nagłówek `Server-Timing` (db, serializer, view, total), zbiera
+kroczące statystyki p50/p95/p99 per trasa i loguje wolne żądania razem
+z najwolniejszymi zapytaniami SQL.
+"""
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('booksServer.slow_requests')
+
+_current_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = []    # (sql, czas w ms)
+        self.timings = defaultdict(float)
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - start) * 1000))
+
+
+@contextmanager
+def record_timing(name):
+    """Dolicza czas bloku do metryki `name` bieżącego żądania (jeśli jest mierzone)."""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += (time.perf_counter() - start) * 1000
+
+
+class RouteStats:
+    """Kroczące okno czasów odpowiedzi per trasa."""
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+
+    def add(self, route, total, queries):
+        with self._lock:
+            self._samples[route].append((total, queries))
+
+    def summary(self):
+        with self._lock:
+            samples = {route: list(values) for route, values in self._samples.items()}
+
+        result = {}
+        for route, values in samples.items():
+            durations = sorted(total for total, _ in values)
+            result[route] = {
+                'count': len(values),
+                'p50_ms': _percentile(durations, 50),
+                'p95_ms': _percentile(durations, 95),
+                'p99_ms': _percentile(durations, 99),
+                'avg_queries': round(sum(queries for _, queries in values) / len(values), 1),
+            }
+        return result
+
+
+def _percentile(sorted_values, percent):
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return round(sorted_values[index], 1)
+
+
+route_stats = RouteStats(getattr(settings, 'REQUEST_METRICS_WINDOW', 1000))
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', 1000)
+        self.slow_request_queries = getattr(settings, 'SLOW_REQUEST_QUERIES', 100)
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        request.metrics = metrics
+        token = _current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.record_query))
+                response = self.get_response(request)
+        finally:
+            _current_metrics.reset(token)
+
+        self._finish_view(request)
+        total = (time.perf_counter() - metrics.started) * 1000
+        self.add_server_timing(response, metrics, total)
+
+        route = self.get_route(request)
+        route_stats.add(route, total, len(metrics.queries))
+        if total >= self.slow_request_ms or len(metrics.queries) >= self.slow_request_queries:
+            self.log_slow_request(request, route, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Odpowiedzi DRF są renderowane dopiero po wyjściu z widoku - tu kończy się czas widoku
+        self._finish_view(request)
+        return response
+
+    @staticmethod
+    def _finish_view(request):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None and metrics.view_started is not None and 'view' not in metrics.timings:
+            metrics.timings['view'] = (time.perf_counter() - metrics.view_started) * 1000
+
+    def add_server_timing(self, response, metrics, total):
+        entries = [f'db;dur={metrics.db_time:.1f};desc="{len(metrics.queries)} queries"']
+        entries += [f'{name};dur={duration:.1f}' for name, duration in metrics.timings.items()]
+        entries.append(f'total;dur={total:.1f}')
+        response['Server-Timing'] = ', '.join(entries)
+
+    @staticmethod
+    def get_route(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return f'{request.method} unresolved'
+        return f'{request.method} {match.view_name or match.route}'
+
+    @staticmethod
+    def log_slow_request(request, route, metrics, total):
+        slowest = sorted(metrics.queries, key=lambda query: query[1], reverse=True)[:5]
+        logger.warning(
+            "Wolne żądanie %s %s (%s): %.1f ms, %d zapytań SQL (%.1f ms)\n%s",
+            request.method, request.get_full_path(), route, total,
+            len(metrics.queries), metrics.db_time,
+            '\n'.join(f'  {duration:.1f} ms: {sql}' for sql, duration in slowest)
+        )
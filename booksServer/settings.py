@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booksServer.middleware.RequestMetricsMiddleware',
+    'booksServer.db_router.ReplicaRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -93,6 +95,59 @@ DATABASES = {
     "default": env.db('DATABASE_URL'),  # dj_database_url.parse(env('DATABASE_URL')),
 }
 
+# Repliki tylko do odczytu (booksServer.db_router): żądania GET/HEAD czytają z losowej repliki
+for index, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[])):
+    DATABASES[f'replica_{index}'] = {**env.db_url_config(url), 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['booksServer.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+
+# Połączenia PostgreSQL: pula psycopg3 (DB_POOL_MAX_SIZE > 0) albo trwałe połączenia
+# sprawdzane przed ponownym użyciem. Pula wyklucza CONN_MAX_AGE.
+DB_POOL_MAX_SIZE = env.int('DB_POOL_MAX_SIZE', default=0)
+for database in DATABASES.values():
+    if 'postgresql' not in database['ENGINE']:
+        continue
+    if DB_POOL_MAX_SIZE:
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10),
+        }
+        database['CONN_MAX_AGE'] = 0
+    else:
+        database['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+        database['CONN_HEALTH_CHECKS'] = True
+    # Pooler w trybie transakcyjnym (PgBouncer, port 6543 Supabase) nie obsługuje kursorów po stronie serwera
+    database['DISABLE_SERVER_SIDE_CURSORS'] = env.bool(
+        'DB_DISABLE_SERVER_SIDE_CURSORS', default=str(database.get('PORT')) == '6543'
+    )
+
+
+# Cache: `default` (m.in. przypięcia do bazy głównej) i `catalog` (odpowiedzi katalogu, booksApp.caching).
+# Lokalnie locmem; na produkcji cache współdzielony, np. redis://...
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    'catalog': env.cache('CATALOG_CACHE_URL', default='locmemcache://catalog'),
+}
+CATALOG_CACHE_TIMEOUT = env.int('CATALOG_CACHE_TIMEOUT', default=300)
+# Scalanie identycznych chybień (booksApp.caching): blokada między workerami
+# w cache 'catalog' (wymaga cache współdzielonego) i czas czekania na cudzy wynik
+CATALOG_SINGLE_FLIGHT_LOCK = env.bool('CATALOG_SINGLE_FLIGHT_LOCK', default=False)
+CATALOG_SINGLE_FLIGHT_WAIT = env.float('CATALOG_SINGLE_FLIGHT_WAIT', default=10)
+CATALOG_SINGLE_FLIGHT_POLL = env.float('CATALOG_SINGLE_FLIGHT_POLL', default=0.05)
+
+# Obiekty referencyjne (użytkownicy, autorzy, gatunki, wydawcy; booksApp.object_cache):
+# LRU w procesie przed cache współdzielonym
+OBJECT_CACHE_ALIAS = env('OBJECT_CACHE_ALIAS', default='default')
+OBJECT_CACHE_TIMEOUT = env.int('OBJECT_CACHE_TIMEOUT', default=3600)
+OBJECT_CACHE_LOCAL_SIZE = env.int('OBJECT_CACHE_LOCAL_SIZE', default=10000)
+OBJECT_CACHE_LOCAL_TTL = env.int('OBJECT_CACHE_LOCAL_TTL', default=60)
+
+# Wyrenderowane karty książek (BookCompactSerializer) per (id, updated_at)
+FRAGMENT_CACHE_ALIAS = env('FRAGMENT_CACHE_ALIAS', default='default')
+FRAGMENT_CACHE_TIMEOUT = env.int('FRAGMENT_CACHE_TIMEOUT', default=3600)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -145,7 +200,9 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_FILTER_BACKENDS': (
        'django_filters.rest_framework.DjangoFilterBackend',
-   )
+   ),
+    'DEFAULT_PAGINATION_CLASS': 'booksApp.pagination.KeysetPagination',
+    'PAGE_SIZE': env.int('API_PAGE_SIZE', default=20),
 }
 
 SIMPLE_JWT = {
@@ -155,4 +212,49 @@ SIMPLE_JWT = {
 }
 
 
-CORS_ORIGIN_ALLOW_ALL = True
\ No newline at end of file
+CORS_ORIGIN_ALLOW_ALL = True
+
+
+# Request metrics (Server-Timing, statystyki per trasa, log wolnych żądań)
+
+REQUEST_METRICS_SAMPLE_RATE = env.float('REQUEST_METRICS_SAMPLE_RATE', default=1.0)
+REQUEST_METRICS_WINDOW = env.int('REQUEST_METRICS_WINDOW', default=1000)
+SLOW_REQUEST_MS = env.int('SLOW_REQUEST_MS', default=1000)
+SLOW_REQUEST_QUERIES = env.int('SLOW_REQUEST_QUERIES', default=100)
+
+
+# Powiadomienia w czasie rzeczywistym (WebSocket /ws/events/, booksApp.realtime)
+
+REALTIME_BROKER = env('REALTIME_BROKER', default='booksApp.realtime.InProcessBroker')
+REALTIME_QUEUE_SIZE = env.int('REALTIME_QUEUE_SIZE', default=100)
+
+
+# Magazyn plików (booksApp.storage)
+
+STORAGE_BACKEND = env('STORAGE_BACKEND', default='booksApp.storage.SupabaseStorage')
+STORAGE_ASYNC_UPLOADS = env.bool('STORAGE_ASYNC_UPLOADS', default=False)
+STORAGE_UPLOAD_WORKERS = env.int('STORAGE_UPLOAD_WORKERS', default=4)
+STORAGE_CONNECT_TIMEOUT = env.float('STORAGE_CONNECT_TIMEOUT', default=3.05)
+STORAGE_READ_TIMEOUT = env.float('STORAGE_READ_TIMEOUT', default=30)
+STORAGE_RETRIES = env.int('STORAGE_RETRIES', default=3)
+STORAGE_RETRY_BACKOFF = env.float('STORAGE_RETRY_BACKOFF', default=0.5)
+STORAGE_POOL_SIZE = env.int('STORAGE_POOL_SIZE', default=10)
+STORAGE_LOCAL_ROOT = env('STORAGE_LOCAL_ROOT', default=str(BASE_DIR / 'storage'))
+STORAGE_LOCAL_URL = env('STORAGE_LOCAL_URL', default='/storage/')
+
+SUPABASE_URL = env('SUPABASE_URL', default='')
+SUPABASE_KEY = env('SUPABASE_KEY', default='')
+SUPABASE_COVERS_BUCKET = env('SUPABASE_COVERS_BUCKET', default='covers')
+SUPABASE_AVATAR_BUCKET = env('SUPABASE_AVATAR_BUCKET', default='avatars')
+
+
+# Miniatury okładek i awatarów (booksApp.images, wymaga Pillow)
+
+IMAGE_RENDITIONS_ENABLED = env.bool('IMAGE_RENDITIONS_ENABLED', default=True)
+IMAGE_RENDITION_SIZES = tuple(env.list('IMAGE_RENDITION_SIZES', cast=int, default=[96, 256, 600]))
+IMAGE_WORKERS = env.int('IMAGE_WORKERS', default=2)
+
+
+# Operacje hurtowe (POST .../bulk/)
+
+BULK_WRITE_MAX_ITEMS = env.int('BULK_WRITE_MAX_ITEMS', default=500)
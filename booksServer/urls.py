@@ -15,10 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('booksApp.urls')),
-]
\ No newline at end of file
+]
+
+# Pliki z LocalStorage (tylko DEBUG - static() w produkcji nic nie dodaje)
+urlpatterns += static(settings.STORAGE_LOCAL_URL, document_root=settings.STORAGE_LOCAL_ROOT)